@@ -1,3 +1,36 @@
+from django.contrib.auth.models import User
 from django.test import TestCase
 
-# Create your tests here.
+from analytics_app.models import Student
+
+
+class SignupLinkTests(TestCase):
+    def sign_up(self, username, role='Student', roll_no=''):
+        return self.client.post('/signup/', {
+            'first_name': 'Asha', 'last_name': 'Rao', 'gender': 'Female', 'email': f'{username}@example.com',
+            'username': username, 'password1': 'pw-12345', 'password2': 'pw-12345',
+            'role': role, 'roll_no': roll_no,
+        })
+
+    def test_student_is_linked_by_roll_number(self):
+        student = Student.objects.create(name='Asha', roll_no='S001', department='CSE')
+        self.sign_up('asha', roll_no='S001')
+        student.refresh_from_db()
+        self.assertEqual(student.user, User.objects.get(username='asha'))
+
+    def test_claimed_or_ambiguous_roll_numbers_are_not_linked(self):
+        owner = User.objects.create_user('owner')
+        Student.objects.create(name='Asha', roll_no='S001', department='CSE', user=owner)
+        Student.objects.create(name='Ravi', roll_no='S002', department='CSE')
+        Student.objects.create(name='Ravi K', roll_no='S002', department='ECE')
+        self.sign_up('asha', roll_no='S001')
+        self.sign_up('ravi', roll_no='S002')
+        self.assertEqual(
+            set(Student.objects.exclude(user=None).values_list('user__username', flat=True)), {'owner'},
+        )
+
+    def test_teachers_are_not_linked(self):
+        student = Student.objects.create(name='Asha', roll_no='S001', department='CSE')
+        self.sign_up('meera', role='Teacher', roll_no='S001')
+        student.refresh_from_db()
+        self.assertIsNone(student.user)
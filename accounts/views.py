@@ -1,5 +1,6 @@
 from django.contrib.auth import login, authenticate, logout
 from django.shortcuts import render, redirect
+from django.template.loader import render_to_string
 from django.contrib.auth.models import User
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
@@ -73,11 +74,27 @@ def signup_view(request):
         )
 
         messages.success(request, "Account created successfully")
+        roll_no = request.POST.get('roll_no', '').strip()
+        if role == 'Student' and roll_no:
+            link_student(request, user, roll_no)
         return redirect('login')
 
     return render(request, 'accounts/signup.html')
 
 
+def link_student(request, user, roll_no):
+    """Link a new student account to the one unclaimed student with its roll number"""
+    from analytics_app.caching import bump_versions
+
+    unclaimed = Student.objects.filter(roll_no=roll_no, user__isnull=True)
+    matches = list(unclaimed.values_list('id', flat=True)[:2])
+    # The update only matches while the student is still unclaimed
+    if len(matches) != 1 or not unclaimed.filter(id=matches[0]).update(user=user):
+        messages.warning(request, f"No single unlinked student has roll number {roll_no}; ask a teacher to link your account")
+        return
+    bump_versions('student')
+
+
 # ← ADD @login_required TO THESE THREE
 @login_required(login_url='login')
 def admin_dashboard(request):
@@ -143,152 +160,53 @@ def delete_student(request, student_id):
 
 @login_required(login_url='login')
 def teacher_dashboard(request):
-    from analytics_app.models import Mark, Subject, Student
-    from django.db.models import Avg, Count
-
-    # Get all marks (not filtered by teacher for now)
-    all_marks = Mark.objects.all()
-
-    # Calculate class performance
-    class_stats = []
-    for subject in Subject.objects.all():
-        subject_marks = all_marks.filter(subject=subject)
-        if subject_marks.exists():
-            avg = subject_marks.aggregate(Avg('marks_obtained'))['marks_obtained__avg']
-            total_students = subject_marks.values('student').distinct().count()
-            class_stats.append({
-                'name': subject.subject_name,
-                'average': round(avg, 2),
-                'total_students': total_students,
-                'total_marks': subject_marks.count(),
-            })
-
-    # Get detailed student data with attendance and marks
-    student_data_dict = {}
-    for mark in all_marks:
-        student_id = mark.student.id
-        if student_id not in student_data_dict:
-            student_data_dict[student_id] = {
-                'name': mark.student.name,
-                'roll_no': mark.student.roll_no,
-                'department': mark.student.department,
-                'marks': [],
-                'attendance': [],
-            }
-        student_data_dict[student_id]['marks'].append(mark.marks_obtained)
-        student_data_dict[student_id]['attendance'].append(mark.attendance_percentage)
-
-    # Build comprehensive student list
-    students_list = []
-    for student_id, data in student_data_dict.items():
-        avg_marks = sum(data['marks']) / len(data['marks']) if data['marks'] else 0
-        avg_attendance = sum(data['attendance']) / len(data['attendance']) if data['attendance'] else 0
-        is_failing = avg_marks < 40  # Less than 40 is failing
-        
-        students_list.append({
-            'id': student_id,
-            'name': data['name'],
-            'roll_no': data['roll_no'],
-            'department': data['department'],
-            'average_marks': round(avg_marks, 2),
-            'attendance': round(avg_attendance, 2),
-            'is_failing': is_failing,
-            'total_marks_records': len(data['marks']),
-        })
+    from analytics_app.listing import ListingError, parse_page_size
+    from analytics_app.services import teacher_dashboard_summary
 
-    # Get sorting parameter
+    # Get sorting, search and paging parameters
     sort_by = request.GET.get('sort', 'name')
-    if sort_by == 'marks_desc':
-        students_list.sort(key=lambda x: x['average_marks'], reverse=True)
-    elif sort_by == 'marks_asc':
-        students_list.sort(key=lambda x: x['average_marks'])
-    elif sort_by == 'attendance_desc':
-        students_list.sort(key=lambda x: x['attendance'], reverse=True)
-    elif sort_by == 'attendance_asc':
-        students_list.sort(key=lambda x: x['attendance'])
-    elif sort_by == 'failing':
-        students_list.sort(key=lambda x: (not x['is_failing'], x['average_marks']))
-    else:
-        students_list.sort(key=lambda x: x['name'])
-
-    # Get top students
-    top_students = sorted(students_list, key=lambda x: x['average_marks'], reverse=True)[:5]
-
-    # Get failing students
-    failing_students = [s for s in students_list if s['is_failing']]
-
-    # Overall stats
-    overall_class_avg = all_marks.aggregate(Avg('marks_obtained'))['marks_obtained__avg'] or 0
-    total_students_count = all_marks.values('student').distinct().count()
-    failing_count = len(failing_students)
-
-    context = {
-        'class_stats': class_stats,
-        'students_list': students_list,
-        'top_students': top_students,
-        'failing_students': failing_students,
-        'overall_class_avg': round(overall_class_avg, 2),
-        'total_students_count': total_students_count,
-        'failing_count': failing_count,
-        'total_marks_count': all_marks.count(),
-        'sort_by': sort_by,
-    }
+    search = request.GET.get('q', '')
+    cursor = request.GET.get('cursor')
+
+    # Stats, roster page, failing list and top students come from grouped
+    # SQL queries, so neither the query count nor the rendered rows grow
+    # with students or subjects
+    try:
+        page_size = parse_page_size(request.GET)
+        context = teacher_dashboard_summary(sort_by=sort_by, search=search, page_size=page_size, cursor=cursor)
+    except ListingError as e:
+        messages.error(request, str(e))
+        return redirect('teacher_dashboard')
+    context['sort_by'] = sort_by
+    context['search'] = search
+    context['page_size'] = page_size
+    context['is_paged'] = cursor is not None
 
     return render(request, 'accounts/teacher_dashboard.html', context)
 
 @login_required(login_url='login')
 def student_dashboard(request):
-    from analytics_app.models import Mark, Subject, Student
-    from django.db.models import Avg, Count
-
-    # Get the student record for this user
-    try:
-        student = Student.objects.get(id=request.user.id)
-    except Student.DoesNotExist:
-        # If no student record exists for this user, show empty dashboard
-        student = None
-
-    if student:
-        # Get all marks for this student
-        all_marks = Mark.objects.filter(student=student)
-
-        # Calculate subject-wise performance
-        subject_performance = []
-        subjects = Subject.objects.all()
-
-        for subject in subjects:
-            subject_marks = all_marks.filter(subject=subject)
-            if subject_marks.exists():
-                avg_marks = subject_marks.aggregate(Avg('marks_obtained'))['marks_obtained__avg']
-                subject_performance.append({
-                    'name': subject.subject_name,
-                    'average': round(avg_marks, 2),
-                    'percentage': round((avg_marks / 100) * 100, 2),
-                })
-
-        # Calculate overall average
-        overall_avg = all_marks.aggregate(Avg('marks_obtained'))['marks_obtained__avg'] or 0
-
-        # Calculate attendance from average attendance_percentage
-        attendance_marks = all_marks.aggregate(Avg('attendance_percentage'))['attendance_percentage__avg'] or 0
-
-        context = {
-            'subject_performance': subject_performance,
-            'overall_average': round(overall_avg, 2),
-            'attendance_percentage': round(attendance_marks, 2),
-            'total_marks': all_marks.count(),
-            'student_name': student.name,
-        }
-    else:
-        context = {
+    from analytics_app.caching import cached_value
+    from analytics_app.services import student_report, student_report_version
+
+    # The rendered report is cached until the student's marks change, so a
+    # repeat visit costs one query on top of the session and user lookups
+    student = student_report_version(request.user)
+    if student is None:
+        report = render_to_string('accounts/student_report.html', {
             'subject_performance': [],
             'overall_average': 0,
             'attendance_percentage': 0,
             'total_marks': 0,
-            'student_name': 'No student record found',
-        }
+        })
+    else:
+        student_id, version = student
+        report = cached_value(
+            'student_report', f'{student_id}:{version}',
+            lambda: render_to_string('accounts/student_report.html', student_report(student_id)),
+        )
 
-    return render(request, 'accounts/student_dashboard.html', context)
+    return render(request, 'accounts/student_dashboard.html', {'report': report})
 def logout_view(request):
     logout(request)
     messages.success(request, "Logged out successfully")
@@ -1,5 +1,21 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+
+
+def restore_search_index(sender, using, **kwargs):
+    """Recreate search triggers that a table rebuild during migrate dropped"""
+    from django.db import connections
+    from django.db.migrations.recorder import MigrationRecorder
+    from .search import ensure_search_index
+
+    connection = connections[using]
+    if ('analytics_app', '0014_roster_search') in MigrationRecorder(connection).applied_migrations():
+        ensure_search_index(connection)
 
 
 class AnalyticsAppConfig(AppConfig):
     name = 'analytics_app'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        post_migrate.connect(restore_search_index, sender=self)
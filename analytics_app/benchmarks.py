@@ -0,0 +1,257 @@
+import itertools
+import json
+import math
+import time
+import tracemalloc
+from contextlib import contextmanager
+from io import StringIO
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+from django.urls import URLPattern, URLResolver, get_resolver, reverse
+
+from .caching import clear_cache
+from .jobs import enqueue
+from .models import Mark, Student, Subject
+
+
+# Named dataset sizes, in marks; every seeded student gets SUBJECTS marks
+DATASET_SIZES = {'1k': 1_000, '100k': 100_000, '1m': 1_000_000}
+SUBJECTS = 10
+DEPARTMENTS = 4
+
+BENCHMARKED_APPS = ('accounts', 'analytics_app')
+
+# url name -> limits; 'queries' is the most SQL statements one request may
+# issue and 'p95_ms' the slowest acceptable 95th percentile latency.
+# Login-protected views spend two queries on the session and user, and
+# versioned (ETag or cached) views one on the table versions. Every
+# request starts from an empty analytics cache, so cached views are held
+# to these budgets on a miss.
+DEFAULT_BUDGETS = {
+    # One more than it reads while marks are waiting to be re-ranked, for the live top students,
+    # and two while they wait for a rescore, as for api_at_risk
+    'teacher_dashboard': {'queries': 13},
+    # The report's version, its marks and ranks, and the user's profile
+    'student_dashboard': {'queries': 6},
+    'api_students': {'queries': 2},
+    'api_marks': {'queries': 2},
+    'api_export_marks': {'queries': 2},
+    'api_subjects': {'queries': 2},
+    'api_dashboard': {'queries': 3},
+    'api_cube': {'queries': 2},
+    'api_dashboard_stats': {'queries': 2},
+    'api_performance_data': {'queries': 3},
+    'api_subject_data': {'queries': 2},
+    # Scores waiting for a rescore (the seeded data has none yet) cost a stale
+    # check when the list is empty and a look for a pending score_risk job
+    'api_at_risk': {'queries': 4},
+    'api_job': {'queries': 3},
+    'suggestions': {'queries': 4},
+    'student_suggestions': {'queries': 4},
+}
+
+
+class Fixtures:
+    """Ids and throwaway rows that request scenarios need"""
+
+    def __init__(self):
+        self.counter = itertools.count()
+        self.student_id = Student.objects.order_by('id').values_list('id', flat=True).first()
+        self.subject_id = Subject.objects.order_by('id').values_list('id', flat=True).first()
+
+    def unique(self, prefix):
+        return f'{prefix}{next(self.counter)}'
+
+    def throwaway_student(self):
+        return Student.objects.create(
+            name=self.unique('Bench '), roll_no=self.unique('BENCH'), department='Benchmark',
+        ).id
+
+    def throwaway_mark(self):
+        return Mark.objects.create(
+            student_id=self.throwaway_student(), subject_id=self.subject_id,
+            marks_obtained=50, attendance_percentage=80,
+        ).id
+
+    def throwaway_job(self):
+        return enqueue('rebuild_summaries').id
+
+
+def _json(data):
+    return {'data': json.dumps(data), 'content_type': 'application/json'}
+
+
+def _gradebook(fixtures):
+    roll_no = Student.objects.values_list('roll_no', flat=True).get(id=fixtures.student_id)
+    subject_name = Subject.objects.values_list('subject_name', flat=True).get(id=fixtures.subject_id)
+    csv = f'roll_no,subject_name,marks_obtained,attendance_percentage\n{roll_no},{subject_name},55,80\n'
+    return {'data': {'file': SimpleUploadedFile('bench.csv', csv.encode())}}
+
+
+# url name -> function(fixtures) returning (method, url kwargs, client kwargs).
+# Anything not listed is requested with a plain GET.
+SCENARIOS = {
+    'login': lambda f: ('post', {}, {'data': {'username': 'bench', 'password': 'bench', 'role': 'teacher'}}),
+    'signup': lambda f: ('post', {}, {'data': {
+        'first_name': 'Bench', 'last_name': 'User', 'gender': 'Other', 'email': 'bench@example.com',
+        'username': f.unique('signup'), 'password1': 'bench-pass-1', 'password2': 'bench-pass-1',
+        'role': 'Student',
+    }}),
+    'add_student': lambda f: ('post', {}, {'data': {
+        'name': 'Bench', 'roll_no': f.unique('ADD'), 'department': 'Benchmark',
+    }}),
+    'delete_student': lambda f: ('get', {'student_id': f.throwaway_student()}, {}),
+    'api_create_student': lambda f: ('post', {}, _json({
+        'name': 'Bench', 'roll_no': f.unique('API'), 'department': 'Benchmark',
+    })),
+    'api_update_student': lambda f: ('post', {'pk': f.throwaway_student()}, _json({'name': 'Renamed'})),
+    'api_delete_student': lambda f: ('post', {'pk': f.throwaway_student()}, {}),
+    'api_create_mark': lambda f: ('post', {}, _json({
+        'student_id': f.throwaway_student(), 'subject_id': f.subject_id,
+        'marks_obtained': 60, 'attendance_percentage': 85,
+    })),
+    'api_update_mark': lambda f: ('post', {'pk': f.throwaway_mark()}, _json({'marks_obtained': 70})),
+    'api_delete_mark': lambda f: ('post', {'pk': f.throwaway_mark()}, {}),
+    'api_batch_marks': lambda f: ('post', {}, _json({'marks': [{
+        'student_id': f.throwaway_student(), 'subject_id': f.subject_id,
+        'marks_obtained': 65, 'attendance_percentage': 90,
+    }]})),
+    'api_import_marks': lambda f: ('post', {}, _gradebook(f)),
+    'student_suggestions': lambda f: ('get', {'student_id': f.student_id}, {}),
+    'student_report_card': lambda f: ('get', {'student_id': f.student_id}, {}),
+    'api_generate_suggestions': lambda f: ('post', {}, _json({'department': 'Benchmark'})),
+    'api_create_subject': lambda f: ('post', {}, _json({'subject_name': f.unique('Bench Subject ')})),
+    'api_create_job': lambda f: ('post', {}, _json({'kind': 'score_risk'})),
+    'api_job': lambda f: ('get', {'pk': f.throwaway_job()}, {}),
+}
+
+
+@contextmanager
+def seeded_test_database(size):
+    """A throwaway test database seeded with ``size`` marks; the real one is never touched"""
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        call_command(
+            'add_dummy_data',
+            students=max(size // SUBJECTS, 1),
+            subjects=SUBJECTS,
+            departments=DEPARTMENTS,
+            seed=42,
+            batch_size=10000,
+            stdout=StringIO(),
+        )
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+def url_names():
+    """Names of every URL pattern defined by the benchmarked apps"""
+    names = []
+
+    def walk(patterns):
+        for pattern in patterns:
+            if isinstance(pattern, URLResolver):
+                walk(pattern.url_patterns)
+            elif isinstance(pattern, URLPattern) and pattern.name:
+                module = pattern.callback.__module__.split('.')[0]
+                if module in BENCHMARKED_APPS and pattern.name not in names:
+                    names.append(pattern.name)
+
+    walk(get_resolver().url_patterns)
+    return names
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[max(math.ceil(fraction * len(ordered)) - 1, 0)]
+
+
+def send_request(client, user, fixtures, name):
+    """Request one endpoint on an empty cache; returns (url, status, seconds, captured queries)"""
+    method, url_kwargs, client_kwargs = SCENARIOS.get(name, lambda f: ('get', {}, {}))(fixtures)
+    url = reverse(name, kwargs=url_kwargs)
+    # Log in again in case a previous request (logout) ended the session
+    client.force_login(user)
+    # Otherwise the warmup fills the cache and only hits would be timed
+    clear_cache()
+    # A full debug query log stops capturing, which would count 0 queries
+    connection.queries_log.clear()
+
+    with CaptureQueriesContext(connection) as queries:
+        started = time.perf_counter()
+        response = getattr(client, method)(url, **client_kwargs)
+        if response.streaming:
+            for _ in response.streaming_content:
+                pass
+        elapsed = time.perf_counter() - started
+    return url, response.status_code, elapsed, queries.captured_queries
+
+
+def benchmark_endpoint(client, user, fixtures, name, repeat, warmup):
+    """Latency percentiles, query count and peak Python memory of one endpoint"""
+    timings, query_counts, statuses = [], [], set()
+    for iteration in range(warmup + repeat):
+        url, status, elapsed, queries = send_request(client, user, fixtures, name)
+        if iteration >= warmup:
+            timings.append(elapsed * 1000)
+            query_counts.append(len(queries))
+            statuses.add(status)
+
+    # Memory is measured on a separate request, as tracing slows everything down
+    tracemalloc.start()
+    try:
+        send_request(client, user, fixtures, name)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'name': name,
+        'url': url,
+        'status': sorted(statuses),
+        'p50_ms': round(percentile(timings, 0.50), 2),
+        'p95_ms': round(percentile(timings, 0.95), 2),
+        'queries': max(query_counts),
+        'peak_kib': round(peak / 1024, 1),
+    }
+
+
+def bench_session():
+    """(client, user, fixtures) for requesting endpoints as a logged-in staff user"""
+    from django.contrib.auth.models import User
+
+    user = User.objects.create_user('bench', password='bench', is_staff=True, is_superuser=True)
+    fixtures = Fixtures()
+    # The student dashboard shows the report of the user's own student
+    Student.objects.filter(id=fixtures.student_id).update(user=user)
+    return Client(), user, fixtures
+
+
+def run_benchmarks(repeat=20, warmup=2, only=None):
+    """Benchmark every URL of the benchmarked apps as a logged-in staff user"""
+    client, user, fixtures = bench_session()
+    names = [name for name in url_names() if not only or name in only]
+    return [benchmark_endpoint(client, user, fixtures, name, repeat, warmup) for name in names]
+
+
+def budget_violations(results, budgets):
+    """Human-readable descriptions of every result that exceeds its budget"""
+    violations = []
+    for result in results:
+        budget = budgets.get(result['name'], {})
+        if 'queries' in budget and result['queries'] > budget['queries']:
+            violations.append(
+                f"{result['name']}: {result['queries']} queries (budget {budget['queries']})"
+            )
+        if 'p95_ms' in budget and result['p95_ms'] > budget['p95_ms']:
+            violations.append(
+                f"{result['name']}: p95 {result['p95_ms']} ms (budget {budget['p95_ms']} ms)"
+            )
+    return violations
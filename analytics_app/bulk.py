@@ -0,0 +1,66 @@
+from django.db import transaction
+
+from .caching import bump_versions
+from .models import Mark
+from .rankings import mark_rankings_stale
+from .risk import mark_risk_stale
+from .snapshot import record_mark_writes, snapshot_dir
+from .summaries import apply_mark_changes
+from .trends import invalidate_rollups
+
+
+def upsert_marks(rows, batch_size=1000):
+    """Insert or update (student_id, subject_id, marks, attendance) rows in one transaction
+
+    Relies on the unique (student, subject) constraint: new pairs are
+    inserted and existing ones have their marks and attendance replaced.
+    A later row for the same pair wins. Returns (created, updated).
+    """
+    latest = {}
+    for student_id, subject_id, marks, attendance in rows:
+        latest[(student_id, subject_id)] = (student_id, subject_id, int(marks), float(attendance))
+    if not latest:
+        return 0, 0
+
+    with transaction.atomic():
+        stored = (
+            Mark.objects
+            .select_for_update()
+            .filter(
+                student_id__in={key[0] for key in latest},
+                subject_id__in={key[1] for key in latest},
+            )
+            .values_list('student_id', 'subject_id', 'marks_obtained', 'attendance_percentage', 'assessed_on')
+        )
+        previous = [row for row in stored if (row[0], row[1]) in latest]
+
+        Mark.objects.bulk_create(
+            [
+                Mark(student_id=student_id, subject_id=subject_id,
+                     marks_obtained=marks, attendance_percentage=attendance)
+                for student_id, subject_id, marks, attendance in latest.values()
+            ],
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=['student', 'subject'],
+            update_fields=['marks_obtained', 'attendance_percentage'],
+        )
+        # Bulk writes skip the model signals, so fold the changes in here
+        apply_mark_changes(added=latest.values(), removed=[row[:4] for row in previous])
+        # New marks are dated today; updated ones keep their assessment date
+        invalidate_rollups(row[4] for row in previous)
+        mark_risk_stale(key[0] for key in latest)
+        mark_rankings_stale(latest)
+        if snapshot_dir() is not None:
+            # bulk_create does not return ids for upserted rows on every backend
+            record_mark_writes(
+                row for row in (
+                    Mark.objects
+                    .filter(student_id__in={key[0] for key in latest}, subject_id__in={key[1] for key in latest})
+                    .values_list('id', 'student_id', 'subject_id', 'marks_obtained', 'attendance_percentage')
+                )
+                if (row[1], row[2]) in latest
+            )
+        bump_versions('mark')
+
+    return len(latest) - len(previous), len(previous)
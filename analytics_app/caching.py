@@ -0,0 +1,169 @@
+import hashlib
+import threading
+from collections import Counter
+from functools import wraps
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.http import HttpResponse
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+from .models import DataVersion
+
+
+TRACKED_TABLES = ('student', 'subject', 'mark', 'profile', 'risk', 'ranking')
+
+# Hit/miss counters of this process, per cached view
+_stats_lock = threading.Lock()
+_hits = Counter()
+_misses = Counter()
+
+
+def _cache():
+    return caches[getattr(settings, 'ANALYTICS_CACHE_ALIAS', 'default')]
+
+
+def bump_versions(*tables):
+    """Invalidate every cached answer that depends on ``tables``
+
+    Runs inside the caller's transaction, so readers never see new data
+    under an old version.
+    """
+    for table in tables:
+        if DataVersion.objects.filter(table=table).update(version=F('version') + 1):
+            continue
+        try:
+            with transaction.atomic():
+                DataVersion.objects.create(table=table, version=1)
+        except IntegrityError:
+            DataVersion.objects.filter(table=table).update(version=F('version') + 1)
+
+
+def current_versions(tables):
+    versions = dict(DataVersion.objects.filter(table__in=tables).values_list('table', 'version'))
+    return tuple(versions.get(table, 0) for table in tables)
+
+
+def _version_key(request, name, tables, args, kwargs, daily=False):
+    """Cache key for this request: view name, table versions and query string
+
+    ``daily`` adds today's date, for answers that move with the calendar.
+    Worked out once per request, as both the ETag and the cache lookup need it.
+    """
+    keys = request.__dict__.setdefault('_analytics_version_keys', {})
+    if name not in keys:
+        versions = '.'.join(str(version) for version in current_versions(tables))
+        if daily:
+            versions += f':{timezone.localdate().isoformat()}'
+        query = urlencode(sorted(request.GET.lists()), doseq=True)
+        digest = hashlib.md5(f'{args}{kwargs}{query}'.encode()).hexdigest()
+        keys[name] = f'analytics:{name}:{versions}:{digest}'
+    return keys[name]
+
+
+def versioned_etag(name, tables, daily=False):
+    """Answer GETs with a strong ETag built from the versions of ``tables``
+
+    The tag changes whenever one of the tables is written, so it is known
+    before the view runs: a matching If-None-Match gets a 304 without
+    touching the payload. Responses are marked no-cache so browsers
+    always revalidate instead of reusing a stale copy.
+    """
+    def etag(request, *args, **kwargs):
+        if request.method != 'GET':
+            return None
+        return hashlib.md5(_version_key(request, name, tables, args, kwargs, daily).encode()).hexdigest()
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = view(request, *args, **kwargs)
+            patch_cache_control(response, private=True, no_cache=True)
+            return response
+        return condition(etag_func=etag)(wrapper)
+    return decorator
+
+
+def cached_json(name, tables, daily=False):
+    """Cache a JSON GET view's body until one of ``tables`` is written
+
+    The key holds the view name, the current version of each table and
+    the query string, so a lookup costs one small query and stale
+    entries are simply never asked for again. Responses also carry a
+    versioned ETag (see versioned_etag).
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method != 'GET':
+                return view(request, *args, **kwargs)
+
+            key = _version_key(request, name, tables, args, kwargs, daily)
+            cache = _cache()
+            content = cache.get(key)
+            if content is not None:
+                _record(_hits, name)
+                return HttpResponse(content, content_type='application/json')
+
+            _record(_misses, name)
+            response = view(request, *args, **kwargs)
+            if response.status_code == 200 and not response.streaming:
+                cache.set(key, response.content, timeout=None)
+            return response
+        return versioned_etag(name, tables, daily)(wrapper)
+    return decorator
+
+
+def cached_value(name, key, build):
+    """``build()``, cached under ``key`` until the key changes
+
+    Callers put whatever versions the value depends on into the key. Hits
+    and misses are counted under ``name`` with the cached views.
+    """
+    cache = _cache()
+    key = f'analytics:{name}:{key}'
+    value = cache.get(key)
+    if value is not None:
+        _record(_hits, name)
+        return value
+    _record(_misses, name)
+    value = build()
+    cache.set(key, value, timeout=None)
+    return value
+
+
+def record_lookups(name, hits, misses):
+    """Count lookups made outside these caches under ``name``, for cache_stats"""
+    with _stats_lock:
+        _hits[name] += hits
+        _misses[name] += misses
+
+
+def clear_cache():
+    """Drop every cached analytics answer, so the next requests take the uncached path"""
+    _cache().clear()
+
+
+def _record(counter, name):
+    with _stats_lock:
+        counter[name] += 1
+
+
+def cache_stats():
+    """Hits, misses and hit rate of every cached view in this process"""
+    with _stats_lock:
+        names = sorted(set(_hits) | set(_misses))
+        stats = {}
+        for name in names:
+            total = _hits[name] + _misses[name]
+            stats[name] = {
+                'hits': _hits[name],
+                'misses': _misses[name],
+                'hit_rate': round(_hits[name] / total * 100, 2) if total else 0,
+            }
+    return stats
@@ -0,0 +1,87 @@
+from django.db.models import Avg, Count, F, FloatField, Q
+from django.db.models.functions import Cast, NullIf, TruncQuarter
+
+from .listing import apply_filters
+from .models import Mark
+from .services import PASS_MARK
+from .trends import period_label
+
+
+# Group-by dimension -> {output column: expression over Mark}
+DIMENSIONS = {
+    'department': {'department': F('student__department')},
+    'subject': {'subject_id': F('subject_id'), 'subject': F('subject__subject_name')},
+    # From the profile of the student's linked account
+    'gender': {'gender': F('student__user__profile__gender')},
+    'term': {'term': TruncQuarter('assessed_on')},
+}
+
+MEASURES = {
+    'avg': Avg('marks_obtained'),
+    'count': Count('id'),
+    'pass_rate': (
+        Cast(Count('id', filter=Q(marks_obtained__gte=PASS_MARK)), FloatField()) * 100
+        / NullIf(Count('id'), 0)
+    ),
+    'avg_attendance': Avg('attendance_percentage'),
+}
+
+# Query parameter -> (ORM lookup, value parser), as for the list endpoints
+CUBE_FILTERS = {
+    'department': ('student__department', str),
+    'subject': ('subject_id', int),
+    'term': ('assessed_on__quarter', int),
+    'year': ('assessed_on__year', int),
+}
+
+
+class CubeError(ValueError):
+    """Raised for dimensions or measures the cube does not offer"""
+
+
+def _parse_list(value, allowed, kind):
+    names = [name.strip() for name in (value or '').split(',') if name.strip()]
+    unknown = [name for name in names if name not in allowed]
+    if unknown:
+        raise CubeError(f'Unknown {kind}: {", ".join(unknown)}. Choose from {", ".join(allowed)}')
+    if len(set(names)) != len(names):
+        raise CubeError(f'Each {kind[:-1]} may only be given once')
+    return names
+
+
+def parse_cube_request(params):
+    """(dimensions, measures) named by the ``dimensions`` and ``measures`` parameters"""
+    dimensions = _parse_list(params.get('dimensions'), DIMENSIONS, 'dimensions')
+    measures = _parse_list(params.get('measures'), MEASURES, 'measures') or list(MEASURES)
+    return dimensions, measures
+
+
+def cube(dimensions, measures, params=None):
+    """Measures of every combination of ``dimensions`` from one grouped query
+
+    With no dimensions the single row holds the totals over all marks
+    matching the filters in ``params``.
+    """
+    columns = {}
+    for dimension in dimensions:
+        columns.update(DIMENSIONS[dimension])
+    # Aliases keep the annotations clear of Mark's own field names
+    aliases = {f'cube_{column}': expression for column, expression in columns.items()}
+
+    marks = apply_filters(Mark.objects.all(), params or {}, CUBE_FILTERS)
+    aggregates = {f'cube_{measure}': MEASURES[measure] for measure in measures}
+    if aliases:
+        rows = marks.annotate(**aliases).values(*aliases).annotate(**aggregates).order_by(*aliases)
+    else:
+        rows = [marks.aggregate(**aggregates)]
+
+    results = []
+    for row in rows:
+        result = {column: row[f'cube_{column}'] for column in columns}
+        if 'term' in result and result['term'] is not None:
+            result['term'] = period_label('term', result['term'])
+        for measure in measures:
+            value = row[f'cube_{measure}']
+            result[measure] = round(value, 2) if isinstance(value, float) else value
+        results.append(result)
+    return results
@@ -0,0 +1,193 @@
+import os
+import time
+from zipfile import BadZipFile
+
+import pandas as pd
+from django.db import transaction
+
+from .bulk import upsert_marks
+from .models import GradebookImport, Student, Subject
+
+
+IMPORT_COLUMNS = ('roll_no', 'subject_name', 'marks_obtained', 'attendance_percentage')
+DEFAULT_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+# Stands in for the id of a roll number or subject name shared by several rows
+AMBIGUOUS = -1
+
+
+class ImportFormatError(ValueError):
+    """Raised when an uploaded gradebook cannot be read at all"""
+
+
+def detect_format(filename, file_format=None):
+    file_format = (file_format or os.path.splitext(filename or '')[1].lstrip('.')).lower()
+    if file_format not in ('csv', 'xlsx'):
+        raise ImportFormatError('Gradebook must be a .csv or .xlsx file')
+    return file_format
+
+
+def read_chunks(fileobj, file_format, batch_size):
+    """Yield DataFrames of at most ``batch_size`` rows with every column as text
+
+    Files that cannot be parsed raise ImportFormatError.
+    """
+    if file_format == 'csv':
+        try:
+            reader = pd.read_csv(
+                fileobj, chunksize=batch_size, dtype=str,
+                keep_default_na=False, skipinitialspace=True,
+            )
+            for chunk in reader:
+                chunk.columns = [str(column).strip().lower() for column in chunk.columns]
+                yield chunk
+        except (pd.errors.EmptyDataError, pd.errors.ParserError, UnicodeDecodeError) as e:
+            raise ImportFormatError(f'Could not read the CSV file: {e}')
+        return
+
+    from openpyxl import load_workbook
+    from openpyxl.utils.exceptions import InvalidFileException
+
+    try:
+        workbook = load_workbook(fileobj, read_only=True, data_only=True)
+    except (BadZipFile, InvalidFileException) as e:
+        raise ImportFormatError(f'Could not read the XLSX file: {e}')
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = [str(column or '').strip().lower() for column in header]
+        batch = []
+        for row in rows:
+            if all(value is None for value in row):
+                continue
+            batch.append(['' if value is None else str(value) for value in row])
+            if len(batch) >= batch_size:
+                yield pd.DataFrame(batch, columns=columns)
+                batch = []
+        if batch:
+            yield pd.DataFrame(batch, columns=columns)
+    finally:
+        workbook.close()
+
+
+def lookup_ids(chunk):
+    """(roll_no -> student id, subject_name -> subject id) for the names used in a chunk
+
+    Looked up per chunk through the roll number and subject name indexes,
+    so a class gradebook never reads the whole student table. Names shared
+    by several rows map to AMBIGUOUS.
+    """
+    def used(column):
+        return set(chunk[column].str.strip()) if column in chunk.columns else set()
+
+    def unique(pairs):
+        ids = {}
+        for name, pk in pairs:
+            ids[name] = AMBIGUOUS if name in ids else pk
+        return ids
+
+    return (
+        unique(Student.objects.filter(roll_no__in=used('roll_no')).values_list('roll_no', 'id')),
+        unique(Subject.objects.filter(subject_name__in=used('subject_name')).values_list('subject_name', 'id')),
+    )
+
+
+def validate_chunk(chunk, student_ids, subject_ids, first_line):
+    """Resolve ids and range-check a chunk column-wise
+
+    Returns the valid rows as a DataFrame and a list of per-row errors.
+    """
+    missing = [column for column in IMPORT_COLUMNS if column not in chunk.columns]
+    if missing:
+        raise ImportFormatError(f'Missing columns: {", ".join(missing)}')
+
+    frame = pd.DataFrame({
+        'line': range(first_line, first_line + len(chunk)),
+        'student_id': chunk['roll_no'].str.strip().map(student_ids),
+        'subject_id': chunk['subject_name'].str.strip().map(subject_ids),
+        'marks_obtained': pd.to_numeric(chunk['marks_obtained'].str.strip(), errors='coerce'),
+        'attendance_percentage': pd.to_numeric(chunk['attendance_percentage'].str.strip(), errors='coerce'),
+    })
+
+    checks = [
+        (frame['student_id'].isna(), 'Unknown roll number'),
+        (frame['subject_id'].isna(), 'Unknown subject'),
+        (frame['student_id'] == AMBIGUOUS, 'Roll number belongs to more than one student'),
+        (frame['subject_id'] == AMBIGUOUS, 'Subject name belongs to more than one subject'),
+        (frame['marks_obtained'].isna(), 'Marks must be a number'),
+        (frame['attendance_percentage'].isna(), 'Attendance must be a number'),
+        (~frame['marks_obtained'].between(0, 100), 'Marks must be between 0 and 100'),
+        (frame['marks_obtained'] % 1 != 0, 'Marks must be a whole number'),
+        (~frame['attendance_percentage'].between(0, 100), 'Attendance must be between 0 and 100'),
+    ]
+    errors = []
+    invalid = pd.Series(False, index=frame.index)
+    for mask, message in checks:
+        mask = mask & ~invalid
+        errors.extend({'line': int(line), 'error': message} for line in frame.loc[mask, 'line'])
+        invalid |= mask
+    errors.sort(key=lambda error: error['line'])
+
+    valid = frame[~invalid].astype({'student_id': 'int64', 'subject_id': 'int64', 'marks_obtained': 'int64'})
+    return valid, errors
+
+
+def write_chunk(valid, batch_size):
+    """Upsert the marks of one validated chunk; returns (created, updated)"""
+    rows = valid[
+        ['student_id', 'subject_id', 'marks_obtained', 'attendance_percentage']
+    ].itertuples(index=False, name=None)
+    return upsert_marks(
+        ((int(student_id), int(subject_id), int(marks), float(attendance))
+         for student_id, subject_id, marks, attendance in rows),
+        batch_size=batch_size,
+    )
+
+
+def import_gradebook(fileobj, filename='', file_format=None, batch_size=DEFAULT_BATCH_SIZE):
+    """Import a CSV or XLSX gradebook of marks in batches inside one transaction
+
+    Every line is either written or reported in ``errors`` with its line
+    number; the run and its throughput are recorded as a GradebookImport.
+    """
+    file_format = detect_format(filename, file_format)
+    started = time.perf_counter()
+
+    total = created = updated = error_count = 0
+    errors = []
+    with transaction.atomic():
+        # Line 1 is the header row
+        first_line = 2
+        for chunk in read_chunks(fileobj, file_format, batch_size):
+            valid, chunk_errors = validate_chunk(chunk, *lookup_ids(chunk), first_line)
+            chunk_created, chunk_updated = write_chunk(valid, batch_size)
+            total += len(chunk)
+            created += chunk_created
+            updated += chunk_updated
+            error_count += len(chunk_errors)
+            errors.extend(chunk_errors[:MAX_REPORTED_ERRORS - len(errors)])
+            first_line += len(chunk)
+
+        duration = time.perf_counter() - started
+        record = GradebookImport.objects.create(
+            filename=filename or '',
+            total_rows=total,
+            created_count=created,
+            updated_count=updated,
+            error_count=error_count,
+            duration_seconds=duration,
+            rows_per_second=total / duration if duration else 0,
+        )
+
+    return {
+        'import_id': record.id,
+        'total_rows': total,
+        'created': created,
+        'updated': updated,
+        'error_count': error_count,
+        'errors': errors,
+        'duration_seconds': round(duration, 3),
+        'rows_per_second': round(record.rows_per_second, 1),
+    }
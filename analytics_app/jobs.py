@@ -0,0 +1,274 @@
+"""Background jobs kept in the Job table and run by `manage.py run_workers`
+
+Tasks are registered by kind with ``@task``. A task is called with a
+``progress(percent, message='')`` callback and the job's payload as
+keyword arguments, and returns a JSON-serialisable result. While a task
+runs, its worker moves the job's heartbeat; running jobs whose heartbeat
+stops (the worker died) are put back in the queue by the other workers.
+"""
+import inspect
+import os
+import socket
+import threading
+import traceback
+from datetime import timedelta
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import DatabaseError, OperationalError, connection
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job, Student
+from .rankings import refresh_stale, rerank_all
+from .report_cards import render_report_cards
+from .risk import rescore_all, rescore_stale
+from .suggestions import generate_suggestions
+from .summaries import rebuild_summaries
+from .trends import DEFAULT_PERIODS, roll_up_recent
+
+
+# Seconds before the first retry of a failed job; doubled for every further attempt
+RETRY_DELAY = 30
+HEARTBEAT_INTERVAL = 15
+# Seconds without a heartbeat after which a running job is considered abandoned
+STALE_AFTER = 300
+
+# kind -> function(progress, **payload)
+TASKS = {}
+
+
+def task(kind):
+    def register(func):
+        TASKS[kind] = func
+        return func
+    return register
+
+
+def enqueue(kind, payload=None, user=None, max_attempts=3, delay=0):
+    """Queue a job of a registered kind; raises ValueError for unknown kinds or payloads"""
+    func = TASKS.get(kind)
+    if func is None:
+        raise ValueError(f'Unknown job kind: {kind}')
+    payload = payload or {}
+    if not isinstance(payload, dict):
+        raise ValueError('Payload must be an object')
+    try:
+        inspect.signature(func).bind(None, **payload)
+    except TypeError as exc:
+        raise ValueError(f'Invalid payload for {kind}: {exc}')
+    return Job.objects.create(
+        kind=kind,
+        payload=payload,
+        created_by=user if user is not None and user.is_authenticated else None,
+        max_attempts=max(max_attempts, 1),
+        run_after=timezone.now() + timedelta(seconds=delay),
+    )
+
+
+def enqueue_unless_pending(kind, payload=None, **options):
+    """``enqueue`` unless a job of this kind and payload is already queued or running; None then
+
+    The check is a query on the Job table, so it holds across every web
+    process and nothing piles up while no worker runs.
+    """
+    pending = Job.objects.filter(kind=kind, status__in=[Job.QUEUED, Job.RUNNING], payload=payload or {})
+    if pending.exists():
+        return None
+    return enqueue(kind, payload, **options)
+
+
+def job_payload(job):
+    return {
+        'id': job.pk,
+        'kind': job.kind,
+        'status': job.status,
+        'progress': round(job.progress, 1),
+        'message': job.message,
+        'result': job.result,
+        'error': job.error.strip().splitlines()[-1] if job.error else None,
+        'attempts': job.attempts,
+        'max_attempts': job.max_attempts,
+        'created_at': job.created_at.isoformat(),
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
+def worker_name(index=0):
+    return f'{socket.gethostname()}:{os.getpid()}:{index}'
+
+
+def claim_job(worker):
+    """Mark the oldest due queued job as running for ``worker``; None when none is due
+
+    The UPDATE only matches while the job is still queued, so of several
+    workers picking the same job exactly one gets it.
+    """
+    while True:
+        now = timezone.now()
+        candidates = list(
+            Job.objects.filter(status=Job.QUEUED, run_after__lte=now)
+            .order_by('run_after', 'id').values_list('id', flat=True)[:10]
+        )
+        if not candidates:
+            return None
+        for job_id in candidates:
+            claimed = Job.objects.filter(pk=job_id, status=Job.QUEUED).update(
+                status=Job.RUNNING, worker=worker, attempts=F('attempts') + 1,
+                progress=0, message='', started_at=now, heartbeat_at=now,
+            )
+            if claimed:
+                return Job.objects.get(pk=job_id)
+
+
+def requeue_stale(stale_after=STALE_AFTER):
+    """Queue again, or fail once out of attempts, running jobs whose heartbeat stopped"""
+    now = timezone.now()
+    stale = Job.objects.filter(status=Job.RUNNING, heartbeat_at__lt=now - timedelta(seconds=stale_after))
+    error = 'Worker stopped responding'
+    requeued = stale.filter(attempts__lt=F('max_attempts')).update(
+        status=Job.QUEUED, worker='', run_after=now, error=error,
+    )
+    failed = stale.update(status=Job.FAILED, finished_at=now, error=error)
+    return requeued + failed
+
+
+class _Heartbeat(threading.Thread):
+    """Moves a running job's heartbeat until stopped, on its own connection"""
+
+    def __init__(self, job_id):
+        super().__init__(daemon=True)
+        self.job_id = job_id
+        self.stopped = threading.Event()
+
+    def run(self):
+        try:
+            while not self.stopped.wait(HEARTBEAT_INTERVAL):
+                try:
+                    Job.objects.filter(pk=self.job_id, status=Job.RUNNING).update(heartbeat_at=timezone.now())
+                except DatabaseError:
+                    # The task may hold the SQLite write lock; try again next beat
+                    pass
+        finally:
+            connection.close()
+
+
+def run_job(job):
+    """Run a claimed job and record its result, or schedule its retry; True on success"""
+    def progress(percent, message=''):
+        Job.objects.filter(pk=job.pk).update(
+            progress=min(max(percent, 0), 100), message=message[:255], heartbeat_at=timezone.now(),
+        )
+
+    func = TASKS.get(job.kind)
+    if func is None:
+        Job.objects.filter(pk=job.pk).update(
+            status=Job.FAILED, error=f'Unknown job kind: {job.kind}', finished_at=timezone.now(),
+        )
+        return False
+
+    heartbeat = _Heartbeat(job.pk)
+    heartbeat.start()
+    try:
+        result = func(progress, **job.payload)
+    except Exception:
+        now = timezone.now()
+        error = traceback.format_exc()
+        if job.attempts < job.max_attempts:
+            delay = RETRY_DELAY * 2 ** (job.attempts - 1)
+            Job.objects.filter(pk=job.pk).update(
+                status=Job.QUEUED, worker='', error=error, run_after=now + timedelta(seconds=delay),
+            )
+        else:
+            Job.objects.filter(pk=job.pk).update(status=Job.FAILED, error=error, finished_at=now)
+        return False
+    finally:
+        heartbeat.stopped.set()
+        heartbeat.join()
+
+    Job.objects.filter(pk=job.pk).update(
+        status=Job.SUCCEEDED, progress=100, result=result, finished_at=timezone.now(),
+    )
+    return True
+
+
+def work(worker, stop, poll_interval=1.0, burst=False, stale_after=STALE_AFTER):
+    """Claim and run jobs until ``stop`` is set, or the queue is empty with ``burst``
+
+    A database that stays locked or goes away makes the worker back off
+    for ``poll_interval`` and try again. A job whose result could not be
+    recorded is queued again once its heartbeat goes stale.
+    """
+    try:
+        while not stop.is_set():
+            try:
+                job = claim_job(worker)
+                if job is not None:
+                    run_job(job)
+                    continue
+                if requeue_stale(stale_after):
+                    continue
+            except OperationalError:
+                connection.close_if_unusable_or_obsolete()
+                stop.wait(poll_interval)
+                continue
+            if burst:
+                return
+            stop.wait(poll_interval)
+    finally:
+        connection.close()
+
+
+@task('rebuild_summaries')
+def _rebuild_summaries(progress, batch_size=1000):
+    progress(0, 'Rebuilding student and subject summaries')
+    students, subjects = rebuild_summaries(batch_size=batch_size)
+    return {'students': students, 'subjects': subjects}
+
+
+@task('generate_suggestions')
+def _generate_suggestions(progress, departments=None, workers=1):
+    progress(0, 'Generating suggestions')
+    students, suggestions = generate_suggestions(departments=departments, workers=workers)
+    return {'students': students, 'suggestions': suggestions}
+
+
+@task('score_risk')
+def _score_risk(progress, everyone=False):
+    progress(0, 'Scoring every student' if everyone else 'Rescoring changed students')
+    return {'students': rescore_all() if everyone else rescore_stale()}
+
+
+@task('rank_students')
+def _rank_students(progress, everyone=False):
+    progress(0, 'Ranking every group' if everyone else 'Re-ranking changed groups')
+    if everyone:
+        return {'rankings': rerank_all()}
+    return {'groups': refresh_stale()}
+
+
+@task('roll_up_trends')
+def _roll_up_trends(progress, period='week', count=DEFAULT_PERIODS):
+    progress(0, f'Rolling up closed {period} periods')
+    return {'periods': roll_up_recent(period, count)}
+
+
+@task('generate_report_cards')
+def _generate_report_cards(progress, department=None, workers=None):
+    progress(0, f'Rendering report cards of {department}' if department else 'Rendering report cards')
+    students = Student.objects.all()
+    if department:
+        students = students.filter(department=department)
+    workers = workers or getattr(settings, 'ANALYTICS_REPORT_CARD_WORKERS', None)
+    return {'cards': render_report_cards(students, workers=workers)}
+
+
+@task('add_dummy_data')
+def _add_dummy_data(progress, **options):
+    progress(0, 'Generating synthetic data')
+    output = StringIO()
+    call_command('add_dummy_data', stdout=output, **options)
+    lines = output.getvalue().strip().splitlines()
+    return {'output': lines[-1] if lines else ''}
@@ -0,0 +1,217 @@
+import base64
+import binascii
+import datetime
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+EXPORT_CHUNK_SIZE = 2000
+
+# Public field name -> ORM lookup, for ``fields=`` projection
+MARK_FIELDS = {
+    'id': 'id',
+    'student_id': 'student_id',
+    'student_name': 'student__name',
+    'student_roll_no': 'student__roll_no',
+    'student_department': 'student__department',
+    'subject_id': 'subject_id',
+    'subject_name': 'subject__subject_name',
+    'marks_obtained': 'marks_obtained',
+    'attendance_percentage': 'attendance_percentage',
+    'assessed_on': 'assessed_on',
+}
+DEFAULT_MARK_FIELDS = (
+    'id', 'student_id', 'student_name', 'student_roll_no',
+    'subject_id', 'subject_name', 'marks_obtained', 'attendance_percentage',
+)
+
+STUDENT_FIELDS = {
+    'id': 'id',
+    'name': 'name',
+    'roll_no': 'roll_no',
+    'department': 'department',
+    'user_id': 'user_id',
+}
+DEFAULT_STUDENT_FIELDS = ('id', 'name', 'roll_no', 'department')
+
+# Query parameter -> (ORM lookup, value parser)
+MARK_FILTERS = {
+    'subject': ('subject_id', int),
+    'student': ('student_id', int),
+    'department': ('student__department', str),
+    'min_marks': ('marks_obtained__gte', int),
+    'max_marks': ('marks_obtained__lte', int),
+    'min_attendance': ('attendance_percentage__gte', float),
+    'max_attendance': ('attendance_percentage__lte', float),
+    'assessed_from': ('assessed_on__gte', datetime.date.fromisoformat),
+    'assessed_to': ('assessed_on__lte', datetime.date.fromisoformat),
+}
+STUDENT_FILTERS = {
+    'department': ('department', str),
+    'roll_no': ('roll_no', str),
+}
+
+
+class ListingError(ValueError):
+    """Raised for query parameters a list endpoint cannot honour"""
+
+
+def apply_filters(queryset, params, filters):
+    """Narrow ``queryset`` by every recognised filter present in ``params``"""
+    lookups = {}
+    for param, (lookup, parse) in filters.items():
+        value = params.get(param)
+        if value in (None, ''):
+            continue
+        try:
+            lookups[lookup] = parse(value)
+        except ValueError:
+            raise ListingError(f'Invalid value for {param}: {value}')
+    return queryset.filter(**lookups)
+
+
+def parse_fields(params, available, default):
+    """Public field names requested through ``fields=``, in request order"""
+    requested = params.get('fields')
+    if not requested:
+        return list(default)
+    fields = [name.strip() for name in requested.split(',') if name.strip()]
+    unknown = [name for name in fields if name not in available]
+    if unknown:
+        raise ListingError(f'Unknown fields: {", ".join(unknown)}')
+    return fields
+
+
+def parse_page_size(params):
+    value = params.get('limit')
+    if not value:
+        return PAGE_SIZE
+    try:
+        size = int(value)
+    except ValueError:
+        raise ListingError(f'Invalid value for limit: {value}')
+    if size < 1:
+        raise ListingError('limit must be at least 1')
+    return min(size, MAX_PAGE_SIZE)
+
+
+def encode_cursor(last_id):
+    return base64.urlsafe_b64encode(f'id:{last_id}'.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        prefix, last_id = base64.urlsafe_b64decode(padded.encode()).decode().split(':')
+        if prefix != 'id':
+            raise ValueError(prefix)
+        return int(last_id)
+    except (ValueError, UnicodeDecodeError, binascii.Error):
+        raise ListingError('Invalid cursor')
+
+
+def encode_position(values):
+    """Opaque cursor for a row's values of the ordering columns"""
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip('=')
+
+
+def decode_position(cursor, length):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, UnicodeDecodeError, binascii.Error):
+        raise ListingError('Invalid cursor')
+    if not isinstance(values, list) or len(values) != length:
+        raise ListingError('Invalid cursor')
+    return values
+
+
+def after_position(ordering, values):
+    """Q for the rows that come after ``values`` in ``ordering`` (names, '-' for descending)"""
+    after = Q()
+    equal = Q()
+    for name, value in zip(ordering, values):
+        field = name.lstrip('-')
+        after |= equal & Q(**{f'{field}__{"lt" if name.startswith("-") else "gt"}': value})
+        equal &= Q(**{field: value})
+    # Implied by the OR above, but lets the database seek an index on the first column
+    first = ordering[0]
+    return Q(**{f'{first.lstrip("-")}__{"lte" if first.startswith("-") else "gte"}': values[0]}) & after
+
+
+def keyset_page(queryset, ordering, size, cursor=None):
+    """One page of ``queryset`` (a values() queryset) in ``ordering``, starting after ``cursor``
+
+    The last column of ``ordering`` must be unique. Returns the rows and
+    the cursor of the next page, or None on the last page.
+    """
+    fields = [name.lstrip('-') for name in ordering]
+    if cursor:
+        queryset = queryset.filter(after_position(ordering, decode_position(cursor, len(ordering))))
+    rows = list(queryset.order_by(*ordering)[:size + 1])
+    if len(rows) <= size:
+        return rows, None
+    rows = rows[:size]
+    return rows, encode_position([rows[-1][field] for field in fields])
+
+
+def paginate(queryset, params, fields, available):
+    """One keyset page of ``queryset`` projected to ``fields``
+
+    Rows are ordered by id and the page starts after the id carried in the
+    opaque ``cursor`` parameter, so every page costs the same to fetch.
+    """
+    size = parse_page_size(params)
+    cursor = params.get('cursor')
+    if cursor:
+        queryset = queryset.filter(id__gt=decode_cursor(cursor))
+
+    rows = list(
+        queryset
+        .order_by('id')
+        .values_list('id', *[available[name] for name in fields])[:size + 1]
+    )
+    has_more = len(rows) > size
+    rows = rows[:size]
+    return {
+        'results': [dict(zip(fields, row[1:])) for row in rows],
+        'next_cursor': encode_cursor(rows[-1][0]) if has_more else None,
+    }
+
+
+def iter_rows(queryset, fields, available, chunk_size=EXPORT_CHUNK_SIZE):
+    """Every row of ``queryset`` as a dict of ``fields``, fetched ``chunk_size`` at a time"""
+    rows = (
+        queryset
+        .order_by('id')
+        .values_list(*[available[name] for name in fields])
+        .iterator(chunk_size=chunk_size)
+    )
+    for row in rows:
+        yield dict(zip(fields, row))
+
+
+def iter_ndjson(rows, lines_per_chunk=EXPORT_CHUNK_SIZE):
+    """Encode rows as newline-delimited JSON, a few thousand lines per chunk"""
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(row, cls=DjangoJSONEncoder))
+        if len(lines) >= lines_per_chunk:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+def iter_json_array(rows, lines_per_chunk=EXPORT_CHUNK_SIZE):
+    """Encode rows as a single JSON array without building it in memory"""
+    yield '['
+    separator = ''
+    for chunk in iter_ndjson(rows, lines_per_chunk):
+        yield separator + chunk.rstrip('\n').replace('\n', ',')
+        separator = ','
+    yield ']'
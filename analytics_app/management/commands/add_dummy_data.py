@@ -1,100 +1,172 @@
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
 from analytics_app.models import Student, Subject, Mark
-import random
+from analytics_app.summaries import rebuild_summaries
+from analytics_app.caching import TRACKED_TABLES, bump_versions
+from analytics_app.trends import clear_rollups
+from analytics_app.snapshot import build_snapshot, load_snapshot
+from analytics_app.risk import mark_risk_stale
+from analytics_app.rankings import mark_groups_stale
+from analytics_app import synthetic
+from django.utils import timezone
+from multiprocessing import Pool
+import numpy as np
+import datetime
+import time
 
 
 class Command(BaseCommand):
-    help = 'Add dummy students, subjects, and marks to the database'
+    help = 'Add synthetic students, subjects, and marks to the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=10,
+                            help='Number of students to generate')
+        parser.add_argument('--subjects', type=int, default=5,
+                            help='Number of subjects every student is graded in')
+        parser.add_argument('--departments', type=int, default=1,
+                            help='Number of departments students are spread over')
+        parser.add_argument('--seed', type=int, default=None,
+                            help='Random seed; the same seed always produces the same data')
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Rows per INSERT batch')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Processes generating marks in parallel with the writer')
+        parser.add_argument('--history-days', type=int, default=365,
+                            help='Assessment dates are spread over this many days up to today')
 
     def handle(self, *args, **options):
-        # List of subjects to add
-        subjects_to_add = [
-            'Wireless Technology',
-            'Network Protocols',
-            'Basic Circuits',
-            'Big Data Analytics',
-            'IoT Sensors'
-        ]
+        self.verbosity = options['verbosity']
+        for option in ('students', 'subjects', 'departments', 'batch_size', 'workers', 'history_days'):
+            if options[option] < 1:
+                raise CommandError(f'--{option.replace("_", "-")} must be at least 1')
+
+        seed = options['seed']
+        if seed is None:
+            seed = int(np.random.SeedSequence().entropy % 2 ** 32)
+        batch_size = options['batch_size']
+        started = time.perf_counter()
+
+        subject_ids = self.add_subjects(options['subjects'])
+        department_list = synthetic.departments(options['departments'])
+        student_ids, department_indices = self.add_students(
+            options['students'], department_list, seed, batch_size,
+        )
+        marks = self.add_marks(
+            student_ids, department_indices, subject_ids, seed, batch_size, options['workers'],
+            options['history_days'],
+        )
+
+        # Bulk inserts skip the model signals, so rebuild summaries in one
+        # pass, invalidate trend rollups and cached analytics explicitly and
+        # queue the new students for risk scoring and ranking
+        rebuild_summaries(batch_size=batch_size)
+        clear_rollups()
+        mark_risk_stale(student_ids)
+        mark_groups_stale((department, subject_id) for department, _ in department_list for subject_id in subject_ids)
+        bump_versions(*TRACKED_TABLES)
+        if load_snapshot() is not None:
+            snapshot = build_snapshot()
+            self.stdout.write(self.style.SUCCESS(f'✓ Marks snapshot rebuilt ({len(snapshot)} marks)'))
 
-        # Check if subjects already exist, if not, add them
-        existing_subjects = Subject.objects.values_list('subject_name', flat=True)
-        
-        if existing_subjects.count() == 0:
-            self.stdout.write(self.style.WARNING('No subjects found. Adding 5 subjects...'))
-            
-            for subject_name in subjects_to_add:
-                subject, created = Subject.objects.get_or_create(subject_name=subject_name)
-                if created:
-                    self.stdout.write(self.style.SUCCESS(f'✓ Created subject: {subject_name}'))
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'\n✓ Dummy data added successfully! {len(student_ids)} students, '
+            f'{len(subject_ids)} subjects, {marks} new marks in {elapsed:.1f}s (seed {seed})'
+        ))
+
+    def add_subjects(self, count):
+        names = synthetic.subject_names(count)
+        existing = dict(Subject.objects.filter(subject_name__in=names).values_list('subject_name', 'id'))
+        missing = [name for name in names if name not in existing]
+        if missing:
+            Subject.objects.bulk_create([Subject(subject_name=name) for name in missing])
+            existing = dict(Subject.objects.filter(subject_name__in=names).values_list('subject_name', 'id'))
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {len(names)} subjects ({len(missing)} created)'
+        ))
+        return [existing[name] for name in names]
+
+    def add_students(self, count, department_list, seed, batch_size):
+        """Create missing students; returns their ids and department indices in sequence order"""
+        self.stdout.write(self.style.WARNING(f'\nAdding {count} students...'))
+        width = max(3, len(str(-(-count // len(department_list)))))
+        department_index = {name: index for index, (name, _) in enumerate(department_list)}
+        student_ids, department_indices = [], []
+        created = 0
+
+        for chunk, first in enumerate(range(0, count, batch_size)):
+            rows = synthetic.generate_students(
+                seed, chunk, first, min(batch_size, count - first), department_list, width,
+            )
+            roll_numbers = [roll_no for _, roll_no, _ in rows]
+            existing = dict(Student.objects.filter(roll_no__in=roll_numbers).values_list('roll_no', 'id'))
+            new_students = [
+                Student(name=name, roll_no=roll_no, department=department)
+                for name, roll_no, department in rows
+                if roll_no not in existing
+            ]
+            if new_students:
+                Student.objects.bulk_create(new_students)
+                if new_students[0].pk is None:
+                    # Backends without RETURNING need a lookup for the new ids
+                    existing = dict(Student.objects.filter(roll_no__in=roll_numbers).values_list('roll_no', 'id'))
                 else:
-                    self.stdout.write(f'Subject already exists: {subject_name}')
+                    existing.update((student.roll_no, student.pk) for student in new_students)
+                created += len(new_students)
+
+            for _, roll_no, department in rows:
+                student_ids.append(existing[roll_no])
+                department_indices.append(department_index[department])
+            if self.verbosity >= 2:
+                self.stdout.write(f'  {first + len(rows)}/{count} students')
+
+        self.stdout.write(self.style.SUCCESS(f'✓ {count} students ({created} created)'))
+        return student_ids, department_indices
+
+    def add_marks(self, student_ids, department_indices, subject_ids, seed, batch_size, workers, history_days):
+        """Generate marks chunk by chunk, optionally in worker processes; returns rows inserted"""
+        self.stdout.write(self.style.WARNING('\nAdding marks and attendance for students...'))
+        students_per_chunk = max(1, batch_size // len(subject_ids))
+        tasks = (
+            (seed, chunk, student_ids[first:first + students_per_chunk],
+             department_indices[first:first + students_per_chunk], subject_ids, history_days)
+            for chunk, first in enumerate(range(0, len(student_ids), students_per_chunk))
+        )
+        before = Mark.objects.count()
+        total = len(student_ids) * len(subject_ids)
+        written = 0
+
+        if workers > 1:
+            # Forked workers must not share the parent's database connection
+            connections.close_all()
+            with Pool(workers) as pool:
+                for rows in pool.imap(synthetic.generate_marks, tasks):
+                    written += self.write_marks(rows, batch_size)
+                    self.report_progress(written, total)
         else:
-            self.stdout.write(self.style.SUCCESS(f'✓ Found {existing_subjects.count()} existing subjects'))
-            for subject in existing_subjects:
-                self.stdout.write(f'  - {subject}')
-
-        # Dummy student data
-        dummy_students_data = [
-            {'name': 'Aarav Kumar', 'roll_no': 'CS001', 'department': 'Computer Science'},
-            {'name': 'Bhavna Singh', 'roll_no': 'CS002', 'department': 'Computer Science'},
-            {'name': 'Chirag Patel', 'roll_no': 'CS003', 'department': 'Computer Science'},
-            {'name': 'Diya Sharma', 'roll_no': 'CS004', 'department': 'Computer Science'},
-            {'name': 'Eshaan Desai', 'roll_no': 'CS005', 'department': 'Computer Science'},
-            {'name': 'Fiona Gupta', 'roll_no': 'CS006', 'department': 'Computer Science'},
-            {'name': 'Gagan Roy', 'roll_no': 'CS007', 'department': 'Computer Science'},
-            {'name': 'Hina Verma', 'roll_no': 'CS008', 'department': 'Computer Science'},
-            {'name': 'Ishaan Khan', 'roll_no': 'CS009', 'department': 'Computer Science'},
-            {'name': 'Jiya Nair', 'roll_no': 'CS010', 'department': 'Computer Science'},
+            for task in tasks:
+                written += self.write_marks(synthetic.generate_marks(task), batch_size)
+                self.report_progress(written, total)
+
+        created = Mark.objects.count() - before
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {total} marks ({created} created, {total - created} already existed)'
+        ))
+        return created
+
+    def write_marks(self, rows, batch_size):
+        today = timezone.localdate()
+        new_marks = [
+            Mark(student_id=student_id, subject_id=subject_id,
+                 marks_obtained=marks, attendance_percentage=attendance,
+                 assessed_on=today - datetime.timedelta(days=days_ago))
+            for student_id, subject_id, marks, attendance, days_ago in rows
         ]
+        with transaction.atomic():
+            # Existing (student, subject) pairs are left untouched
+            Mark.objects.bulk_create(new_marks, batch_size=batch_size, ignore_conflicts=True)
+        return len(new_marks)
 
-        # Add dummy students
-        self.stdout.write(self.style.WARNING('\nAdding 10 dummy students...'))
-        created_students = []
-        
-        for student_data in dummy_students_data:
-            student, created = Student.objects.get_or_create(
-                roll_no=student_data['roll_no'],
-                defaults={
-                    'name': student_data['name'],
-                    'department': student_data['department']
-                }
-            )
-            
-            if created:
-                self.stdout.write(self.style.SUCCESS(f'✓ Created student: {student.name} ({student.roll_no})'))
-                created_students.append(student)
-            else:
-                self.stdout.write(f'Student already exists: {student.name}')
-                created_students.append(student)
-
-        # Add marks for students
-        self.stdout.write(self.style.WARNING('\nAdding marks and attendance for students...'))
-        
-        all_subjects = Subject.objects.all()
-        
-        for student in created_students:
-            for subject in all_subjects:
-                # Check if mark already exists
-                mark_exists = Mark.objects.filter(
-                    student=student,
-                    subject=subject
-                ).exists()
-                
-                if not mark_exists:
-                    # Generate random marks and attendance
-                    marks = random.randint(30, 100)
-                    attendance = random.uniform(50, 100)
-                    
-                    Mark.objects.create(
-                        student=student,
-                        subject=subject,
-                        marks_obtained=marks,
-                        attendance_percentage=round(attendance, 2)
-                    )
-                    
-                    self.stdout.write(
-                        f'✓ Added marks for {student.name} in {subject.subject_name}: '
-                        f'{marks} marks, {round(attendance, 2)}% attendance'
-                    )
-
-        self.stdout.write(self.style.SUCCESS('\n✓ Dummy data added successfully!'))
+    def report_progress(self, written, total):
+        if self.verbosity >= 2:
+            self.stdout.write(f'  {written}/{total} marks')
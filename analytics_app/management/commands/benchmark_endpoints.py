@@ -0,0 +1,67 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from analytics_app.benchmarks import (
+    DATASET_SIZES, DEFAULT_BUDGETS, budget_violations, run_benchmarks, seeded_test_database,
+)
+
+
+class Command(BaseCommand):
+    help = ('Seed a throwaway test database, request every endpoint and report latency, '
+            'query count and peak memory; fails when a budget is exceeded')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', choices=sorted(DATASET_SIZES), default='1k',
+                            help='Number of marks to seed')
+        parser.add_argument('--repeat', type=int, default=20,
+                            help='Timed requests per endpoint')
+        parser.add_argument('--warmup', type=int, default=2,
+                            help='Untimed requests per endpoint before measuring')
+        parser.add_argument('--only', nargs='+', metavar='URL_NAME',
+                            help='Only benchmark these URL names')
+        parser.add_argument('--budgets', metavar='PATH',
+                            help='JSON file of {"url_name": {"queries": n, "p95_ms": ms}} '
+                                 'merged over the default budgets')
+        parser.add_argument('--json', action='store_true',
+                            help='Print the results as JSON instead of a table')
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1:
+            raise CommandError('--repeat must be at least 1')
+        budgets = {name: dict(limits) for name, limits in DEFAULT_BUDGETS.items()}
+        if options['budgets']:
+            try:
+                with open(options['budgets']) as budget_file:
+                    for name, limits in json.load(budget_file).items():
+                        budgets.setdefault(name, {}).update(limits)
+            except (OSError, ValueError) as e:
+                raise CommandError(f'Cannot read budgets: {e}')
+
+        with seeded_test_database(DATASET_SIZES[options['size']]):
+            results = run_benchmarks(
+                repeat=options['repeat'], warmup=options['warmup'], only=options['only'],
+            )
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+        else:
+            self.write_table(results, options['size'])
+
+        violations = budget_violations(results, budgets)
+        if violations:
+            for violation in violations:
+                self.stderr.write(self.style.ERROR(f'✗ {violation}'))
+            raise CommandError(f'{len(violations)} benchmark budget(s) exceeded')
+        self.stdout.write(self.style.SUCCESS(f'\n✓ All budgets met ({len(results)} endpoints)'))
+
+    def write_table(self, results, size):
+        self.stdout.write(self.style.WARNING(f'Benchmark with {size} marks\n'))
+        header = f'{"endpoint":<28} {"status":<10} {"p50 ms":>9} {"p95 ms":>9} {"queries":>8} {"peak KiB":>10}'
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for result in results:
+            status = ','.join(str(code) for code in result['status'])
+            self.stdout.write(
+                f'{result["name"]:<28} {status:<10} {result["p50_ms"]:>9} {result["p95_ms"]:>9} '
+                f'{result["queries"]:>8} {result["peak_kib"]:>10}'
+            )
@@ -0,0 +1,44 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from analytics_app.benchmarks import DATASET_SIZES, seeded_test_database
+from analytics_app.query_plans import check_query_plans
+
+
+class Command(BaseCommand):
+    help = ('Request every endpoint against a seeded test database, EXPLAIN the SQL it runs '
+            'and fail on full scans of large tables')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', choices=sorted(DATASET_SIZES), default='1k',
+                            help='Number of marks to seed')
+        parser.add_argument('--min-rows', type=int, default=100,
+                            help='Only flag scans of tables with at least this many rows')
+        parser.add_argument('--only', nargs='+', metavar='URL_NAME',
+                            help='Only check these URL names')
+        parser.add_argument('--json', action='store_true',
+                            help='Print the results as JSON')
+
+    def handle(self, *args, **options):
+        with seeded_test_database(DATASET_SIZES[options['size']]):
+            results = check_query_plans(only=options['only'], min_rows=options['min_rows'])
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+        else:
+            self.write_report(results)
+
+        flagged = [result for result in results if result['scans']]
+        if flagged:
+            raise CommandError(f'{len(flagged)} endpoint(s) scan a large table in full')
+        self.stdout.write(self.style.SUCCESS(f'\n✓ No unexpected full scans ({len(results)} endpoints)'))
+
+    def write_report(self, results):
+        for result in results:
+            if not result['scans']:
+                self.stdout.write(f'✓ {result["name"]} ({result["statements"]} statements)')
+                continue
+            self.stdout.write(self.style.ERROR(f'✗ {result["name"]} {result["url"]}'))
+            for scan in result['scans']:
+                self.stdout.write(f'    {scan["detail"]} ({scan["rows"]} rows)')
+                self.stdout.write(f'    {scan["sql"][:300]}')
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+from analytics_app.importer import DEFAULT_BATCH_SIZE, ImportFormatError, import_gradebook
+
+
+class Command(BaseCommand):
+    help = 'Import marks from a CSV or XLSX gradebook (roll_no, subject_name, marks_obtained, attendance_percentage)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Path to the .csv or .xlsx file')
+        parser.add_argument('--format', choices=['csv', 'xlsx'],
+                            help='File format (defaults to the file extension)')
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                            help='Rows read and written per batch')
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['path'], 'rb') as fileobj:
+                report = import_gradebook(
+                    fileobj,
+                    filename=options['path'],
+                    file_format=options['format'],
+                    batch_size=options['batch_size'],
+                )
+        except (OSError, ImportFormatError) as e:
+            raise CommandError(str(e))
+
+        for error in report['errors']:
+            self.stdout.write(self.style.WARNING(f"Line {error['line']}: {error['error']}"))
+        if report['error_count'] > len(report['errors']):
+            self.stdout.write(self.style.WARNING(
+                f"... and {report['error_count'] - len(report['errors'])} more errors"
+            ))
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ Imported {report['total_rows']} rows: {report['created']} created, "
+            f"{report['updated']} updated, {report['error_count']} rejected "
+            f"({report['rows_per_second']} rows/sec)"
+        ))
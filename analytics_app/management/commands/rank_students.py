@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+from analytics_app.rankings import refresh_stale, rerank_all
+
+
+class Command(BaseCommand):
+    help = 'Re-rank the groups whose marks changed since the last run, or every group with --all'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='Rank every group from scratch')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        if options['all']:
+            message = f'{rerank_all()} rankings written'
+        else:
+            message = f'{refresh_stale()} groups re-ranked'
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {message} ({time.perf_counter() - started:.2f}s)'
+        ))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from analytics_app.summaries import rebuild_summaries
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the student and subject summary tables from all marks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Number of summary rows written per INSERT')
+
+    def handle(self, *args, **options):
+        students, subjects = rebuild_summaries(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ Rebuilt summaries for {students} students and {subjects} subjects'
+        ))
@@ -0,0 +1,73 @@
+import multiprocessing
+import signal
+import threading
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from analytics_app.jobs import STALE_AFTER, work, worker_name
+
+
+def run_threads(threads, stop, options):
+    """Run ``threads`` workers in this process until ``stop`` is set"""
+    pool = [
+        threading.Thread(target=work, args=(worker_name(index), stop), kwargs=options)
+        for index in range(threads)
+    ]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+
+
+class Command(BaseCommand):
+    help = 'Run queued background jobs in a pool of worker processes and threads'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=1,
+                            help='Number of worker processes')
+        parser.add_argument('--threads', type=int, default=1,
+                            help='Number of worker threads in every process')
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='Seconds an idle worker waits before looking for due jobs again')
+        parser.add_argument('--stale-after', type=int, default=STALE_AFTER,
+                            help='Seconds without a heartbeat before a running job is requeued')
+        parser.add_argument('--burst', action='store_true',
+                            help='Exit once no job is due instead of waiting for more')
+
+    def handle(self, *args, **options):
+        processes, threads = options['processes'], options['threads']
+        if processes < 1 or threads < 1:
+            raise CommandError('--processes and --threads must be at least 1')
+        if processes > 1 and 'fork' not in multiprocessing.get_all_start_methods():
+            raise CommandError('--processes needs the fork start method; use --threads instead')
+        work_options = {
+            'poll_interval': options['poll_interval'],
+            'burst': options['burst'],
+            'stale_after': options['stale_after'],
+        }
+
+        context = multiprocessing.get_context('fork') if processes > 1 else None
+        # A process-shared event when forking, so one signal stops every worker
+        stop = context.Event() if context else threading.Event()
+
+        def shutdown(signum, frame):
+            stop.set()
+
+        signal.signal(signal.SIGTERM, shutdown)
+        signal.signal(signal.SIGINT, shutdown)
+        self.stdout.write(f'Running jobs with {processes} process(es) of {threads} thread(s)')
+
+        if context is None:
+            run_threads(threads, stop, work_options)
+        else:
+            # Forked children must open their own connections
+            connections.close_all()
+            children = [
+                context.Process(target=run_threads, args=(threads, stop, work_options))
+                for _ in range(processes)
+            ]
+            for child in children:
+                child.start()
+            for child in children:
+                child.join()
+        self.stdout.write(self.style.SUCCESS('✓ Workers stopped'))
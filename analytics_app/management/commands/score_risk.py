@@ -0,0 +1,19 @@
+import time
+
+from django.core.management.base import BaseCommand
+from analytics_app.risk import rescore_all, rescore_stale
+
+
+class Command(BaseCommand):
+    help = 'Rescore students whose marks changed since the last run, or everyone with --all'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='Score every student from scratch')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        scored = rescore_all() if options['all'] else rescore_stale()
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ Scored {scored} students ({time.perf_counter() - started:.2f}s)'
+        ))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+from analytics_app.profiling import SORT_KEYS, list_profiles, summarize_profile
+
+
+class Command(BaseCommand):
+    help = 'List the captured request profiles, or summarize one of them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('profile', nargs='?',
+                            help='File name of the profile to summarize')
+        parser.add_argument('--sort', choices=SORT_KEYS, default='cumulative',
+                            help='Order of the functions in the summary')
+        parser.add_argument('--limit', type=int, default=25,
+                            help='Number of functions in the summary')
+
+    def handle(self, *args, **options):
+        try:
+            if options['profile']:
+                self.stdout.write(summarize_profile(options['profile'], options['sort'], options['limit']))
+                return
+            profiles = list_profiles()
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        if not profiles:
+            self.stdout.write('No profiles captured yet')
+            return
+        self.stdout.write(f'{"profile":<60} {"view":<28} {"user":>6} {"seconds":>9} {"calls":>10}')
+        for profile in profiles:
+            self.stdout.write(
+                f'{profile["name"]:<60} {profile["view"]:<28} {profile["user_id"]:>6} '
+                f'{profile["seconds"]:>9.3f} {profile["calls"]:>10}'
+            )
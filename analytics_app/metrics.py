@@ -0,0 +1,116 @@
+"""Per-view request metrics kept in process memory, rendered for Prometheus
+
+RequestMetricsMiddleware feeds every request in; observations go into
+histograms per view name. They are cumulative, as Prometheus expects, and
+``rate()`` over a scrape window gives the rolling picture. Each worker
+process keeps its own counts, like the cache statistics.
+"""
+import threading
+from bisect import bisect_left
+
+from django.conf import settings
+from django.utils import timezone
+
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 250)
+SIZE_BUCKETS = (1024, 10240, 102400, 1048576, 10485760)
+
+# Metric name -> (help text, bucket upper bounds)
+METRICS = {
+    'analytics_request_duration_seconds': ('Time spent handling the request', DURATION_BUCKETS),
+    'analytics_request_sql_seconds': ('Time spent executing SQL statements', DURATION_BUCKETS),
+    'analytics_request_queries': ('SQL statements executed', QUERY_BUCKETS),
+    'analytics_response_size_bytes': ('Size of the response body', SIZE_BUCKETS),
+}
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+_lock = threading.Lock()
+_log_lock = threading.Lock()
+# (metric, view) -> Histogram
+_histograms = {}
+
+
+class Histogram:
+    """Counts per bucket (not cumulative), plus the sum and count of observations"""
+
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        index = bisect_left(self.buckets, value)
+        if index < len(self.counts):
+            self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+
+def record_request(view, duration, sql_seconds, queries, size):
+    """Add one request's observations to the histograms of ``view``"""
+    values = zip(METRICS, (duration, sql_seconds, queries, size))
+    with _lock:
+        for metric, value in values:
+            histogram = _histograms.get((metric, view))
+            if histogram is None:
+                histogram = _histograms[(metric, view)] = Histogram(METRICS[metric][1])
+            histogram.observe(value)
+
+
+def reset_metrics():
+    with _lock:
+        _histograms.clear()
+
+
+def _label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render_metrics():
+    """Every histogram in the Prometheus text exposition format"""
+    with _lock:
+        snapshot = {
+            key: (list(histogram.counts), histogram.sum, histogram.count)
+            for key, histogram in _histograms.items()
+        }
+    lines = []
+    for metric, (help_text, buckets) in METRICS.items():
+        lines.append(f'# HELP {metric} {help_text}')
+        lines.append(f'# TYPE {metric} histogram')
+        for (name, view), (counts, total, count) in sorted(snapshot.items()):
+            if name != metric:
+                continue
+            view = _label(view)
+            running = 0
+            for bound, bucket_count in zip(buckets, counts):
+                running += bucket_count
+                lines.append(f'{metric}_bucket{{view="{view}",le="{bound}"}} {running}')
+            lines.append(f'{metric}_bucket{{view="{view}",le="+Inf"}} {count}')
+            lines.append(f'{metric}_sum{{view="{view}"}} {total}')
+            lines.append(f'{metric}_count{{view="{view}"}} {count}')
+    return '\n'.join(lines) + '\n'
+
+
+def slow_query_seconds():
+    """The slow-query threshold in seconds, or None when the log is off"""
+    threshold = getattr(settings, 'ANALYTICS_SLOW_QUERY_MS', None)
+    if threshold is None or not getattr(settings, 'ANALYTICS_SLOW_QUERY_LOG', None):
+        return None
+    return threshold / 1000
+
+
+def log_slow_queries(view, queries):
+    """Append (seconds, sql, params) statements of one request to the slow-query log"""
+    if not queries:
+        return
+    now = timezone.now().isoformat()
+    lines = [
+        f'{now}\t{view}\t{seconds * 1000:.1f}ms\t{" ".join(sql.split())}\t{params!r}\n'
+        for seconds, sql, params in queries
+    ]
+    with _log_lock, open(settings.ANALYTICS_SLOW_QUERY_LOG, 'a') as log:
+        log.writelines(lines)
@@ -0,0 +1,89 @@
+import time
+
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+from .metrics import log_slow_queries, record_request, slow_query_seconds
+from .profiling import profile_dir, profile_requested, run_profiled
+
+
+class QueryRecorder:
+    """``connection.execute_wrapper`` that counts and times the statements of one request"""
+
+    def __init__(self, slow_seconds=None):
+        self.count = 0
+        self.seconds = 0.0
+        self.slow_seconds = slow_seconds
+        self.slow = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.count += 1
+            self.seconds += elapsed
+            if self.slow_seconds is not None and elapsed >= self.slow_seconds:
+                self.slow.append((elapsed, sql, params))
+
+
+class RequestMetricsMiddleware:
+    """Record query count, SQL time, duration and response size of every request per view
+
+    Works with DEBUG off, as it does not rely on the debug query log.
+    Streaming responses are measured once their last chunk has been sent.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder(slow_query_seconds())
+        started = time.perf_counter()
+        with connection.execute_wrapper(recorder):
+            response = self.get_response(request)
+        match = request.resolver_match
+        view = match.view_name if match else 'unmatched'
+
+        if response.streaming:
+            response.streaming_content = self.measure_stream(
+                response.streaming_content, recorder, started, view,
+            )
+        else:
+            self.finish(recorder, started, view, len(response.content))
+        return response
+
+    def measure_stream(self, content, recorder, started, view):
+        size = 0
+        # Rows are fetched while the body streams, so keep counting their queries
+        with connection.execute_wrapper(recorder):
+            for chunk in content:
+                size += len(chunk)
+                yield chunk
+        self.finish(recorder, started, view, size)
+
+    def finish(self, recorder, started, view, size):
+        record_request(view, time.perf_counter() - started, recorder.seconds, recorder.count, size)
+        log_slow_queries(view, recorder.slow)
+
+
+class ProfilingMiddleware:
+    """Run the view of a flagged staff request under cProfile
+
+    Unused unless settings.ANALYTICS_PROFILE_DIR is set. Keep it last in
+    MIDDLEWARE, as the views of profiled requests are called from here.
+    """
+
+    def __init__(self, get_response):
+        if profile_dir() is None:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not profile_requested(request):
+            return None
+        return run_profiled(request, view_func, view_args, view_kwargs)
@@ -0,0 +1,63 @@
+# Generated by Django 4.2.7 on 2026-10-18 20:04
+
+from django.db import migrations, models
+from django.db.models import Count, F, Q, Sum
+import django.db.models.deletion
+
+
+def populate_summaries(apps, schema_editor):
+    Mark = apps.get_model('analytics_app', 'Mark')
+    for model_name, key in (('StudentSummary', 'student_id'), ('SubjectSummary', 'subject_id')):
+        model = apps.get_model('analytics_app', model_name)
+        rows = (
+            Mark.objects
+            .values(key)
+            .annotate(
+                mark_count=Count('id'),
+                marks_sum=Sum('marks_obtained'),
+                marks_sum_squares=Sum(F('marks_obtained') * F('marks_obtained')),
+                attendance_sum=Sum('attendance_percentage'),
+                failing_count=Count('id', filter=Q(marks_obtained__lt=40)),
+            )
+            .order_by(key)
+        )
+        model.objects.bulk_create([model(**row) for row in rows], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics_app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudentSummary',
+            fields=[
+                ('mark_count', models.IntegerField(default=0)),
+                ('marks_sum', models.BigIntegerField(default=0)),
+                ('marks_sum_squares', models.BigIntegerField(default=0)),
+                ('attendance_sum', models.FloatField(default=0)),
+                ('failing_count', models.IntegerField(default=0)),
+                ('student', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='summary', serialize=False, to='analytics_app.student')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='SubjectSummary',
+            fields=[
+                ('mark_count', models.IntegerField(default=0)),
+                ('marks_sum', models.BigIntegerField(default=0)),
+                ('marks_sum_squares', models.BigIntegerField(default=0)),
+                ('attendance_sum', models.FloatField(default=0)),
+                ('failing_count', models.IntegerField(default=0)),
+                ('subject', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='summary', serialize=False, to='analytics_app.subject')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.RunPython(populate_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 4.2.7 on 2026-10-18 20:14
+
+from django.db import migrations
+from django.db.models import Count, F, Max, Q, Sum
+
+
+def merge_duplicate_marks(apps, schema_editor):
+    """Keep the latest mark of each duplicated (student, subject) pair"""
+    Mark = apps.get_model('analytics_app', 'Mark')
+    duplicates = (
+        Mark.objects
+        .values('student_id', 'subject_id')
+        .annotate(entries=Count('id'), keep_id=Max('id'))
+        .filter(entries__gt=1)
+        .order_by()
+    )
+    students, subjects = set(), set()
+    for row in duplicates:
+        Mark.objects.filter(
+            student_id=row['student_id'], subject_id=row['subject_id'],
+        ).exclude(id=row['keep_id']).delete()
+        students.add(row['student_id'])
+        subjects.add(row['subject_id'])
+
+    # Recompute the summaries the deleted rows contributed to
+    for model_name, key, ids in (('StudentSummary', 'student_id', students),
+                                 ('SubjectSummary', 'subject_id', subjects)):
+        if not ids:
+            continue
+        model = apps.get_model('analytics_app', model_name)
+        rows = (
+            Mark.objects
+            .filter(**{f'{key}__in': ids})
+            .values(key)
+            .annotate(
+                mark_count=Count('id'),
+                marks_sum=Sum('marks_obtained'),
+                marks_sum_squares=Sum(F('marks_obtained') * F('marks_obtained')),
+                attendance_sum=Sum('attendance_percentage'),
+                failing_count=Count('id', filter=Q(marks_obtained__lt=40)),
+            )
+            .order_by(key)
+        )
+        for row in rows:
+            model.objects.filter(**{key: row.pop(key)}).update(**row)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics_app', '0004_gradebook_import'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_marks, migrations.RunPython.noop),
+    ]
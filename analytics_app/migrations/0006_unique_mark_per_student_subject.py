@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-18 20:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics_app', '0005_merge_duplicate_marks'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='mark',
+            constraint=models.UniqueConstraint(fields=('student', 'subject'), name='unique_mark_per_student_subject'),
+        ),
+    ]
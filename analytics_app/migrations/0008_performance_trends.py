@@ -0,0 +1,56 @@
+# Generated by Django 4.2.7 on 2026-10-18 20:25
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics_app', '0007_data_versions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PerformanceRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('week', 'Week'), ('month', 'Month'), ('term', 'Term')], max_length=10)),
+                ('period_start', models.DateField()),
+                ('department', models.CharField(blank=True, max_length=100)),
+                ('mark_count', models.IntegerField(default=0)),
+                ('marks_sum', models.BigIntegerField(default=0)),
+                ('attendance_sum', models.FloatField(default=0)),
+            ],
+        ),
+        # Existing marks were assessed on unknown dates, so they are left null;
+        # only marks written from now on default to the day they are saved
+        migrations.AddField(
+            model_name='mark',
+            name='assessed_on',
+            field=models.DateField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='mark',
+            name='assessed_on',
+            field=models.DateField(default=django.utils.timezone.localdate, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='mark',
+            index=models.Index(fields=['assessed_on'], name='mark_assessed_on_idx'),
+        ),
+        migrations.AddField(
+            model_name='performancerollup',
+            name='subject',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='analytics_app.subject'),
+        ),
+        migrations.AddConstraint(
+            model_name='performancerollup',
+            constraint=models.UniqueConstraint(fields=('period', 'period_start', 'subject', 'department'), name='unique_rollup_per_period_group'),
+        ),
+        migrations.AddConstraint(
+            model_name='performancerollup',
+            constraint=models.UniqueConstraint(condition=models.Q(('department', ''), ('subject__isnull', True)), fields=('period', 'period_start'), name='unique_rollup_period_total'),
+        ),
+    ]
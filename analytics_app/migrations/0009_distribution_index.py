@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-18 20:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics_app', '0008_performance_trends'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='mark',
+            index=models.Index(fields=['subject', 'marks_obtained', 'attendance_percentage'], name='mark_subject_marks_idx'),
+        ),
+    ]
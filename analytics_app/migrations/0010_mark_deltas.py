@@ -0,0 +1,26 @@
+# Generated by Django 4.2.7 on 2026-10-18 20:35
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics_app', '0009_distribution_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MarkDelta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mark_id', models.IntegerField()),
+                ('deleted', models.BooleanField(default=False)),
+                ('subject_id', models.IntegerField(null=True)),
+                ('marks_obtained', models.IntegerField(null=True)),
+                ('attendance_percentage', models.FloatField(null=True)),
+                ('student', models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='analytics_app.student')),
+            ],
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.7 on 2026-10-18 20:38
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics_app', '0010_mark_deltas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudentSuggestion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('attendance', 'Attendance'), ('subject', 'Weak subject'), ('subject_attendance', 'Subject attendance'), ('praise', 'Good performance')], max_length=20)),
+                ('message', models.CharField(max_length=255)),
+                ('generated_at', models.DateTimeField()),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='suggestions', to='analytics_app.student')),
+                ('subject', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='analytics_app.subject')),
+            ],
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.7 on 2026-10-18 20:42
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics_app', '0011_student_suggestions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudentRisk',
+            fields=[
+                ('student', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='risk', serialize=False, to='analytics_app.student')),
+                ('score', models.FloatField()),
+                ('attendance', models.FloatField()),
+                ('trend', models.FloatField()),
+                ('marks_std', models.FloatField()),
+                ('failing_count', models.IntegerField()),
+                ('mark_count', models.IntegerField()),
+                ('scored_at', models.DateTimeField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-score', 'student'], name='student_risk_score_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='StaleRiskScore',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('student', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='analytics_app.student')),
+            ],
+        ),
+    ]
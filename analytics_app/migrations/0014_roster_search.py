@@ -0,0 +1,38 @@
+# Generated by Django 4.2.7 on 2026-10-18 20:48
+
+from django.db import migrations, models
+import django.db.models.expressions
+import django.db.models.functions.comparison
+
+
+def create_search_index(apps, schema_editor):
+    from analytics_app.search import ensure_search_index
+    ensure_search_index(schema_editor.connection)
+
+
+def drop_search_index(apps, schema_editor):
+    from analytics_app.search import drop_search_index
+    drop_search_index(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics_app', '0013_student_user'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['name', 'id'], name='student_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='studentsummary',
+            index=models.Index(django.db.models.expressions.CombinedExpression(django.db.models.functions.comparison.Cast('marks_sum', models.FloatField()), '/', models.F('mark_count')), models.F('student'), name='summary_average_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='studentsummary',
+            index=models.Index(django.db.models.expressions.CombinedExpression(models.F('attendance_sum'), '/', models.F('mark_count')), models.F('student'), name='summary_attendance_idx'),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
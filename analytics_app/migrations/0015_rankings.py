@@ -0,0 +1,39 @@
+# Generated by Django 4.2.7 on 2026-10-18 21:04
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics_app', '0014_roster_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StaleRanking',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('department', models.CharField(max_length=100)),
+                ('subject', models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='analytics_app.subject')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Ranking',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('department', models.CharField(blank=True, max_length=100)),
+                ('average', models.FloatField()),
+                ('rank', models.IntegerField()),
+                ('percentile', models.FloatField()),
+                ('group_size', models.IntegerField()),
+                ('ranked_at', models.DateTimeField()),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rankings', to='analytics_app.student')),
+                ('subject', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='analytics_app.subject')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['department', 'subject', 'rank', 'student'], name='ranking_leaderboard_idx')],
+            },
+        ),
+    ]
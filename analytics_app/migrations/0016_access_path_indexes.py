@@ -0,0 +1,84 @@
+# Generated by Django 4.2.7 on 2026-10-18 21:14
+
+from django.db import migrations, models
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import Greatest, Least
+
+
+def clamp_out_of_range_marks(apps, schema_editor):
+    """Clamp marks and attendance into 0..100 so the range constraints can be added"""
+    Mark = apps.get_model('analytics_app', 'Mark')
+    out_of_range = (
+        Q(marks_obtained__lt=0) | Q(marks_obtained__gt=100)
+        | Q(attendance_percentage__lt=0) | Q(attendance_percentage__gt=100)
+    )
+    affected = list(Mark.objects.filter(out_of_range).values_list('id', 'student_id', 'subject_id'))
+    if not affected:
+        return
+    Mark.objects.filter(id__in=[row[0] for row in affected]).update(
+        marks_obtained=Least(Greatest(F('marks_obtained'), 0), 100),
+        attendance_percentage=Least(Greatest(F('attendance_percentage'), 0.0), 100.0),
+    )
+
+    # Recompute the summaries the clamped rows contribute to
+    students = {row[1] for row in affected}
+    subjects = {row[2] for row in affected}
+    for model_name, key, ids in (('StudentSummary', 'student_id', students),
+                                 ('SubjectSummary', 'subject_id', subjects)):
+        model = apps.get_model('analytics_app', model_name)
+        rows = (
+            Mark.objects
+            .filter(**{f'{key}__in': ids})
+            .values(key)
+            .annotate(
+                mark_count=Count('id'),
+                marks_sum=Sum('marks_obtained'),
+                marks_sum_squares=Sum(F('marks_obtained') * F('marks_obtained')),
+                attendance_sum=Sum('attendance_percentage'),
+                failing_count=Count('id', filter=Q(marks_obtained__lt=40)),
+            )
+            .order_by(key)
+        )
+        for row in rows:
+            model.objects.filter(**{key: row.pop(key)}).update(**row)
+
+    # Trends are rolled up again on demand, risk and ranks at their next run
+    StaleRiskScore = apps.get_model('analytics_app', 'StaleRiskScore')
+    StaleRanking = apps.get_model('analytics_app', 'StaleRanking')
+    departments = dict(
+        apps.get_model('analytics_app', 'Student').objects.filter(id__in=students).values_list('id', 'department')
+    )
+    apps.get_model('analytics_app', 'PerformanceRollup').objects.all().delete()
+    StaleRiskScore.objects.bulk_create([StaleRiskScore(student_id=student_id) for student_id in students])
+    StaleRanking.objects.bulk_create([
+        StaleRanking(department=departments[student_id], subject_id=subject_id)
+        for _, student_id, subject_id in affected
+    ])
+    apps.get_model('analytics_app', 'DataVersion').objects.filter(table='mark').update(version=F('version') + 1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics_app', '0015_rankings'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['roll_no', 'id'], name='student_roll_no_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='subject',
+            index=models.Index(fields=['subject_name'], name='subject_name_idx'),
+        ),
+        migrations.RunPython(clamp_out_of_range_marks, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='mark',
+            constraint=models.CheckConstraint(check=models.Q(('marks_obtained__gte', 0), ('marks_obtained__lte', 100)), name='mark_marks_range'),
+        ),
+        migrations.AddConstraint(
+            model_name='mark',
+            constraint=models.CheckConstraint(check=models.Q(('attendance_percentage__gte', 0), ('attendance_percentage__lte', 100)), name='mark_attendance_range'),
+        ),
+    ]
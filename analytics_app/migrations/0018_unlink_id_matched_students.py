@@ -0,0 +1,29 @@
+# Generated by Django 4.2.7 on 2026-10-18 23:10
+
+from django.db import migrations, models
+
+
+def unlink_id_matched_students(apps, schema_editor):
+    """Drop the links an earlier 0013 made between a student account and the Student row with its id
+
+    Equal ids say nothing about who a student is. Those students link
+    again at signup by roll number, or a teacher links them.
+    """
+    Student = apps.get_model('analytics_app', 'Student')
+    Profile = apps.get_model('accounts', 'Profile')
+    Student.objects.filter(
+        user_id=models.F('id'),
+        user_id__in=Profile.objects.filter(role='Student').values('user_id'),
+    ).update(user=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+        ('analytics_app', '0017_jobs'),
+    ]
+
+    operations = [
+        migrations.RunPython(unlink_id_matched_students, migrations.RunPython.noop),
+    ]
@@ -1,10 +1,25 @@
-from django.db import models
+from django.contrib.auth.models import User
+from django.db import models, transaction
+from django.db.models.functions import Cast
+from django.utils import timezone
 
 
 class Student(models.Model):
     name = models.CharField(max_length=100)
     roll_no = models.CharField(max_length=20)
     department = models.CharField(max_length=100)
+    # The login of the student this row describes, if they have one
+    user = models.OneToOneField(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='student')
+
+    class Meta:
+        indexes = [
+            # Backs the department filter of the students/marks list APIs
+            models.Index(fields=['department', 'id'], name='student_department_idx'),
+            # Backs the roll_no filter of the students list API and gradebook imports
+            models.Index(fields=['roll_no', 'id'], name='student_roll_no_idx'),
+            # Keyset pages of the roster sorted by name
+            models.Index(fields=['name', 'id'], name='student_name_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -13,6 +28,12 @@ class Student(models.Model):
 class Subject(models.Model):
     subject_name = models.CharField(max_length=100)
 
+    class Meta:
+        indexes = [
+            # Gradebook imports resolve subjects by name
+            models.Index(fields=['subject_name'], name='subject_name_idx'),
+        ]
+
     def __str__(self):
         return self.subject_name
 
@@ -22,6 +43,349 @@ class Mark(models.Model):
     subject = models.ForeignKey(Subject, on_delete=models.CASCADE)
     marks_obtained = models.IntegerField()
     attendance_percentage = models.FloatField()
+    # Null for marks recorded before assessment dates were tracked; trends leave those out
+    assessed_on = models.DateField(null=True, default=timezone.localdate)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['student', 'subject'], name='unique_mark_per_student_subject'),
+            # Every writer validates these ranges; the constraints catch the ones that do not
+            models.CheckConstraint(
+                check=models.Q(marks_obtained__gte=0, marks_obtained__lte=100), name='mark_marks_range',
+            ),
+            models.CheckConstraint(
+                check=models.Q(attendance_percentage__gte=0, attendance_percentage__lte=100),
+                name='mark_attendance_range',
+            ),
+        ]
+        indexes = [
+            # Keyset pages over the marks list API, filtered or not
+            models.Index(fields=['subject', 'id'], name='mark_subject_id_idx'),
+            models.Index(fields=['student', 'id'], name='mark_student_id_idx'),
+            models.Index(fields=['marks_obtained', 'id'], name='mark_marks_id_idx'),
+            models.Index(fields=['attendance_percentage', 'id'], name='mark_attendance_id_idx'),
+            # Range scans for the performance trend of open periods
+            models.Index(fields=['assessed_on'], name='mark_assessed_on_idx'),
+            # Covers the (subject, mark) frequency table of the distribution report
+            models.Index(
+                fields=['subject', 'marks_obtained', 'attendance_percentage'],
+                name='mark_subject_marks_idx',
+            ),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what is stored so summaries can subtract it on update
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def save(self, *args, **kwargs):
+        # Summary rows are updated by signals inside this same transaction
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic(using=kwargs.get('using')):
+            return super().delete(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.student.name} - {self.subject.subject_name}"
+
+
+class SummaryTotals(models.Model):
+    """Running totals over a group of marks, kept in step with every Mark write"""
+    mark_count = models.IntegerField(default=0)
+    marks_sum = models.BigIntegerField(default=0)
+    marks_sum_squares = models.BigIntegerField(default=0)
+    attendance_sum = models.FloatField(default=0)
+    failing_count = models.IntegerField(default=0)
+    # Moved on every change to the totals; cached per-student reports are keyed by it
+    changed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        abstract = True
+
+    @property
+    def average(self):
+        return self.marks_sum / self.mark_count if self.mark_count else 0
+
+    @property
+    def average_attendance(self):
+        return self.attendance_sum / self.mark_count if self.mark_count else 0
+
+    @property
+    def variance(self):
+        if not self.mark_count:
+            return 0
+        mean = self.average
+        return max(self.marks_sum_squares / self.mark_count - mean * mean, 0)
+
+
+# Per-student averages as the roster sorts by them; indexed below, so
+# queries must use these exact expressions
+AVERAGE_MARKS = Cast('marks_sum', models.FloatField()) / models.F('mark_count')
+AVERAGE_ATTENDANCE = models.F('attendance_sum') / models.F('mark_count')
+
+
+class StudentSummary(SummaryTotals):
+    student = models.OneToOneField(Student, on_delete=models.CASCADE, primary_key=True, related_name='summary')
+
+    class Meta:
+        indexes = [
+            models.Index(AVERAGE_MARKS, models.F('student'), name='summary_average_idx'),
+            models.Index(AVERAGE_ATTENDANCE, models.F('student'), name='summary_attendance_idx'),
+        ]
+
+    def __str__(self):
+        return f"Summary for {self.student_id}"
+
+
+class SubjectSummary(SummaryTotals):
+    subject = models.OneToOneField(Subject, on_delete=models.CASCADE, primary_key=True, related_name='summary')
+
+    def __str__(self):
+        return f"Summary for {self.subject_id}"
+
+
+class PerformanceRollup(models.Model):
+    """Mark totals of one closed trend period, per subject and department
+
+    The row with no subject and an empty department holds the totals of
+    the whole period; its presence means the period has been rolled up.
+    """
+    PERIOD_CHOICES = [
+        ('week', 'Week'),
+        ('month', 'Month'),
+        ('term', 'Term'),
+    ]
+
+    period = models.CharField(max_length=10, choices=PERIOD_CHOICES)
+    period_start = models.DateField()
+    subject = models.ForeignKey(Subject, on_delete=models.CASCADE, null=True, blank=True)
+    department = models.CharField(max_length=100, blank=True)
+    mark_count = models.IntegerField(default=0)
+    marks_sum = models.BigIntegerField(default=0)
+    attendance_sum = models.FloatField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['period', 'period_start', 'subject', 'department'],
+                name='unique_rollup_per_period_group',
+            ),
+            models.UniqueConstraint(
+                fields=['period', 'period_start'],
+                condition=models.Q(subject__isnull=True, department=''),
+                name='unique_rollup_period_total',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.period} of {self.period_start}"
+
+
+class MarkDelta(models.Model):
+    """A mark write not yet folded into the columnar marks snapshot
+
+    Only recorded while a snapshot directory is configured; compaction
+    deletes the rows it has applied.
+    """
+    mark_id = models.IntegerField()
+    deleted = models.BooleanField(default=False)
+    # No constraint, so the log outlives the student; the join supplies the current department
+    student = models.ForeignKey(
+        Student, on_delete=models.DO_NOTHING, db_constraint=False, null=True, related_name='+',
+    )
+    subject_id = models.IntegerField(null=True)
+    marks_obtained = models.IntegerField(null=True)
+    attendance_percentage = models.FloatField(null=True)
+
+    def __str__(self):
+        return f"{'delete' if self.deleted else 'upsert'} mark {self.mark_id}"
+
+
+def delete_log_rows(model, ids, batch_size=500):
+    """Delete the rows of a change log (MarkDelta, StaleRiskScore, StaleRanking) that were read
+
+    Deleted by id, never by id range: with concurrent writers a row with a
+    lower id can commit after a newer one was read, and must survive until
+    it is processed.
+    """
+    ids = list(ids)
+    for start in range(0, len(ids), batch_size):
+        model.objects.filter(id__in=ids[start:start + batch_size]).delete()
+
+
+class StudentSuggestion(models.Model):
+    """One advice line for a student, written by the batch suggestion job"""
+    KIND_CHOICES = [
+        ('attendance', 'Attendance'),
+        ('subject', 'Weak subject'),
+        ('subject_attendance', 'Subject attendance'),
+        ('praise', 'Good performance'),
+    ]
+
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='suggestions')
+    subject = models.ForeignKey(Subject, on_delete=models.CASCADE, null=True, blank=True)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    message = models.CharField(max_length=255)
+    generated_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.kind} for {self.student_id}"
+
+
+class StudentRisk(models.Model):
+    """Early-warning score of one student, written by the risk scoring job
+
+    Scores run from 0 (no concern) to 100; the factors behind a score are
+    kept alongside it.
+    """
+    student = models.OneToOneField(Student, on_delete=models.CASCADE, primary_key=True, related_name='risk')
+    score = models.FloatField()
+    attendance = models.FloatField()
+    # Change in marks per 30 days, from a least-squares fit over assessment dates
+    trend = models.FloatField()
+    marks_std = models.FloatField()
+    failing_count = models.IntegerField()
+    mark_count = models.IntegerField()
+    scored_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-score', 'student'], name='student_risk_score_idx'),
+        ]
+
+    def __str__(self):
+        return f"Risk {self.score} for {self.student_id}"
+
+
+class StaleRiskScore(models.Model):
+    """A student whose marks changed after their risk score was computed
+
+    Appended on every mark write; the scoring job rescores the distinct
+    students of the rows it read and deletes exactly those rows.
+    """
+    student = models.ForeignKey(
+        Student, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+',
+    )
+
+    def __str__(self):
+        return f"Rescore {self.student_id}"
+
+
+class Ranking(models.Model):
+    """Leaderboard row: a student's rank by average marks within one group
+
+    A group is a department overall (no subject), a subject within a
+    department, or the whole school (empty department, no subject).
+    Written a group at a time by the ranking job.
+    """
+    SCHOOL = ''
+
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='rankings')
+    department = models.CharField(max_length=100, blank=True)
+    subject = models.ForeignKey(Subject, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    average = models.FloatField()
+    # Tied averages share a rank
+    rank = models.IntegerField()
+    # Share of the rest of the group ranked below the student, 0 to 100
+    percentile = models.FloatField()
+    group_size = models.IntegerField()
+    ranked_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['department', 'subject', 'rank', 'student'], name='ranking_leaderboard_idx'),
+        ]
+
+    def __str__(self):
+        return f"#{self.rank} {self.student_id}"
+
+
+class StaleRanking(models.Model):
+    """A ranking group whose marks changed after it was last ranked
+
+    Logged as a department and subject; the department's overall group and
+    the school group are stale along with any of its subjects. The ranking
+    job re-ranks the groups of the rows it read and deletes exactly those
+    rows.
+    """
+    department = models.CharField(max_length=100)
+    subject = models.ForeignKey(
+        Subject, on_delete=models.DO_NOTHING, db_constraint=False, null=True, related_name='+',
+    )
+
+    def __str__(self):
+        return f"Re-rank {self.department} {self.subject_id}"
+
+
+class GradebookImport(models.Model):
+    filename = models.CharField(max_length=255, blank=True)
+    total_rows = models.IntegerField(default=0)
+    created_count = models.IntegerField(default=0)
+    updated_count = models.IntegerField(default=0)
+    error_count = models.IntegerField(default=0)
+    duration_seconds = models.FloatField(default=0)
+    rows_per_second = models.FloatField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.filename or 'import'} - {self.total_rows} rows"
+
+
+class Job(models.Model):
+    """A unit of background work, run by `manage.py run_workers`
+
+    Workers claim due queued jobs with a conditional UPDATE, so the
+    database is the only moving part. A job that raises is queued again
+    with a growing delay until ``max_attempts`` runs have been spent.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (SUCCEEDED, 'Succeeded'),
+        (FAILED, 'Failed'),
+    ]
+
+    kind = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    # 0 to 100, as reported by the running task
+    progress = models.FloatField(default=0)
+    message = models.CharField(max_length=255, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    # Traceback of the last failed attempt
+    error = models.TextField(blank=True)
+    attempts = models.IntegerField(default=0)
+    max_attempts = models.IntegerField(default=3)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(default=timezone.now)
+    run_after = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # Moved while the job runs; running jobs whose heartbeat stops are requeued
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    worker = models.CharField(max_length=100, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_after', 'id'], name='job_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} #{self.pk} ({self.status})"
+
+
+class DataVersion(models.Model):
+    """Write counter per table; cached analytics are keyed by these versions"""
+    table = models.CharField(max_length=50, primary_key=True)
+    version = models.BigIntegerField(default=0)
 
     def __str__(self):
-        return f"{self.student.name} - {self.subject.subject_name}"
\ No newline at end of file
+        return f"{self.table} v{self.version}"
@@ -0,0 +1,96 @@
+"""On-demand cProfile captures of single requests
+
+A staff request carrying ``?_profile=1`` or an ``X-Profile: 1`` header has
+its view run under cProfile. The stats are written as a ``.prof`` file to
+settings.ANALYTICS_PROFILE_DIR and the file is named in the ``X-Profile``
+response header. Bodies of streaming responses are produced after the
+view returns and are not part of the profile.
+
+Everything is off unless the directory is set; ProfilingMiddleware then
+drops out of the middleware chain, so unflagged requests pay nothing.
+"""
+import cProfile
+import io
+import pstats
+from pathlib import Path
+
+from django.conf import settings
+from django.utils import timezone
+
+
+PROFILE_PARAM = '_profile'
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+RESPONSE_HEADER = 'X-Profile'
+SORT_KEYS = ('cumulative', 'tottime', 'calls')
+_FLAG_OFF = ('0', 'false', 'no')
+
+
+def profile_dir():
+    directory = getattr(settings, 'ANALYTICS_PROFILE_DIR', None)
+    return Path(directory) if directory else None
+
+
+def profile_requested(request):
+    """Whether the request asks to be profiled and its user is allowed to"""
+    flag = request.GET.get(PROFILE_PARAM, request.META.get(PROFILE_HEADER))
+    if flag is None or flag.lower() in _FLAG_OFF:
+        return False
+    return request.user.is_staff
+
+
+def run_profiled(request, view_func, view_args, view_kwargs):
+    """Call the view under cProfile and save the stats, even when it raises"""
+    profiler = cProfile.Profile()
+    try:
+        response = profiler.runcall(view_func, request, *view_args, **view_kwargs)
+    finally:
+        path = save_profile(profiler, request)
+    response[RESPONSE_HEADER] = path.name
+    return response
+
+
+def save_profile(profiler, request):
+    directory = profile_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    match = request.resolver_match
+    view = match.view_name.replace(':', '.') if match else 'unmatched'
+    path = directory / f'{timezone.now():%Y%m%dT%H%M%S%f}-{view}-{request.user.pk}.prof'
+    profiler.dump_stats(path)
+    return path
+
+
+def list_profiles():
+    """Captured profiles, newest first, with the view, user and time of each"""
+    directory = profile_dir()
+    if directory is None:
+        raise ValueError('settings.ANALYTICS_PROFILE_DIR is not set')
+    if not directory.is_dir():
+        return []
+    profiles = []
+    for path in sorted(directory.glob('*.prof'), reverse=True):
+        captured_at, _, rest = path.stem.partition('-')
+        view, _, user_id = rest.rpartition('-')
+        stats = pstats.Stats(str(path))
+        profiles.append({
+            'name': path.name,
+            'captured_at': captured_at,
+            'view': view,
+            'user_id': user_id,
+            'seconds': stats.total_tt,
+            'calls': stats.total_calls,
+        })
+    return profiles
+
+
+def summarize_profile(name, sort='cumulative', limit=25):
+    """The ``limit`` most expensive functions of one captured profile as text"""
+    directory = profile_dir()
+    if directory is None:
+        raise ValueError('settings.ANALYTICS_PROFILE_DIR is not set')
+    path = directory / Path(name).name
+    if not path.is_file():
+        raise ValueError(f'No profile named {name}')
+    output = io.StringIO()
+    stats = pstats.Stats(str(path), stream=output)
+    stats.strip_dirs().sort_stats(sort).print_stats(limit)
+    return output.getvalue()
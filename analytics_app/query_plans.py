@@ -0,0 +1,117 @@
+"""EXPLAIN every statement the endpoints issue and flag full table scans
+
+Each endpoint is requested once through the benchmark scenarios. Every
+captured statement is explained (``EXPLAIN QUERY PLAN`` on SQLite,
+``EXPLAIN (FORMAT JSON)`` on PostgreSQL) and full scans of tables holding
+at least ``min_rows`` rows are reported, unless a LIMIT stops the scan
+early or the endpoint reads the whole table by design.
+"""
+import json
+import re
+
+from django.apps import apps
+from django.db import connection
+
+from .benchmarks import BENCHMARKED_APPS, bench_session, send_request, url_names
+
+
+# url name -> tables the endpoint reads in full by design
+EXPECTED_SCANS = {
+    # Counts of graded and failing students over every summary
+    'teacher_dashboard': {'analytics_app_studentsummary'},
+    # Lists every student
+    'performance': {'analytics_app_student'},
+    # Reports, cubes and exports over every mark
+    'reports': {'analytics_app_mark'},
+    'api_cube': {'analytics_app_mark'},
+    'api_export_marks': {'analytics_app_mark'},
+    # A report card for every student unless one department is asked for
+    'report_cards': {'analytics_app_student'},
+}
+EXPLAINED_STATEMENTS = ('SELECT', 'WITH', 'UPDATE', 'DELETE')
+# PostgreSQL plan nodes that consume their whole input before a LIMIT above them applies
+BLOCKING_NODES = {'Sort', 'Incremental Sort', 'Aggregate', 'Hash', 'Materialize', 'WindowAgg', 'SetOp', 'Unique'}
+
+_SQLITE_SCAN = re.compile(r'^SCAN (\w+)(?: AS (\w+))?(.*)$')
+_BLOCKING_SORT = re.compile(r'TEMP B-TREE FOR (ORDER BY|GROUP BY|DISTINCT)')
+_LIMIT = re.compile(r'\bLIMIT\s+\d+\s*(OFFSET\s+\d+\s*)?$', re.IGNORECASE)
+
+
+def table_sizes():
+    """Row count of every table of the benchmarked apps"""
+    return {
+        model._meta.db_table: model._default_manager.count()
+        for app in BENCHMARKED_APPS
+        for model in apps.get_app_config(app).get_models()
+        if model._meta.managed
+    }
+
+
+def full_scans(sql):
+    """(table, plan detail) of every full table scan in the plan of ``sql``"""
+    if not sql.lstrip().upper().startswith(EXPLAINED_STATEMENTS):
+        return []
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            return _sqlite_scans(cursor, sql)
+        if connection.vendor == 'postgresql':
+            return _postgresql_scans(cursor, sql)
+    return []
+
+
+def _sqlite_scans(cursor, sql):
+    cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+    details = [row[-1] for row in cursor.fetchall()]
+    # Unless every row has to be sorted or grouped first, a LIMIT at the end
+    # stops the scan after a page; sorting only ties (RIGHT PART) still streams
+    if _LIMIT.search(sql.strip()) and not any(_BLOCKING_SORT.search(detail) for detail in details):
+        return []
+    scans = []
+    for detail in details:
+        match = _SQLITE_SCAN.match(detail)
+        if match and 'VIRTUAL TABLE' not in match.group(3):
+            scans.append((match.group(1), detail))
+    return scans
+
+
+def _postgresql_scans(cursor, sql):
+    cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}')
+    plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    scans = []
+
+    def walk(node, limited):
+        node_type = node['Node Type']
+        if node_type == 'Limit':
+            limited = True
+        elif node_type in BLOCKING_NODES:
+            limited = False
+        if node_type == 'Seq Scan' and not limited:
+            scans.append((node['Relation Name'], f"Seq Scan on {node['Relation Name']}"))
+        for child in node.get('Plans', []):
+            walk(child, limited)
+
+    walk(plan[0]['Plan'], False)
+    return scans
+
+
+def check_query_plans(only=None, min_rows=100):
+    """Plan check of every endpoint: a dict per endpoint with its unexpected full scans"""
+    sizes = table_sizes()
+    client, user, fixtures = bench_session()
+    results = []
+    for name in url_names():
+        if only and name not in only:
+            continue
+        url, status, _, queries = send_request(client, user, fixtures, name)
+        scans, seen = [], set()
+        for query in queries:
+            for table, detail in full_scans(query['sql']):
+                if sizes.get(table, 0) < min_rows or table in EXPECTED_SCANS.get(name, ()):
+                    continue
+                if (table, detail) not in seen:
+                    seen.add((table, detail))
+                    scans.append({'table': table, 'rows': sizes[table], 'detail': detail, 'sql': query['sql']})
+        results.append({'name': name, 'url': url, 'status': status, 'statements': len(queries), 'scans': scans})
+    return results
@@ -0,0 +1,167 @@
+"""Class ranks and percentiles, computed with SQL window functions
+
+Students are ranked by average marks within their department, in each
+subject within their department and across the whole school. Each kind of
+group is ranked by one windowed query and stored in the Ranking
+leaderboard, so reading a rank is an index lookup. Mark writes log the
+groups they touch in StaleRanking; ``refresh_stale`` re-ranks only those.
+"""
+from collections import defaultdict
+
+from django.db import connection, transaction
+from django.db.models import Count, F, FloatField, IntegerField, Value, Window
+from django.db.models.functions import Cast, PercentRank, Rank
+from django.utils import timezone
+
+from .caching import bump_versions
+from .models import AVERAGE_MARKS, Mark, Ranking, StaleRanking, Student, StudentSummary, delete_log_rows
+
+
+# Ranking column -> alias of the ranked query that fills it
+RANKING_COLUMNS = {
+    'student': 'ranked_student',
+    'department': 'ranked_department',
+    'subject': 'ranked_subject',
+    'average': 'ranked_average',
+    'rank': 'ranked_rank',
+    'group_size': 'ranked_group_size',
+}
+
+
+def _ranked(queryset, student, department, subject, average, partition_by):
+    """``queryset`` reduced to the RANKING_COLUMNS aliases, ranked by ``average`` within ``partition_by``"""
+    return queryset.order_by().annotate(
+        ranked_student=student,
+        ranked_department=department,
+        ranked_subject=subject,
+        ranked_average=average,
+        ranked_rank=Window(Rank(), partition_by=partition_by, order_by=average.desc()),
+        # Ascending, so the best student of a group gets 1
+        ranked_percent_rank=Window(PercentRank(), partition_by=partition_by, order_by=average.asc()),
+        ranked_group_size=Window(Count('pk'), partition_by=partition_by),
+    ).values(*RANKING_COLUMNS.values(), 'ranked_percent_rank')
+
+
+def _school_query():
+    return _ranked(
+        StudentSummary.objects.filter(mark_count__gt=0),
+        F('student_id'), Value(Ranking.SCHOOL), Cast(Value(None), IntegerField()), AVERAGE_MARKS, None,
+    )
+
+
+def _department_query(departments=None):
+    summaries = StudentSummary.objects.filter(mark_count__gt=0)
+    if departments is not None:
+        summaries = summaries.filter(student__department__in=departments)
+    return _ranked(
+        summaries,
+        F('student_id'), F('student__department'), Cast(Value(None), IntegerField()), AVERAGE_MARKS,
+        [F('student__department')],
+    )
+
+
+def _class_query(marks):
+    # A student has one mark per subject, so the mark is their subject average
+    return _ranked(
+        marks,
+        F('student_id'), F('student__department'), F('subject_id'), Cast('marks_obtained', FloatField()),
+        [F('student__department'), F('subject')],
+    )
+
+
+def _store(query, ranked_at):
+    """Insert the rows of a ranked query with INSERT ... SELECT; returns the number written
+
+    The rows never leave the database, which matters for the school and
+    subject groups that hold a row per student.
+    """
+    sql, params = query.query.sql_with_params()
+    quote = connection.ops.quote_name
+    fields = {name: Ranking._meta.get_field(name) for name in [*RANKING_COLUMNS, 'percentile', 'ranked_at']}
+    columns = ', '.join(quote(field.column) for field in fields.values())
+    selected = ', '.join(quote(alias) for alias in RANKING_COLUMNS.values())
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {quote(Ranking._meta.db_table)} ({columns}) '
+            f'SELECT {selected}, {quote("ranked_percent_rank")} * 100, %s FROM ({sql}) ranked',
+            [fields['ranked_at'].get_db_prep_value(ranked_at, connection), *params],
+        )
+        return cursor.rowcount
+
+
+def rerank_all():
+    """Rank every group from scratch; returns the number of Ranking rows written"""
+    with transaction.atomic():
+        logged = list(StaleRanking.objects.values_list('id', flat=True))
+        Ranking.objects.all().delete()
+        ranked_at = timezone.now()
+        written = _store(_school_query(), ranked_at)
+        written += _store(_department_query(), ranked_at)
+        written += _store(_class_query(Mark.objects.all()), ranked_at)
+        delete_log_rows(StaleRanking, logged)
+        bump_versions('ranking')
+    return written
+
+
+def refresh_stale():
+    """Re-rank only the groups whose marks changed since they were last ranked
+
+    Only the log rows read here are deleted; writes logged while this
+    runs are left for the next run. Returns the number of groups re-ranked.
+    """
+    logged = list(StaleRanking.objects.values_list('id', 'department', 'subject_id'))
+    if not logged:
+        return 0
+    subjects = defaultdict(set)
+    for _, department, subject_id in logged:
+        subjects[department].add(subject_id)
+
+    with transaction.atomic():
+        ranked_at = timezone.now()
+        Ranking.objects.filter(department=Ranking.SCHOOL, subject=None).delete()
+        _store(_school_query(), ranked_at)
+        Ranking.objects.filter(department__in=list(subjects), subject=None).delete()
+        _store(_department_query(list(subjects)), ranked_at)
+        classes = 0
+        for department, subject_ids in subjects.items():
+            subject_ids = [subject_id for subject_id in subject_ids if subject_id is not None]
+            if subject_ids:
+                Ranking.objects.filter(department=department, subject_id__in=subject_ids).delete()
+                marks = Mark.objects.filter(student__department=department, subject_id__in=subject_ids)
+                _store(_class_query(marks), ranked_at)
+                classes += len(subject_ids)
+        delete_log_rows(StaleRanking, [log_id for log_id, _, _ in logged])
+        bump_versions('ranking')
+    return 1 + len(subjects) + classes
+
+
+def mark_rankings_stale(pairs):
+    """Log the groups of (student_id, subject_id) pairs whose marks changed"""
+    pairs = {(student_id, subject_id) for student_id, subject_id in pairs if student_id is not None}
+    if not pairs:
+        return
+    departments = dict(
+        Student.objects.filter(id__in={student_id for student_id, _ in pairs}).values_list('id', 'department')
+    )
+    mark_groups_stale(
+        {(departments[student_id], subject_id) for student_id, subject_id in pairs if student_id in departments}
+    )
+
+
+def mark_groups_stale(groups):
+    """Log (department, subject_id) groups for re-ranking"""
+    StaleRanking.objects.bulk_create([
+        StaleRanking(department=department, subject_id=subject_id) for department, subject_id in groups
+    ])
+
+
+def mark_student_moved(student):
+    """Log the old and new groups of a student whose department changed"""
+    previous = set(
+        Ranking.objects
+        .filter(student=student)
+        .exclude(department__in=[Ranking.SCHOOL, student.department])
+        .values_list('department', 'subject_id')
+    )
+    if previous:
+        mark_groups_stale(previous | {(student.department, subject_id) for _, subject_id in previous})
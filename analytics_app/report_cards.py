@@ -0,0 +1,268 @@
+"""PDF report cards, one per student, rendered with reportlab
+
+The marks of every requested student come from one streamed query,
+grouped per student. Cards are rendered a batch at a time and written
+straight into a ZIP stream, so at most one batch of PDFs is held in
+memory. Each PDF is stored on disk, one file per student, with a digest
+of the card's data, so it is reused until that student's marks or
+details change; the new card then replaces the old file.
+
+Only the command and the generate_report_cards job render in a process
+pool; forking from a request thread can deadlock, so views render with
+one worker.
+"""
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from itertools import groupby, islice
+from operator import itemgetter
+from pathlib import Path
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.utils.text import slugify
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.lib.units import mm
+from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+from .caching import record_lookups
+from .services import PASS_MARK
+
+
+# Bump when the layout changes, so cached PDFs are rendered again
+LAYOUT_VERSION = 1
+BATCH_SIZE = 256
+# Smaller batches of misses are rendered in this process; forking would cost more
+MIN_POOL_BATCH = 32
+FETCH_CHUNK = 2000
+# Stored cards per subdirectory
+SHARD_SIZE = 1000
+
+_styles = getSampleStyleSheet()
+_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#0097a7')),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('ALIGN', (1, 0), (-1, -1), 'RIGHT'),
+    ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f2f6f8')]),
+    ('GRID', (0, 0), (-1, -1), 0.25, colors.HexColor('#b0bec5')),
+    ('TOPPADDING', (0, 0), (-1, -1), 4),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
+])
+
+
+def iter_cards(students):
+    """Report-card data of ``students``, one dict per student in id order, from one streamed query
+
+    Students without marks get a card with no subjects.
+    """
+    rows = (
+        students.order_by('id', 'mark__subject_id')
+        .values_list(
+            'id', 'name', 'roll_no', 'department',
+            'mark__subject__subject_name', 'mark__marks_obtained',
+            'mark__attendance_percentage', 'mark__assessed_on',
+        )
+        .iterator(chunk_size=FETCH_CHUNK)
+    )
+    for student_id, group in groupby(rows, key=itemgetter(0)):
+        group = list(group)
+        _, name, roll_no, department = group[0][:4]
+        yield {
+            'id': student_id,
+            'name': name,
+            'roll_no': roll_no,
+            'department': department,
+            'subjects': [
+                [subject, marks, attendance, assessed_on.isoformat() if assessed_on else None]
+                for _, _, _, _, subject, marks, attendance, assessed_on in group
+                if subject is not None
+            ],
+        }
+
+
+def card_key(card):
+    digest = hashlib.sha1(json.dumps(card, sort_keys=True).encode()).hexdigest()
+    return f'{card["id"]}:{LAYOUT_VERSION}:{digest}'
+
+
+def card_dir():
+    directory = getattr(settings, 'ANALYTICS_REPORT_CARD_DIR', None)
+    return Path(directory) if directory else None
+
+
+def _card_path(directory, student_id):
+    return directory / str(student_id // SHARD_SIZE) / f'{student_id}.card'
+
+
+def load_cards(directory, keys):
+    """{key: pdf} of the stored cards whose key matches; ``keys`` maps keys to cards
+
+    A stored file starts with the key of the card it holds, then the PDF.
+    """
+    pdfs = {}
+    for key, card in keys.items():
+        try:
+            with open(_card_path(directory, card['id']), 'rb') as file:
+                if file.readline() == f'{key}\n'.encode():
+                    pdfs[key] = file.read()
+        except FileNotFoundError:
+            pass
+    return pdfs
+
+
+def store_cards(directory, keys, pdfs):
+    """Write each card of ``pdfs`` over the one stored for its student"""
+    for key, pdf in pdfs.items():
+        path = _card_path(directory, keys[key]['id'])
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp = path.with_name(f'{path.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+        with open(temp, 'wb') as file:
+            file.write(f'{key}\n'.encode())
+            file.write(pdf)
+        # Readers see either the old card or the new one, never half of one
+        os.replace(temp, path)
+
+
+def card_filename(card):
+    return f'{card["id"]}-{slugify(card["roll_no"]) or "student"}-{slugify(card["name"]) or "card"}.pdf'
+
+
+def render_report_card(card):
+    """The PDF of one card; a plain function of the card, so it runs in pool processes"""
+    subjects = card['subjects']
+    marks = [row[1] for row in subjects]
+    average = sum(marks) / len(marks) if marks else 0
+    attendance = sum(row[2] for row in subjects) / len(subjects) if subjects else 0
+    passed = sum(1 for mark in marks if mark >= PASS_MARK)
+
+    buffer = io.BytesIO()
+    document = SimpleDocTemplate(
+        buffer, pagesize=A4, title=f'Report card - {card["name"]}',
+        leftMargin=20 * mm, rightMargin=20 * mm, topMargin=20 * mm, bottomMargin=20 * mm,
+    )
+    story = [
+        Paragraph('Report Card', _styles['Title']),
+        Paragraph(escape(card['name']), _styles['Heading2']),
+        Paragraph(escape(f'Roll no {card["roll_no"]}, {card["department"]}'), _styles['Normal']),
+        Spacer(1, 8 * mm),
+    ]
+    if subjects:
+        rows = [['Subject', 'Marks', 'Attendance', 'Result', 'Assessed on']]
+        rows += [
+            [Paragraph(escape(subject), _styles['BodyText']), mark, f'{attendance_percentage:.1f}%',
+             'Pass' if mark >= PASS_MARK else 'Fail', assessed_on or '']
+            for subject, mark, attendance_percentage, assessed_on in subjects
+        ]
+        table = Table(rows, colWidths=[62 * mm, 22 * mm, 28 * mm, 20 * mm, 30 * mm], repeatRows=1)
+        table.setStyle(_TABLE_STYLE)
+        story += [table, Spacer(1, 8 * mm)]
+        summary = Table([
+            ['Average marks', f'{average:.2f}'],
+            ['Total marks', f'{sum(marks)} of {len(marks) * 100}'],
+            ['Attendance', f'{attendance:.1f}%'],
+            ['Subjects passed', f'{passed} of {len(marks)}'],
+        ], colWidths=[62 * mm, 40 * mm], hAlign='LEFT')
+        summary.setStyle(TableStyle([
+            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+            ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+            ('LINEBELOW', (0, 0), (-1, -1), 0.25, colors.HexColor('#b0bec5')),
+        ]))
+        story.append(summary)
+    else:
+        story.append(Paragraph('No marks recorded yet.', _styles['Normal']))
+    document.build(story)
+    return buffer.getvalue()
+
+
+def _batches(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def render_cards(cards, workers=1, batch_size=BATCH_SIZE):
+    """(card, pdf) of every card in order, rendering cards not stored yet in ``workers`` processes
+
+    ``workers=None`` uses one per CPU. Nothing is stored when
+    settings.ANALYTICS_REPORT_CARD_DIR is not set.
+    """
+    directory = card_dir()
+    workers = workers or os.cpu_count() or 1
+    can_fork = 'fork' in multiprocessing.get_all_start_methods()
+    pool = None
+
+    def build(batch):
+        nonlocal pool
+        if workers > 1 and can_fork and len(batch) >= MIN_POOL_BATCH:
+            if pool is None:
+                # Children only render; they never touch the database connection
+                pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('fork'))
+            chunksize = max(len(batch) // (workers * 4), 1)
+            return list(pool.map(render_report_card, batch, chunksize=chunksize))
+        return [render_report_card(card) for card in batch]
+
+    try:
+        for batch in _batches(cards, batch_size):
+            keys = {card_key(card): card for card in batch}
+            pdfs = load_cards(directory, keys) if directory else {}
+            missing = [key for key in keys if key not in pdfs]
+            record_lookups('report_card', len(pdfs), len(missing))
+            if missing:
+                built = dict(zip(missing, build([keys[key] for key in missing])))
+                if directory:
+                    store_cards(directory, keys, built)
+                pdfs.update(built)
+            for key, card in keys.items():
+                yield card, pdfs[key]
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+
+class _ZipStream:
+    """Write-only file that hands out whatever ZipFile wrote since the last take()"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def iter_report_card_zip(students, workers=1):
+    """A ZIP of the report cards of ``students``, yielded in pieces as it is written"""
+    stream = _ZipStream()
+    # PDFs are compressed already
+    with zipfile.ZipFile(stream, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for card, pdf in render_cards(iter_cards(students), workers=workers):
+            archive.writestr(card_filename(card), pdf)
+            yield stream.take()
+    yield stream.take()
+
+
+def render_report_cards(students, workers=None):
+    """Render and store the cards of ``students`` ahead of downloads; returns how many"""
+    return sum(1 for _ in render_cards(iter_cards(students), workers=workers))
+
+
+def student_report_card(students):
+    """(file name, PDF) of the single student in ``students``, or None"""
+    card, pdf = next(render_cards(iter_cards(students), workers=1), (None, None))
+    return (card_filename(card), pdf) if card else None
@@ -0,0 +1,153 @@
+"""At-risk scoring of students, computed with NumPy
+
+Marks are loaded as columns for a batch of students at a time and every
+factor is derived per student with ``np.bincount``, so scoring costs one
+query and a handful of array operations per batch. Mark writes log the
+student in StaleRiskScore; ``rescore_stale`` only rescores those.
+"""
+import numpy as np
+from django.db import transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from .caching import bump_versions
+from .models import Mark, StaleRiskScore, StudentRisk, delete_log_rows
+from .services import PASS_MARK
+
+
+# Share of the score each factor contributes; every factor is scaled to 0..1 first
+RISK_WEIGHTS = {'attendance': 0.35, 'trend': 0.2, 'variance': 0.15, 'failing': 0.3}
+# Attendance this many points below 100% counts as full risk
+ATTENDANCE_RANGE = 50
+# Losing this many marks per 30 days counts as full risk
+TREND_RANGE = 10
+# A spread of marks across subjects this wide counts as full risk
+STD_RANGE = 30
+STUDENT_BATCH = 20000
+# Students per ``IN (...)`` list when rescoring stale students
+STALE_BATCH = 500
+
+
+def risk_scores(student_ids, marks, attendance, days):
+    """StudentRisk rows for parallel arrays with one entry per mark
+
+    ``days`` is each mark's assessment date as days relative to today,
+    NaN for undated marks; those count everywhere but in the trend.
+    """
+    students, index = np.unique(student_ids, return_inverse=True)
+    count = np.bincount(index).astype(np.float64)
+
+    def per_student(values):
+        return np.bincount(index, weights=values, minlength=len(students))
+
+    dated = ~np.isnan(days)
+    months = np.where(dated, days / 30, 0)
+    marks_sum, months_sum = per_student(marks), per_student(months)
+    mean = marks_sum / count
+    std = np.sqrt(np.maximum(per_student(marks * marks) / count - mean ** 2, 0))
+    mean_attendance = per_student(attendance) / count
+    failing = per_student((marks < PASS_MARK).astype(np.float64))
+
+    # Least-squares slope of dated marks over time; zero with a single assessment date
+    dated_count, dated_sum = per_student(dated.astype(np.float64)), per_student(np.where(dated, marks, 0))
+    spread = dated_count * per_student(months * months) - months_sum ** 2
+    with np.errstate(invalid='ignore', divide='ignore'):
+        trend = np.where(
+            spread > 1e-9, (dated_count * per_student(months * marks) - months_sum * dated_sum) / spread, 0,
+        )
+
+    factors = {
+        'attendance': np.clip((100 - mean_attendance) / ATTENDANCE_RANGE, 0, 1),
+        'trend': np.clip(-trend / TREND_RANGE, 0, 1),
+        'variance': np.clip(std / STD_RANGE, 0, 1),
+        'failing': failing / count,
+    }
+    score = 100 * sum(weight * factors[name] for name, weight in RISK_WEIGHTS.items())
+
+    scored_at = timezone.now()
+    return [
+        StudentRisk(
+            student_id=int(student_id), score=round(float(row_score), 2),
+            attendance=round(float(row_attendance), 2), trend=round(float(row_trend), 2),
+            marks_std=round(float(row_std), 2), failing_count=int(row_failing),
+            mark_count=int(row_count), scored_at=scored_at,
+        )
+        for student_id, row_score, row_attendance, row_trend, row_std, row_failing, row_count in zip(
+            students, score, mean_attendance, trend, std, failing, count,
+        )
+    ]
+
+
+def score_marks(marks):
+    """StudentRisk rows for every student with marks in the ``marks`` queryset"""
+    rows = list(marks.values_list('student_id', 'marks_obtained', 'attendance_percentage', 'assessed_on').order_by())
+    if not rows:
+        return []
+    today = timezone.localdate().toordinal()
+    student_ids, marks_obtained, attendance, assessed_on = zip(*rows)
+    return risk_scores(
+        np.array(student_ids, dtype=np.int64),
+        np.array(marks_obtained, dtype=np.float64),
+        np.array(attendance, dtype=np.float64),
+        np.fromiter(
+            (day.toordinal() - today if day else np.nan for day in assessed_on), dtype=np.float64, count=len(rows),
+        ),
+    )
+
+
+def _save(scores):
+    StudentRisk.objects.bulk_create(
+        scores,
+        update_conflicts=True,
+        unique_fields=['student'],
+        update_fields=['score', 'attendance', 'trend', 'marks_std', 'failing_count', 'mark_count', 'scored_at'],
+    )
+
+
+def rescore_all(batch_size=STUDENT_BATCH):
+    """Score every student from scratch; returns the number scored"""
+    with transaction.atomic():
+        logged = list(StaleRiskScore.objects.values_list('id', flat=True))
+        StudentRisk.objects.all().delete()
+        bounds = Mark.objects.aggregate(first=Min('student_id'), last=Max('student_id'))
+        scored = 0
+        if bounds['first'] is not None:
+            for start in range(bounds['first'], bounds['last'] + 1, batch_size):
+                scores = score_marks(Mark.objects.filter(student_id__gte=start, student_id__lt=start + batch_size))
+                StudentRisk.objects.bulk_create(scores)
+                scored += len(scores)
+        delete_log_rows(StaleRiskScore, logged)
+        bump_versions('risk')
+    return scored
+
+
+def rescore_stale(batch_size=STALE_BATCH):
+    """Rescore only the students whose marks changed since they were last scored
+
+    Only the log rows read here are deleted; writes logged while this
+    runs are left for the next run. Returns the number of students
+    rescored.
+    """
+    logged = list(StaleRiskScore.objects.values_list('id', 'student_id'))
+    if not logged:
+        return 0
+    stale = sorted({student_id for _, student_id in logged})
+
+    with transaction.atomic():
+        for start in range(0, len(stale), batch_size):
+            batch = stale[start:start + batch_size]
+            scores = score_marks(Mark.objects.filter(student_id__in=batch))
+            _save(scores)
+            # Students left without marks no longer have a score
+            scored = {risk.student_id for risk in scores}
+            StudentRisk.objects.filter(student_id__in=[i for i in batch if i not in scored]).delete()
+        delete_log_rows(StaleRiskScore, [log_id for log_id, _ in logged])
+        bump_versions('risk')
+    return len(stale)
+
+
+def mark_risk_stale(student_ids):
+    """Log students whose risk score no longer reflects their marks"""
+    StaleRiskScore.objects.bulk_create([
+        StaleRiskScore(student_id=student_id) for student_id in set(student_ids) if student_id is not None
+    ])
@@ -0,0 +1,101 @@
+"""Indexed substring search over student names and roll numbers
+
+SQLite keeps an FTS5 trigram table in step with the student table through
+triggers; PostgreSQL gets pg_trgm GIN indexes that serve ``icontains``
+directly. Other backends fall back to an unindexed ``icontains``.
+"""
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+
+SEARCH_TABLE = 'analytics_app_student_search'
+# Trigram indexes cannot narrow down shorter terms
+MIN_INDEXED_LENGTH = 3
+
+SQLITE_SCHEMA = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5(
+        name, roll_no, content='analytics_app_student', content_rowid='id', tokenize='trigram'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_insert AFTER INSERT ON analytics_app_student BEGIN
+        INSERT INTO {SEARCH_TABLE}(rowid, name, roll_no) VALUES (new.id, new.name, new.roll_no);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_delete AFTER DELETE ON analytics_app_student BEGIN
+        INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, name, roll_no) VALUES ('delete', old.id, old.name, old.roll_no);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_update AFTER UPDATE OF name, roll_no ON analytics_app_student BEGIN
+        INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, name, roll_no) VALUES ('delete', old.id, old.name, old.roll_no);
+        INSERT INTO {SEARCH_TABLE}(rowid, name, roll_no) VALUES (new.id, new.name, new.roll_no);
+    END""",
+]
+POSTGRESQL_SCHEMA = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE INDEX IF NOT EXISTS student_name_trgm_idx ON analytics_app_student USING gin (name gin_trgm_ops)',
+    'CREATE INDEX IF NOT EXISTS student_roll_no_trgm_idx ON analytics_app_student USING gin (roll_no gin_trgm_ops)',
+]
+
+_fts_available = {}
+
+
+def _sqlite_trigger_count(cursor):
+    cursor.execute(
+        "SELECT COUNT(*) FROM sqlite_master WHERE type = 'trigger' AND name LIKE %s",
+        [f'{SEARCH_TABLE}_%'],
+    )
+    return cursor.fetchone()[0]
+
+
+def ensure_search_index(using=connection):
+    """Create the search index if it is missing; safe to run after every migrate
+
+    SQLite drops the triggers whenever a migration rebuilds the student
+    table, so the index is rebuilt from the table when they had to be
+    recreated.
+    """
+    with using.cursor() as cursor:
+        if using.vendor == 'sqlite':
+            triggers = _sqlite_trigger_count(cursor)
+            for statement in SQLITE_SCHEMA:
+                cursor.execute(statement)
+            if triggers < len(SQLITE_SCHEMA) - 1:
+                cursor.execute(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('rebuild')")
+        elif using.vendor == 'postgresql':
+            for statement in POSTGRESQL_SCHEMA:
+                cursor.execute(statement)
+    _fts_available.pop(using.alias, None)
+
+
+def drop_search_index(using=connection):
+    with using.cursor() as cursor:
+        if using.vendor == 'sqlite':
+            for suffix in ('insert', 'delete', 'update'):
+                cursor.execute(f'DROP TRIGGER IF EXISTS {SEARCH_TABLE}_{suffix}')
+            cursor.execute(f'DROP TABLE IF EXISTS {SEARCH_TABLE}')
+        elif using.vendor == 'postgresql':
+            cursor.execute('DROP INDEX IF EXISTS student_name_trgm_idx')
+            cursor.execute('DROP INDEX IF EXISTS student_roll_no_trgm_idx')
+    _fts_available.pop(using.alias, None)
+
+
+def _uses_fts():
+    if connection.vendor != 'sqlite':
+        return False
+    if connection.alias not in _fts_available:
+        _fts_available[connection.alias] = SEARCH_TABLE in connection.introspection.table_names()
+    return _fts_available[connection.alias]
+
+
+def student_search(term, prefix=''):
+    """Q matching students whose name or roll number contains ``term``
+
+    ``prefix`` is the path to the student from the queried model, e.g.
+    ``'student__'``.
+    """
+    term = term.strip()
+    if len(term) >= MIN_INDEXED_LENGTH and _uses_fts():
+        # Quoted, so the term is matched literally rather than as FTS syntax
+        phrase = '"' + term.replace('"', '""') + '"'
+        return Q(**{f'{prefix}id__in': RawSQL(
+            f'SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s', [phrase],
+        )})
+    return Q(**{f'{prefix}name__icontains': term}) | Q(**{f'{prefix}roll_no__icontains': term})
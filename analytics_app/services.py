@@ -1,13 +1,374 @@
-def calculate_average(marks):
-    if not marks:
-        return 0
-    total = sum(mark.marks_obtained for mark in marks)
-    return total / len(marks)
-
-
-def get_suggestions(average, attendance):
-    if attendance < 75:
-        return "Improve attendance."
-    if average < 40:
-        return "Focus more on weak subjects."
-    return "Good performance. Keep it up!"
\ No newline at end of file
+from django.db.models import Count, Exists, F, Func, Q, Subquery, Sum
+
+from .listing import PAGE_SIZE, keyset_page
+from .models import (
+    AVERAGE_ATTENDANCE, AVERAGE_MARKS, DataVersion, Mark, Ranking, StaleRanking, StaleRiskScore, Student,
+    StudentRisk, StudentSummary, Subject, SubjectSummary,
+)
+from .search import student_search
+from .trends import performance_trend
+
+
+PASS_MARK = 40
+
+# Sections of the combined dashboard payload
+DASHBOARD_SECTIONS = ('stats', 'performance', 'subjects')
+PERFORMANCE_WEEKS = 12
+AT_RISK_LIMIT = 10
+# Seconds a score_risk job queued by a reader waits, so one job scores a burst of mark writes
+RESCORE_DELAY = 15
+
+# Allowed values of the roster ``sort`` parameter and their SQL ordering.
+# Ties break on the student id in the same direction, so each ordering
+# is one scan of an index (see StudentSummary and Student)
+ROSTER_ORDERINGS = {
+    'name': ('student__name', 'student_id'),
+    'marks_desc': ('-average_marks', '-student_id'),
+    'marks_asc': ('average_marks', 'student_id'),
+    'attendance_desc': ('-attendance', '-student_id'),
+    'attendance_asc': ('attendance', 'student_id'),
+    # Failing students are exactly the ones with the lowest averages
+    'failing': ('average_marks', 'student_id'),
+}
+FAILING_LIMIT = 10
+
+
+def subject_performance():
+    """Per-subject average, student count and mark count from the subject summaries"""
+    rows = (
+        SubjectSummary.objects
+        .filter(mark_count__gt=0)
+        .values('subject_id', 'subject__subject_name', 'marks_sum', 'mark_count')
+        .order_by('subject_id')
+    )
+    return [
+        {
+            'id': row['subject_id'],
+            'name': row['subject__subject_name'],
+            'average': round(row['marks_sum'] / row['mark_count'], 2),
+            # A student has at most one mark per subject
+            'total_students': row['mark_count'],
+            'total_marks': row['mark_count'],
+        }
+        for row in rows
+    ]
+
+
+def summary_totals():
+    """Institution-wide totals read from the per-subject summary rows"""
+    totals = SubjectSummary.objects.aggregate(
+        total_marks=Sum('mark_count'),
+        marks_sum=Sum('marks_sum'),
+        attendance_sum=Sum('attendance_sum'),
+        failing_count=Sum('failing_count'),
+    )
+    return _totals(totals['total_marks'], totals['marks_sum'], totals['attendance_sum'], totals['failing_count'])
+
+
+def _totals(total_marks, marks_sum, attendance_sum, failing_count):
+    if not total_marks:
+        return {'total_marks': 0, 'average': 0, 'attendance': 0, 'pass_rate': 0}
+    return {
+        'total_marks': total_marks,
+        'average': marks_sum / total_marks,
+        'attendance': attendance_sum / total_marks,
+        'pass_rate': (total_marks - failing_count) / total_marks * 100,
+    }
+
+
+def dashboard_payload(sections=DASHBOARD_SECTIONS):
+    """Dashboard stats, weekly performance trend and subject averages from two queries
+
+    Stats and subject averages both come from one read of the subject
+    summaries (with the student count as a subquery); the trend reads the
+    stored rollups of closed weeks and aggregates the current one in
+    another. Closed weeks that are not rolled up yet are rolled up first,
+    once. Only the requested sections are computed.
+    """
+    payload = {}
+    if 'stats' in sections or 'subjects' in sections:
+        rows = _subject_summary_rows()
+        if 'stats' in sections:
+            payload['stats'] = _dashboard_stats(rows)
+        if 'subjects' in sections:
+            payload['subjects'] = [
+                {
+                    'name': row['subject_name'],
+                    'average': round(row['summary__marks_sum'] / row['summary__mark_count'], 2)
+                    if row['summary__mark_count'] else 0,
+                }
+                for row in rows
+            ]
+    if 'performance' in sections:
+        payload['performance'] = performance_trend('week', PERFORMANCE_WEEKS)
+    return payload
+
+
+def _subject_summary_rows():
+    student_count = Student.objects.order_by().annotate(
+        count=Func(F('id'), function='COUNT'),
+    ).values('count')
+    return list(
+        Subject.objects
+        .values(
+            'subject_name', 'summary__mark_count', 'summary__marks_sum',
+            'summary__attendance_sum', 'summary__failing_count',
+        )
+        .annotate(total_students=Subquery(student_count))
+        .order_by('id')
+    )
+
+
+def _dashboard_stats(rows):
+    if rows:
+        total_students = rows[0]['total_students']
+    else:
+        # No subjects, so no marks either; only the students need counting
+        total_students = Student.objects.count()
+    totals = _totals(*(
+        sum(row[f'summary__{field}'] or 0 for row in rows)
+        for field in ('mark_count', 'marks_sum', 'attendance_sum', 'failing_count')
+    ))
+    return {
+        'total_students': total_students,
+        'average_score': round(totals['average'], 2),
+        'attendance': round(totals['attendance'], 2),
+        'pass_rate': round(totals['pass_rate'], 2),
+        'total_marks': totals['total_marks'],
+    }
+
+
+def overall_summary():
+    """Class average and graded, failing and mark counts from the summaries"""
+    totals = summary_totals()
+    graded = Q(mark_count__gt=0)
+    counts = StudentSummary.objects.aggregate(
+        graded=Count('pk', filter=graded),
+        failing=Count('pk', filter=graded & Q(marks_sum__lt=F('mark_count') * PASS_MARK)),
+    )
+    return {
+        'average': round(totals['average'], 2),
+        'total_students': counts['graded'],
+        'failing_students': counts['failing'],
+        'total_marks': totals['total_marks'],
+    }
+
+
+def student_averages():
+    """Summary rows of students that have marks, annotated with their averages"""
+    return (
+        StudentSummary.objects
+        .filter(mark_count__gt=0)
+        .annotate(average_marks=AVERAGE_MARKS, attendance=AVERAGE_ATTENDANCE)
+    )
+
+
+def student_roster(sort_by='name', search='', size=PAGE_SIZE, cursor=None):
+    """One keyset page of roster rows in one of ROSTER_ORDERINGS, and the next page's cursor
+
+    ``search`` narrows the roster to names and roll numbers containing it.
+    """
+    ordering = ROSTER_ORDERINGS.get(sort_by, ROSTER_ORDERINGS['name'])
+    queryset = student_averages()
+    if search.strip():
+        queryset = queryset.filter(student_search(search, prefix='student__'))
+    rows, next_cursor = keyset_page(_roster_values(queryset), ordering, size, cursor)
+    return _roster_rows(rows), next_cursor
+
+
+def failing_students(limit=FAILING_LIMIT):
+    """The ``limit`` weakest roster rows with an average below PASS_MARK"""
+    queryset = student_averages().filter(average_marks__lt=PASS_MARK)
+    return _roster_rows(_roster_values(queryset.order_by(*ROSTER_ORDERINGS['failing']))[:limit])
+
+
+def top_students(limit=5):
+    """The ``limit`` best roster rows, read in rank order from the school leaderboard
+
+    While mark writes are waiting for ``rank_students`` (or the leaderboard
+    was never filled), the rows come from the live averages instead.
+    """
+    rows = list(
+        Ranking.objects
+        .filter(department=Ranking.SCHOOL, subject=None)
+        .order_by('rank', 'student_id')
+        .values(
+            'student_id', 'student__name', 'student__roll_no', 'student__department', 'rank',
+            mark_count=F('student__summary__mark_count'),
+            average_marks=F('average'),
+            attendance=F('student__summary__attendance_sum') / F('student__summary__mark_count'),
+            stale=Exists(StaleRanking.objects.all()),
+        )[:limit]
+    )
+    if rows and not rows[0]['stale']:
+        return [dict(student, rank=row['rank']) for student, row in zip(_roster_rows(rows), rows)]
+
+    rows = list(_roster_values(student_averages().order_by('-average_marks', '-student_id'))[:limit])
+    students = _roster_rows(rows)
+    for index, (student, row) in enumerate(zip(students, rows)):
+        # Ties share the rank of the first student with that average, as in the leaderboard
+        tied = index and row['average_marks'] == rows[index - 1]['average_marks']
+        student['rank'] = students[index - 1]['rank'] if tied else index + 1
+    return students
+
+
+def student_report_version(user):
+    """(student id, cache version) of the student linked to ``user``, or None, from one query
+
+    The version moves whenever the student's marks, any subject name or
+    the rankings change, which is everything their report shows.
+    """
+    def table_version(table):
+        return Subquery(DataVersion.objects.filter(table=table).values('version')[:1])
+
+    student = (
+        Student.objects
+        .filter(user=user)
+        .values('id', 'summary__changed_at')
+        .annotate(subject_version=table_version('subject'), ranking_version=table_version('ranking'))
+        .first()
+    )
+    if student is None:
+        return None
+    changed_at = student['summary__changed_at']
+    version = '.'.join(str(part or 0) for part in (
+        changed_at.timestamp() if changed_at else 0, student['subject_version'], student['ranking_version'],
+    ))
+    return student['id'], version
+
+
+def student_report(student_id):
+    """Per-subject averages, overall totals and ranks of one student
+
+    One grouped query over the marks and one leaderboard lookup.
+    """
+    rows = list(
+        Mark.objects
+        .filter(student_id=student_id)
+        .values('subject_id', 'subject__subject_name')
+        .annotate(
+            mark_count=Count('id'),
+            marks_sum=Sum('marks_obtained'),
+            attendance_sum=Sum('attendance_percentage'),
+        )
+        .order_by('subject_id')
+    )
+    totals = _totals(
+        sum(row['mark_count'] for row in rows),
+        sum(row['marks_sum'] for row in rows),
+        sum(row['attendance_sum'] for row in rows),
+        0,
+    )
+    rankings = {
+        (department == Ranking.SCHOOL, subject_id): {
+            'rank': rank, 'percentile': round(percentile, 1), 'group_size': group_size,
+        }
+        for department, subject_id, rank, percentile, group_size in Ranking.objects.filter(
+            student_id=student_id,
+        ).values_list('department', 'subject_id', 'rank', 'percentile', 'group_size')
+    }
+    subjects = []
+    for row in rows:
+        average = round(row['marks_sum'] / row['mark_count'], 2)
+        ranking = rankings.get((False, row['subject_id']), {})
+        subjects.append({
+            'name': row['subject__subject_name'], 'average': average, 'percentage': average,
+            'rank': ranking.get('rank', 0), 'group_size': ranking.get('group_size', 0),
+        })
+    return {
+        'subject_performance': subjects,
+        'overall_average': round(totals['average'], 2),
+        'attendance_percentage': round(totals['attendance'], 2),
+        'total_marks': totals['total_marks'],
+        'department_rank': rankings.get((False, None)),
+        'school_rank': rankings.get((True, None)),
+    }
+
+
+def at_risk_students(limit=AT_RISK_LIMIT, department=None):
+    """The ``limit`` highest stored risk scores, read in score order from its index, and whether they are stale
+
+    While marks changed since the last scoring run, the stored scores are
+    returned flagged stale and a score_risk job is queued (unless one is
+    pending already), so requests never rescore themselves.
+    """
+    # jobs imports the risk module that imports this one
+    from .jobs import enqueue_unless_pending
+
+    risks = StudentRisk.objects.order_by('-score', 'student_id')
+    if department is not None:
+        risks = risks.filter(student__department=department)
+    risks = risks.values(
+        'student_id', 'student__name', 'student__roll_no', 'student__department',
+        'score', 'attendance', 'trend', 'marks_std', 'failing_count', 'mark_count', 'scored_at',
+        stale=Exists(StaleRiskScore.objects.all()),
+    )
+    rows = list(risks[:limit])
+    # An empty list carries no stale flag
+    stale = rows[0]['stale'] if rows else StaleRiskScore.objects.exists()
+    if stale:
+        enqueue_unless_pending('score_risk', delay=RESCORE_DELAY)
+    students = [
+        {
+            'id': row['student_id'],
+            'name': row['student__name'],
+            'roll_no': row['student__roll_no'],
+            'department': row['student__department'],
+            'score': row['score'],
+            'attendance': row['attendance'],
+            'trend': row['trend'],
+            'marks_std': row['marks_std'],
+            'failing_count': row['failing_count'],
+            'mark_count': row['mark_count'],
+            'scored_at': row['scored_at'],
+        }
+        for row in rows
+    ]
+    return students, stale
+
+
+def teacher_dashboard_summary(sort_by='name', search='', page_size=PAGE_SIZE, cursor=None, top_n=5):
+    """Everything the teacher dashboard shows, from a fixed number of queries
+
+    Only one page of the roster is fetched, so the cost does not grow
+    with the number of students.
+    """
+    overall = overall_summary()
+    students, next_cursor = student_roster(sort_by, search, page_size, cursor)
+    at_risk, at_risk_stale = at_risk_students()
+    return {
+        'class_stats': subject_performance(),
+        'students_list': students,
+        'next_cursor': next_cursor,
+        'top_students': top_students(top_n),
+        'at_risk_students': at_risk,
+        'at_risk_stale': at_risk_stale,
+        'failing_students': failing_students(),
+        'overall_class_avg': overall['average'],
+        'total_students_count': overall['total_students'],
+        'failing_count': overall['failing_students'],
+        'total_marks_count': overall['total_marks'],
+    }
+
+
+def _roster_values(queryset):
+    return queryset.values(
+        'student_id', 'student__name', 'student__roll_no', 'student__department',
+        'average_marks', 'attendance', 'mark_count',
+    )
+
+
+def _roster_rows(rows):
+    return [
+        {
+            'id': row['student_id'],
+            'name': row['student__name'],
+            'roll_no': row['student__roll_no'],
+            'department': row['student__department'],
+            'average_marks': round(row['average_marks'], 2),
+            'attendance': round(row['attendance'], 2),
+            'is_failing': row['average_marks'] < PASS_MARK,
+            'total_marks_records': row['mark_count'],
+        }
+        for row in rows
+    ]
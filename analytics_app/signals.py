@@ -0,0 +1,168 @@
+from django.db.models import DEFERRED
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from accounts.models import Profile
+
+from .caching import bump_versions
+from .models import Mark, Student, Subject
+from .rankings import mark_rankings_stale, mark_student_moved
+from .risk import mark_risk_stale
+from .snapshot import record_mark_writes, record_student_update
+from .summaries import apply_mark_changes, mark_values
+from .trends import invalidate_rollups
+
+
+TRACKED_FIELDS = ('student_id', 'subject_id', 'marks_obtained', 'attendance_percentage')
+
+
+def _stored_values(mark):
+    loaded = getattr(mark, '_loaded_values', None) or {}
+    if all(loaded.get(field, DEFERRED) is not DEFERRED for field in TRACKED_FIELDS):
+        return (
+            loaded['student_id'],
+            loaded['subject_id'],
+            int(loaded['marks_obtained']),
+            float(loaded['attendance_percentage']),
+        )
+    return (
+        Mark.objects
+        .filter(pk=mark.pk)
+        .values_list(*TRACKED_FIELDS)
+        .first()
+    )
+
+
+@receiver(pre_save, sender=Mark)
+def remember_previous_mark(sender, instance, raw=False, **kwargs):
+    """Capture the stored row before an update overwrites it"""
+    if raw or instance.pk is None or instance._state.adding:
+        instance._previous_values = None
+    else:
+        instance._previous_values = _stored_values(instance)
+
+
+@receiver(post_save, sender=Mark)
+def update_summaries_on_save(sender, instance, created, raw=False, **kwargs):
+    """Move the saved mark's contribution in the student and subject summaries"""
+    if raw:
+        return
+    previous = None if created else getattr(instance, '_previous_values', None)
+    current = mark_values(instance)
+    apply_mark_changes(added=[current], removed=[previous] if previous else [])
+    instance._loaded_values = dict(zip(TRACKED_FIELDS, current))
+
+
+@receiver(post_delete, sender=Mark)
+def update_summaries_on_delete(sender, instance, **kwargs):
+    """Remove the deleted mark's contribution from the summaries"""
+    apply_mark_changes(removed=[_stored_values(instance) or mark_values(instance)])
+
+
+@receiver(pre_save, sender=Mark)
+def remember_previous_assessment(sender, instance, raw=False, **kwargs):
+    """Capture the stored assessment date before an update moves the mark"""
+    instance._previous_assessed_on = None
+    if raw or instance.pk is None or instance._state.adding:
+        return
+    loaded = getattr(instance, '_loaded_values', None) or {}
+    if loaded.get('assessed_on', DEFERRED) is not DEFERRED:
+        instance._previous_assessed_on = loaded['assessed_on']
+    else:
+        instance._previous_assessed_on = (
+            Mark.objects.filter(pk=instance.pk).values_list('assessed_on', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Mark)
+def invalidate_trends_on_save(sender, instance, raw=False, **kwargs):
+    """Forget the rolled-up trend periods the saved mark left or joined"""
+    if raw:
+        return
+    invalidate_rollups([instance.assessed_on, getattr(instance, '_previous_assessed_on', None)])
+    instance._loaded_values['assessed_on'] = instance.assessed_on
+
+
+@receiver(post_delete, sender=Mark)
+def invalidate_trends_on_delete(sender, instance, **kwargs):
+    """Forget the rolled-up trend period the deleted mark belonged to"""
+    invalidate_rollups([instance.assessed_on])
+
+
+@receiver(post_save, sender=Student)
+def invalidate_trends_on_student_save(sender, instance, created, raw=False, **kwargs):
+    """A department change moves the student's marks between rolled-up groups"""
+    if raw or created:
+        return
+    invalidate_rollups(Mark.objects.filter(student=instance).values_list('assessed_on', flat=True).distinct())
+
+
+@receiver(post_save, sender=Mark)
+def queue_risk_rescore_on_save(sender, instance, raw=False, **kwargs):
+    """The saved mark's student, and its previous student, need rescoring"""
+    if raw:
+        return
+    previous = getattr(instance, '_previous_values', None)
+    mark_risk_stale([instance.student_id, previous[0] if previous else None])
+
+
+@receiver(post_delete, sender=Mark)
+def queue_risk_rescore_on_delete(sender, instance, **kwargs):
+    """The deleted mark's student needs rescoring"""
+    mark_risk_stale([instance.student_id])
+
+
+@receiver(post_save, sender=Mark)
+def queue_rerank_on_save(sender, instance, raw=False, **kwargs):
+    """The saved mark's groups, and the groups it moved out of, need re-ranking"""
+    if raw:
+        return
+    previous = getattr(instance, '_previous_values', None)
+    mark_rankings_stale([(instance.student_id, instance.subject_id), previous[:2] if previous else (None, None)])
+
+
+@receiver(post_delete, sender=Mark)
+def queue_rerank_on_delete(sender, instance, **kwargs):
+    """The deleted mark's groups need re-ranking"""
+    mark_rankings_stale([(instance.student_id, instance.subject_id)])
+
+
+@receiver(post_save, sender=Student)
+def queue_rerank_on_student_save(sender, instance, created, raw=False, **kwargs):
+    """A department change moves the student between ranking groups"""
+    if not (raw or created):
+        mark_student_moved(instance)
+
+
+@receiver(post_save, sender=Mark)
+def log_snapshot_upsert(sender, instance, raw=False, **kwargs):
+    """Queue the saved mark for the columnar snapshot"""
+    if not raw:
+        record_mark_writes(rows=[(instance.pk, *mark_values(instance))])
+
+
+@receiver(post_delete, sender=Mark)
+def log_snapshot_delete(sender, instance, **kwargs):
+    """Queue the deleted mark's removal from the columnar snapshot"""
+    record_mark_writes(deleted_ids=[instance.pk])
+
+
+@receiver(post_save, sender=Student)
+def log_snapshot_student_update(sender, instance, created, raw=False, **kwargs):
+    """A department change has to reach the snapshot's department column"""
+    if not (raw or created):
+        record_student_update(instance.pk)
+
+
+@receiver(post_save, sender=Student)
+@receiver(post_delete, sender=Student)
+@receiver(post_save, sender=Subject)
+@receiver(post_delete, sender=Subject)
+@receiver(post_save, sender=Mark)
+@receiver(post_delete, sender=Mark)
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def invalidate_cached_analytics(sender, raw=False, **kwargs):
+    """Bump the written table's version so cached answers built from it are skipped"""
+    if not raw:
+        bump_versions(sender._meta.model_name)
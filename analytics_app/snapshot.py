@@ -0,0 +1,275 @@
+"""Columnar, memory-mapped snapshot of the Mark table
+
+A snapshot is a generation directory of raw fixed-width column files plus
+a manifest. Workers map the files read-only, so every process shares one
+copy through the page cache. Mark writes made after the snapshot are
+logged as MarkDelta rows and overlaid on read; compaction folds them into
+a new generation, publishes it by rewriting the CURRENT file and deletes
+the rows it folded in. Every row still logged is overlaid, so a write that
+commits late with a lower id is not skipped.
+
+Everything is off unless settings.ANALYTICS_SNAPSHOT_DIR is set.
+"""
+import json
+import os
+import shutil
+import threading
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+
+from .models import Mark, MarkDelta, delete_log_rows
+
+
+# Column name -> dtype; the department column holds an index into the manifest's departments
+COLUMNS = {
+    'mark_id': np.int32,
+    'student_id': np.int32,
+    'subject_id': np.int32,
+    'department': np.int32,
+    'marks': np.int16,
+    'attendance': np.float32,
+}
+CHUNK_SIZE = 50000
+# Readers fall back to the ORM rather than overlay more deltas than this
+MAX_PENDING_DELTAS = 50000
+
+_lock = threading.Lock()
+_loaded = {}
+
+
+class Snapshot:
+    """One published generation: mapped columns and department names"""
+
+    def __init__(self, generation, columns, departments):
+        self.generation = generation
+        self.columns = columns
+        self.departments = departments
+
+    def __len__(self):
+        return len(self.columns['mark_id'])
+
+
+def snapshot_dir():
+    directory = getattr(settings, 'ANALYTICS_SNAPSHOT_DIR', None)
+    return Path(directory) if directory else None
+
+
+def load_snapshot():
+    """The current generation, mapped once per process; None when there is none"""
+    directory = snapshot_dir()
+    if directory is None:
+        return None
+    try:
+        generation = (directory / 'CURRENT').read_text().strip()
+    except FileNotFoundError:
+        return None
+
+    with _lock:
+        snapshot = _loaded.get(directory)
+        if snapshot is None or snapshot.generation != generation:
+            snapshot = _open(directory / generation, generation)
+            _loaded[directory] = snapshot
+    return snapshot
+
+
+def _open(path, generation):
+    manifest = json.loads((path / 'manifest.json').read_text())
+    rows = manifest['rows']
+    columns = {}
+    for name, dtype in COLUMNS.items():
+        if rows:
+            columns[name] = np.memmap(path / f'{name}.bin', dtype=dtype, mode='r', shape=(rows,))
+        else:
+            columns[name] = np.empty(0, dtype=dtype)
+    return Snapshot(generation, columns, manifest['departments'])
+
+
+def marks_columns():
+    """(columns, department names) of every current mark, or None without a usable snapshot
+
+    Columns are the mapped files themselves unless deltas are pending, in
+    which case the overlay is a merged copy. Deltas already folded into
+    the generation but not yet deleted apply again harmlessly: the newest
+    write per mark still wins.
+    """
+    snapshot = load_snapshot()
+    if snapshot is None:
+        return None
+    deltas = _pending_deltas(MAX_PENDING_DELTAS + 1)
+    if len(deltas) > MAX_PENDING_DELTAS:
+        return None
+    if not deltas:
+        return snapshot.columns, snapshot.departments
+    return apply_deltas(snapshot.columns, snapshot.departments, deltas)
+
+
+def _pending_deltas(limit=None):
+    deltas = (
+        MarkDelta.objects
+        .order_by('id')
+        .values_list(
+            'id', 'mark_id', 'deleted', 'student_id', 'subject_id', 'student__department',
+            'marks_obtained', 'attendance_percentage',
+        )
+    )
+    return list(deltas[:limit] if limit else deltas)
+
+
+def apply_deltas(columns, departments, deltas):
+    """New (columns, departments) with ``deltas`` applied in order; the last write per mark wins"""
+    latest = {}
+    for delta in deltas:
+        latest[delta[1]] = delta
+    keep = ~np.isin(columns['mark_id'], np.fromiter(latest, dtype=np.int32, count=len(latest)))
+
+    departments = list(departments)
+    codes = {name: code for code, name in enumerate(departments)}
+    rows = []
+    for _, mark_id, deleted, student_id, subject_id, department, marks, attendance in latest.values():
+        if deleted or department is None:
+            continue
+        if department not in codes:
+            codes[department] = len(departments)
+            departments.append(department)
+        rows.append((mark_id, student_id, subject_id, codes[department], marks, attendance))
+
+    merged = {}
+    for index, (name, dtype) in enumerate(COLUMNS.items()):
+        added = np.fromiter((row[index] for row in rows), dtype=dtype, count=len(rows))
+        merged[name] = np.concatenate([columns[name][keep], added])
+    return merged, departments
+
+
+def record_mark_writes(rows=(), deleted_ids=()):
+    """Log (mark_id, student_id, subject_id, marks, attendance) upserts and deleted mark ids"""
+    if snapshot_dir() is None:
+        return
+    deltas = [
+        MarkDelta(mark_id=mark_id, student_id=student_id, subject_id=subject_id,
+                  marks_obtained=marks, attendance_percentage=attendance)
+        for mark_id, student_id, subject_id, marks, attendance in rows
+    ]
+    deltas += [MarkDelta(mark_id=mark_id, deleted=True) for mark_id in deleted_ids]
+    if deltas:
+        MarkDelta.objects.bulk_create(deltas)
+
+
+def record_student_update(student_id):
+    """Re-log every mark of a student whose department may have changed"""
+    if snapshot_dir() is None:
+        return
+    record_mark_writes(
+        Mark.objects
+        .filter(student_id=student_id)
+        .values_list('id', 'student_id', 'subject_id', 'marks_obtained', 'attendance_percentage')
+    )
+
+
+def build_snapshot(chunk_size=CHUNK_SIZE):
+    """Write every mark to a new generation from the database; returns the Snapshot"""
+    directory = _require_dir()
+    path, generation = _new_generation(directory)
+    departments = {}
+    rows = 0
+
+    with transaction.atomic():
+        # Writes logged so far are in the marks read below; later ones stay pending
+        folded = list(MarkDelta.objects.values_list('id', flat=True))
+        marks = (
+            Mark.objects
+            .order_by('id')
+            .values_list(
+                'id', 'student_id', 'subject_id', 'student__department',
+                'marks_obtained', 'attendance_percentage',
+            )
+            .iterator(chunk_size=chunk_size)
+        )
+        files = {name: open(path / f'{name}.bin', 'wb') for name in COLUMNS}
+        try:
+            batch = []
+            for mark in marks:
+                batch.append(mark)
+                if len(batch) >= chunk_size:
+                    rows += _write_batch(files, batch, departments)
+                    batch = []
+            rows += _write_batch(files, batch, departments)
+        finally:
+            for file in files.values():
+                file.close()
+
+    return _publish(directory, path, generation, rows, list(departments), folded)
+
+
+def _write_batch(files, batch, departments):
+    if not batch:
+        return 0
+    for mark in batch:
+        departments.setdefault(mark[3], len(departments))
+    values = {
+        'mark_id': (mark[0] for mark in batch),
+        'student_id': (mark[1] for mark in batch),
+        'subject_id': (mark[2] for mark in batch),
+        'department': (departments[mark[3]] for mark in batch),
+        'marks': (mark[4] for mark in batch),
+        'attendance': (mark[5] for mark in batch),
+    }
+    for name, dtype in COLUMNS.items():
+        np.fromiter(values[name], dtype=dtype, count=len(batch)).tofile(files[name])
+    return len(batch)
+
+
+def compact_snapshot():
+    """Fold pending deltas into a new generation without rescanning the Mark table"""
+    snapshot = load_snapshot()
+    if snapshot is None:
+        return build_snapshot()
+    directory = _require_dir()
+    deltas = _pending_deltas()
+    if not deltas:
+        return snapshot
+
+    columns, departments = apply_deltas(snapshot.columns, snapshot.departments, deltas)
+    path, generation = _new_generation(directory)
+    for name in COLUMNS:
+        columns[name].tofile(path / f'{name}.bin')
+    folded = [delta[0] for delta in deltas]
+    return _publish(directory, path, generation, len(columns['mark_id']), departments, folded)
+
+
+def _require_dir():
+    directory = snapshot_dir()
+    if directory is None:
+        raise ValueError('settings.ANALYTICS_SNAPSHOT_DIR is not set')
+    directory.mkdir(parents=True, exist_ok=True)
+    return directory
+
+
+def _new_generation(directory):
+    existing = [int(entry.name) for entry in directory.iterdir() if entry.is_dir() and entry.name.isdigit()]
+    generation = f'{max(existing, default=0) + 1:06d}'
+    path = directory / generation
+    path.mkdir()
+    return path, generation
+
+
+def _publish(directory, path, generation, rows, departments, folded):
+    """Make ``path`` the current generation and delete the ``folded`` MarkDelta ids"""
+    (path / 'manifest.json').write_text(json.dumps({
+        'rows': rows,
+        'departments': departments,
+        'columns': {name: np.dtype(dtype).str for name, dtype in COLUMNS.items()},
+    }))
+    # Readers only ever see a complete generation: CURRENT is swapped atomically
+    pointer = directory / 'CURRENT.tmp'
+    pointer.write_text(generation)
+    os.replace(pointer, directory / 'CURRENT')
+
+    delete_log_rows(MarkDelta, folded)
+    # Keep the previous generation for readers that are still switching over
+    for entry in directory.iterdir():
+        if entry.is_dir() and entry.name.isdigit() and int(entry.name) < int(generation) - 1:
+            shutil.rmtree(entry, ignore_errors=True)
+    return load_snapshot()
@@ -0,0 +1,171 @@
+"""Distribution statistics over marks, computed with NumPy
+
+Marks are whole numbers from 0 to 100, so the database only has to return
+a frequency table: one row per (subject, mark) with the number of marks
+and their attendance sums. Every statistic below is derived from that
+table in vectorized form, exactly as if the raw marks had been loaded,
+without fetching a row per mark or building model instances.
+"""
+import numpy as np
+from django.db.models import Count, F, Sum
+
+from .models import Mark, Subject
+from .snapshot import marks_columns
+
+
+MARK_VALUES = np.arange(101)
+# Histogram buckets of ten marks; the last one also holds 100
+HISTOGRAM_EDGES = np.arange(0, 101, 10)
+OUTLIER_Z = 2
+
+
+class Frequencies:
+    """Mark counts and attendance sums per subject (rows) and mark value (columns)"""
+
+    def __init__(self, subject_ids, counts, attendance_sums, attendance_squares):
+        self.subject_ids = subject_ids
+        self.counts = counts
+        self.attendance_sums = attendance_sums
+        self.attendance_squares = attendance_squares
+
+
+def mark_frequencies(marks=None):
+    """Frequencies of ``marks`` (every mark by default) from one grouped query
+
+    Every mark is scanned from the columnar snapshot instead when one is
+    available.
+    """
+    if marks is None:
+        snapshot = marks_columns()
+        if snapshot is not None:
+            return _column_frequencies(snapshot[0])
+    rows = (
+        (Mark.objects.all() if marks is None else marks)
+        .values_list('subject_id', 'marks_obtained')
+        .annotate(
+            count=Count('id'),
+            attendance_sum=Sum('attendance_percentage'),
+            attendance_squares=Sum(F('attendance_percentage') * F('attendance_percentage')),
+        )
+        .order_by()
+    )
+    table = np.array(list(rows), dtype=np.float64).reshape(-1, 5)
+    subject_ids, rows_index = np.unique(table[:, 0].astype(np.int64), return_inverse=True)
+    columns = np.clip(table[:, 1].astype(np.int64), 0, 100)
+
+    shape = (len(subject_ids), len(MARK_VALUES))
+    matrices = []
+    for column in (2, 3, 4):
+        matrix = np.zeros(shape)
+        np.add.at(matrix, (rows_index, columns), table[:, column])
+        matrices.append(matrix)
+    return Frequencies(subject_ids, *matrices)
+
+
+def _column_frequencies(columns):
+    subject_ids, rows_index = np.unique(columns['subject_id'], return_inverse=True)
+    cells = rows_index * len(MARK_VALUES) + np.clip(columns['marks'], 0, 100)
+    size = len(subject_ids) * len(MARK_VALUES)
+    attendance = columns['attendance'].astype(np.float64)
+    return Frequencies(subject_ids, *(
+        np.bincount(cells, weights=weights, minlength=size).reshape(-1, len(MARK_VALUES))
+        for weights in (None, attendance, attendance * attendance)
+    ))
+
+
+def weighted_quantiles(values, counts, quantiles):
+    """Quantiles of ``values`` repeated ``counts`` times, interpolated like numpy.quantile"""
+    total = counts.sum()
+    if not total:
+        return np.full(len(quantiles), np.nan)
+    cumulative = np.cumsum(counts)
+    positions = np.asarray(quantiles) * (total - 1)
+    lower = np.floor(positions)
+    below = values[np.searchsorted(cumulative, lower, side='right')]
+    above = values[np.searchsorted(cumulative, np.ceil(positions), side='right')]
+    return below + (positions - lower) * (above - below)
+
+
+def _moments(counts):
+    """(count, mean, standard deviation) along the last axis of mark counts"""
+    total = counts.sum(axis=-1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = (counts * MARK_VALUES).sum(axis=-1) / total
+        variance = (counts * MARK_VALUES ** 2).sum(axis=-1) / total - mean ** 2
+    return total, mean, np.sqrt(np.maximum(variance, 0))
+
+
+def _number(value, digits=2):
+    return None if value is None or np.isnan(value) else round(float(value), digits)
+
+
+def distribution_report(marks=None):
+    """Summary statistics, histogram, attendance correlation and per-subject z-scores"""
+    frequencies = mark_frequencies(marks)
+    counts = frequencies.counts.sum(axis=0)
+    total, mean, std = _moments(counts)
+    if not total:
+        return None
+
+    q1, median, q3 = weighted_quantiles(MARK_VALUES, counts, [0.25, 0.5, 0.75])
+    present = np.flatnonzero(counts)
+
+    # Pearson correlation from the sums of marks, attendance and their product
+    attendance_sum = frequencies.attendance_sums.sum()
+    attendance_mean = attendance_sum / total
+    attendance_std = np.sqrt(max(frequencies.attendance_squares.sum() / total - attendance_mean ** 2, 0))
+    covariance = (frequencies.attendance_sums.sum(axis=0) * MARK_VALUES).sum() / total - mean * attendance_mean
+    with np.errstate(invalid='ignore', divide='ignore'):
+        correlation = covariance / (std * attendance_std)
+
+    bucket = np.minimum(MARK_VALUES // 10, len(HISTOGRAM_EDGES) - 2)
+    histogram = np.bincount(bucket, weights=counts, minlength=len(HISTOGRAM_EDGES) - 1)
+
+    # z-score of every (subject, mark) cell against its own subject
+    subject_totals, subject_means, subject_stds = _moments(frequencies.counts)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        z_scores = (MARK_VALUES[None, :] - subject_means[:, None]) / subject_stds[:, None]
+        outliers = (frequencies.counts * (np.abs(z_scores) > OUTLIER_Z)).sum(axis=1) / subject_totals * 100
+        subject_z = (subject_means - mean) / std
+    subject_medians = [
+        weighted_quantiles(MARK_VALUES, row, [0.5])[0] for row in frequencies.counts
+    ]
+    names = dict(Subject.objects.filter(id__in=frequencies.subject_ids.tolist()).values_list('id', 'subject_name'))
+
+    return {
+        'count': int(total),
+        'mean': _number(mean),
+        'median': _number(median),
+        'std': _number(std),
+        'q1': _number(q1),
+        'q3': _number(q3),
+        'min': int(present[0]),
+        'max': int(present[-1]),
+        'attendance_mean': _number(attendance_mean),
+        'attendance_std': _number(attendance_std),
+        'attendance_correlation': _number(correlation, 3),
+        'histogram': [
+            {
+                'label': f'{low}-{high - 1 if high < 100 else 100}',
+                'count': int(count),
+                'percent': _number(count / total * 100),
+            }
+            for low, high, count in zip(HISTOGRAM_EDGES[:-1], HISTOGRAM_EDGES[1:], histogram)
+        ],
+        'subjects': [
+            {
+                'id': int(subject_id),
+                'name': names.get(int(subject_id), ''),
+                'count': int(subject_total),
+                'mean': _number(subject_mean),
+                'median': _number(subject_median),
+                'std': _number(subject_std),
+                'z_score': _number(z),
+                'outlier_percent': _number(outlier),
+            }
+            for subject_id, subject_total, subject_mean, subject_median, subject_std, z, outlier in zip(
+                frequencies.subject_ids, subject_totals, subject_means, subject_medians,
+                subject_stds, subject_z, outliers,
+            )
+        ],
+    }
@@ -0,0 +1,111 @@
+"""Batch suggestion engine
+
+Suggestions are generated for every student at once from their real
+per-subject averages and attendance, one grouped query per department,
+and stored in StudentSuggestion so a student's page is a single lookup.
+Departments are independent, so a run can spread them over a process pool.
+"""
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from django.db import connection, connections, transaction
+from django.db.models import Avg, Count
+from django.utils import timezone
+
+from .models import Mark, Student, StudentSuggestion
+from .services import PASS_MARK
+
+
+ATTENDANCE_TARGET = 75
+
+
+def suggestions_for(subjects):
+    """(kind, subject_id, message) advice for one student's subject rows
+
+    ``subjects`` holds (subject_id, subject_name, mark_count, average,
+    attendance) per subject the student has marks in.
+    """
+    mark_count = sum(row[2] for row in subjects)
+    attendance = sum(row[2] * row[4] for row in subjects) / mark_count
+
+    suggestions = []
+    if attendance < ATTENDANCE_TARGET:
+        suggestions.append(('attendance', None, f"Improve attendance (currently {attendance:.1f}%)."))
+    for subject_id, name, _, subject_average, subject_attendance in subjects:
+        if subject_average < PASS_MARK:
+            suggestions.append((
+                'subject', subject_id, f"Focus more on {name} (average {subject_average:.1f}).",
+            ))
+        elif attendance >= ATTENDANCE_TARGET and subject_attendance < ATTENDANCE_TARGET:
+            suggestions.append((
+                'subject_attendance', subject_id,
+                f"Attend more {name} classes (attendance {subject_attendance:.1f}%).",
+            ))
+    if not suggestions:
+        suggestions.append(('praise', None, "Good performance. Keep it up!"))
+    return suggestions
+
+
+def department_suggestions(department):
+    """(student_id, kind, subject_id, message) for every graded student of ``department``"""
+    rows = (
+        Mark.objects
+        .filter(student__department=department)
+        .values_list('student_id', 'subject_id', 'subject__subject_name')
+        .annotate(
+            mark_count=Count('id'),
+            average=Avg('marks_obtained'),
+            attendance=Avg('attendance_percentage'),
+        )
+        .order_by('student_id', 'subject_id')
+    )
+
+    results = []
+    student_id, subjects = None, []
+    for row in rows.iterator(chunk_size=5000):
+        if row[0] != student_id:
+            if subjects:
+                results += [(student_id, *suggestion) for suggestion in suggestions_for(subjects)]
+            student_id, subjects = row[0], []
+        subjects.append(row[1:])
+    if subjects:
+        results += [(student_id, *suggestion) for suggestion in suggestions_for(subjects)]
+    return results
+
+
+def generate_suggestions(departments=None, workers=1, batch_size=1000):
+    """Regenerate the stored suggestions of ``departments`` (all by default)
+
+    With more than one worker the departments are computed in forked
+    processes; the parent writes every result in one transaction.
+    Returns (students, suggestions) written.
+    """
+    everyone = departments is None
+    if everyone:
+        departments = list(Student.objects.order_by().values_list('department', flat=True).distinct())
+
+    workers = min(workers, len(departments))
+    # Forked children must open their own connections, which is only safe outside a transaction
+    if workers > 1 and 'fork' in multiprocessing.get_all_start_methods() and not connection.in_atomic_block:
+        connections.close_all()
+        with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('fork')) as pool:
+            results = list(pool.map(department_suggestions, departments))
+    else:
+        results = [department_suggestions(department) for department in departments]
+
+    generated_at = timezone.now()
+    suggestions = [
+        StudentSuggestion(
+            student_id=student_id, kind=kind, subject_id=subject_id,
+            message=message, generated_at=generated_at,
+        )
+        for department in results
+        for student_id, kind, subject_id, message in department
+    ]
+    with transaction.atomic():
+        stale = StudentSuggestion.objects.all()
+        if not everyone:
+            stale = stale.filter(student__department__in=departments)
+        stale.delete()
+        StudentSuggestion.objects.bulk_create(suggestions, batch_size=batch_size)
+    return len({suggestion.student_id for suggestion in suggestions}), len(suggestions)
@@ -0,0 +1,102 @@
+from collections import defaultdict
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+
+from .caching import bump_versions
+from .models import Mark, StudentSummary, SubjectSummary
+from .services import PASS_MARK
+
+
+SUMMARY_FIELDS = ('mark_count', 'marks_sum', 'marks_sum_squares', 'attendance_sum', 'failing_count')
+
+
+def mark_values(mark):
+    """(student_id, subject_id, marks, attendance) for a Mark instance"""
+    return (
+        mark.student_id,
+        mark.subject_id,
+        int(mark.marks_obtained),
+        float(mark.attendance_percentage),
+    )
+
+
+def apply_mark_changes(added=(), removed=()):
+    """Fold added and removed (student_id, subject_id, marks, attendance) rows into the summaries
+
+    Rows are combined per student and per subject first, so a bulk write
+    touches each summary row once.
+    """
+    student_deltas = defaultdict(lambda: dict.fromkeys(SUMMARY_FIELDS, 0))
+    subject_deltas = defaultdict(lambda: dict.fromkeys(SUMMARY_FIELDS, 0))
+
+    for sign, rows in ((1, added), (-1, removed)):
+        for student_id, subject_id, marks, attendance in rows:
+            for delta in (student_deltas[student_id], subject_deltas[subject_id]):
+                delta['mark_count'] += sign
+                delta['marks_sum'] += sign * marks
+                delta['marks_sum_squares'] += sign * marks * marks
+                delta['attendance_sum'] += sign * attendance
+                delta['failing_count'] += sign if marks < PASS_MARK else 0
+
+    for student_id, delta in student_deltas.items():
+        _apply_delta(StudentSummary, 'student_id', student_id, delta)
+    for subject_id, delta in subject_deltas.items():
+        _apply_delta(SubjectSummary, 'subject_id', subject_id, delta)
+
+
+def _apply_delta(model, key_field, key, delta):
+    # An all-zero delta (a mark moved to another subject with the same
+    # values) still moves changed_at, as the student's report changed
+    updates = {field: F(field) + value for field, value in delta.items() if value}
+    updates['changed_at'] = timezone.now()
+    if model.objects.filter(**{key_field: key}).update(**updates):
+        return
+    if delta['mark_count'] <= 0:
+        # Nothing to subtract from; rebuild_summaries will repair the row
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**{key_field: key}, **delta)
+    except IntegrityError:
+        # Another writer created the row first
+        model.objects.filter(**{key_field: key}).update(**updates)
+
+
+def _grouped_totals(key):
+    return (
+        Mark.objects
+        .values(key)
+        .annotate(
+            mark_count=Count('id'),
+            marks_sum=Sum('marks_obtained'),
+            marks_sum_squares=Sum(F('marks_obtained') * F('marks_obtained')),
+            attendance_sum=Sum('attendance_percentage'),
+            failing_count=Count('id', filter=Q(marks_obtained__lt=PASS_MARK)),
+        )
+        .order_by(key)
+    )
+
+
+def rebuild_summaries(batch_size=1000):
+    """Recompute every summary row from the Mark table"""
+    with transaction.atomic():
+        StudentSummary.objects.all().delete()
+        SubjectSummary.objects.all().delete()
+        for model, key in ((StudentSummary, 'student_id'), (SubjectSummary, 'subject_id')):
+            rows = (model(**row) for row in _grouped_totals(key).iterator(chunk_size=batch_size))
+            _bulk_create(model, rows, batch_size)
+        bump_versions('mark')
+    return StudentSummary.objects.count(), SubjectSummary.objects.count()
+
+
+def _bulk_create(model, rows, batch_size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            model.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        model.objects.bulk_create(batch)
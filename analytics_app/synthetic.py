@@ -0,0 +1,126 @@
+"""Synthetic gradebook generation for add_dummy_data
+
+Nothing here touches Django, so worker processes can import it cheaply
+and every chunk is reproducible from (seed, chunk index) alone.
+"""
+import numpy as np
+
+
+SUBJECT_NAMES = [
+    'Wireless Technology',
+    'Network Protocols',
+    'Basic Circuits',
+    'Big Data Analytics',
+    'IoT Sensors',
+    'Data Structures',
+    'Operating Systems',
+    'Digital Signal Processing',
+    'Machine Learning',
+    'Database Systems',
+    'Engineering Mathematics',
+    'Control Systems',
+]
+
+DEPARTMENTS = [
+    ('Computer Science', 'CS'),
+    ('Electronics', 'EC'),
+    ('Mechanical', 'ME'),
+    ('Civil', 'CE'),
+    ('Electrical', 'EE'),
+    ('Information Technology', 'IT'),
+    ('Chemical', 'CH'),
+    ('Biotechnology', 'BT'),
+]
+
+FIRST_NAMES = [
+    'Aarav', 'Bhavna', 'Chirag', 'Diya', 'Eshaan', 'Fiona', 'Gagan', 'Hina', 'Ishaan', 'Jiya',
+    'Kabir', 'Lavanya', 'Mihir', 'Nisha', 'Om', 'Pooja', 'Rohan', 'Sanya', 'Tanvi', 'Uday',
+    'Varun', 'Zara', 'Aditi', 'Dev', 'Kiara', 'Neel', 'Riya', 'Arjun', 'Meera', 'Yash',
+]
+
+LAST_NAMES = [
+    'Kumar', 'Singh', 'Patel', 'Sharma', 'Desai', 'Gupta', 'Roy', 'Verma', 'Khan', 'Nair',
+    'Iyer', 'Reddy', 'Das', 'Mehta', 'Joshi', 'Bose', 'Menon', 'Rao', 'Kapoor', 'Chopra',
+]
+
+
+def subject_names(count):
+    names = SUBJECT_NAMES[:count]
+    names += [f'Subject {index}' for index in range(len(names) + 1, count + 1)]
+    return names
+
+
+def departments(count):
+    """(name, roll number prefix) for ``count`` departments"""
+    result = DEPARTMENTS[:count]
+    result += [(f'Department {index}', f'D{index}') for index in range(len(result) + 1, count + 1)]
+    return result
+
+
+def roll_number(prefix, sequence, width):
+    return f'{prefix}{sequence:0{width}d}'
+
+
+def generate_students(seed, chunk, first, count, department_list, width):
+    """(name, roll_no, department) for students ``first`` .. ``first + count - 1``
+
+    Students are dealt to departments round-robin by sequence number.
+    """
+    rng = np.random.default_rng([seed, 0, chunk])
+    first_names = rng.integers(0, len(FIRST_NAMES), count)
+    last_names = rng.integers(0, len(LAST_NAMES), count)
+    students = []
+    for offset in range(count):
+        sequence = first + offset
+        name, prefix = department_list[sequence % len(department_list)]
+        students.append((
+            f'{FIRST_NAMES[first_names[offset]]} {LAST_NAMES[last_names[offset]]}',
+            roll_number(prefix, sequence // len(department_list) + 1, width),
+            name,
+        ))
+    return students
+
+
+def generate_marks(task):
+    """Mark rows for one chunk of students
+
+    ``task`` is (seed, chunk, student_ids, department_indices, subject_ids,
+    history_days). A latent ability per student drives both attendance and
+    marks, each department and subject gets its own difficulty offset, and
+    marks go through a logistic curve so most land between 55 and 90 with a
+    thin failing tail. Each mark is assessed a uniform number of days ago,
+    below ``history_days``. Returns (student_id, subject_id, marks,
+    attendance, days_ago) tuples.
+    """
+    seed, chunk, student_ids, department_indices, subject_ids, history_days = task
+    student_ids = np.asarray(student_ids, dtype=np.int64)
+    department_indices = np.asarray(department_indices, dtype=np.int64)
+    subject_ids = np.asarray(subject_ids, dtype=np.int64)
+
+    # Offsets shared by every chunk come from the seed alone
+    shared = np.random.default_rng([seed, 1])
+    department_offset = shared.normal(0, 0.25, department_indices.max(initial=0) + 1)
+    subject_difficulty = shared.normal(0, 0.35, len(subject_ids))
+
+    rng = np.random.default_rng([seed, 2, chunk])
+    ability = rng.normal(0, 1, len(student_ids)) + department_offset[department_indices]
+    base_attendance = 82 + 9 * ability + rng.normal(0, 5, len(student_ids))
+
+    shape = (len(student_ids), len(subject_ids))
+    attendance = np.clip(base_attendance[:, None] + rng.normal(0, 4, shape), 20, 100)
+    latent = (
+        0.8 * ability[:, None]
+        + 0.03 * (attendance - 82)
+        - subject_difficulty[None, :]
+        + rng.normal(0, 0.45, shape)
+    )
+    marks = np.clip(np.rint(100 / (1 + np.exp(-(0.9 * latent + 1.1)))), 0, 100).astype(np.int64)
+    days_ago = rng.integers(0, history_days, shape)
+
+    return list(zip(
+        np.repeat(student_ids, len(subject_ids)).tolist(),
+        np.tile(subject_ids, len(student_ids)).tolist(),
+        marks.ravel().tolist(),
+        np.round(attendance, 2).ravel().tolist(),
+        days_ago.ravel().tolist(),
+    ))
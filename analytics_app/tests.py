@@ -1,3 +1,772 @@
-from django.test import TestCase
+import base64
+import datetime
+import io
+import os
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from accounts.models import Profile
+
+from . import jobs
+from .bulk import upsert_marks
+from .importer import ImportFormatError, import_gradebook
+from .listing import ListingError, decode_cursor, encode_cursor
+from .models import (
+    Job, Mark, MarkDelta, PerformanceRollup, StaleRanking, StaleRiskScore, Student, StudentRisk, StudentSuggestion, StudentSummary, Subject, SubjectSummary,
+)
+from . import rankings, risk
+from .rankings import refresh_stale
+from .report_cards import render_report_cards
+from .snapshot import apply_deltas, build_snapshot, compact_snapshot, marks_columns
+from .services import at_risk_students, top_students
+from .summaries import SUMMARY_FIELDS, rebuild_summaries
+from .trends import next_period_start, performance_trend, period_start
+
+
+class CursorTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.students = [
+            Student.objects.create(name=f'Student {i}', roll_no=f'R{i:03d}', department='CSE')
+            for i in range(5)
+        ]
+
+    def test_cursor_round_trip(self):
+        for last_id in (0, 1, 12345):
+            self.assertEqual(decode_cursor(encode_cursor(last_id)), last_id)
+
+    def test_tampered_cursor_is_rejected(self):
+        tampered = [
+            'not base64!',
+            base64.urlsafe_b64encode(b'pk:3').decode(),
+            base64.urlsafe_b64encode(b'id:three').decode(),
+            base64.urlsafe_b64encode(b'id:1:2').decode(),
+            base64.urlsafe_b64encode(b'\xff\xfe').decode(),
+        ]
+        for cursor in tampered:
+            with self.assertRaises(ListingError):
+                decode_cursor(cursor)
+
+    def test_pages_follow_the_cursor(self):
+        seen = []
+        params = {'limit': 2, 'fields': 'id'}
+        while True:
+            page = self.client.get('/analytics/api/students/', params).json()
+            seen += [row['id'] for row in page['results']]
+            if page['next_cursor'] is None:
+                break
+            params['cursor'] = page['next_cursor']
+        self.assertEqual(seen, [student.id for student in self.students])
+
+    def test_api_rejects_tampered_cursor(self):
+        response = self.client.get('/analytics/api/students/', {'cursor': 'garbage!'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'success': False, 'error': 'Invalid cursor'})
+
+    def test_search_narrows_the_page(self):
+        response = self.client.get('/analytics/api/students/', {'q': 'R003', 'fields': 'roll_no'})
+        self.assertEqual(response.json()['results'], [{'roll_no': 'R003'}])
+
+
+class SummaryMaintenanceTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = Student.objects.create(name='Asha', roll_no='S001', department='CSE')
+        cls.other = Student.objects.create(name='Ravi', roll_no='S002', department='CSE')
+        cls.maths = Subject.objects.create(subject_name='Maths')
+        cls.physics = Subject.objects.create(subject_name='Physics')
+
+    def totals(self, model, **key):
+        row = model.objects.filter(**key).values(*SUMMARY_FIELDS).first()
+        return row and {field: row[field] for field in SUMMARY_FIELDS}
+
+    def assert_matches_rebuild(self):
+        maintained = {
+            model: {row.pk: self.totals(model, pk=row.pk) for row in model.objects.all()}
+            for model in (StudentSummary, SubjectSummary)
+        }
+        rebuild_summaries()
+        for model, rows in maintained.items():
+            rebuilt = {row.pk: self.totals(model, pk=row.pk) for row in model.objects.all()}
+            # Maintained rows may linger with zero totals where a rebuild has none
+            rows = {pk: totals for pk, totals in rows.items() if totals['mark_count']}
+            self.assertEqual(rows, rebuilt)
+
+    def test_create(self):
+        Mark.objects.create(student=self.student, subject=self.maths, marks_obtained=30, attendance_percentage=80)
+        Mark.objects.create(student=self.student, subject=self.physics, marks_obtained=90, attendance_percentage=60)
+        self.assertEqual(self.totals(StudentSummary, student=self.student), {
+            'mark_count': 2, 'marks_sum': 120, 'marks_sum_squares': 30 * 30 + 90 * 90,
+            'attendance_sum': 140, 'failing_count': 1,
+        })
+        self.assert_matches_rebuild()
+
+    def test_update(self):
+        mark = Mark.objects.create(student=self.student, subject=self.maths, marks_obtained=30, attendance_percentage=80)
+        mark.marks_obtained = 70
+        mark.save()
+        self.assertEqual(self.totals(SubjectSummary, subject=self.maths)['marks_sum'], 70)
+        self.assertEqual(self.totals(SubjectSummary, subject=self.maths)['failing_count'], 0)
+        self.assert_matches_rebuild()
+
+    def test_delete(self):
+        mark = Mark.objects.create(student=self.student, subject=self.maths, marks_obtained=30, attendance_percentage=80)
+        Mark.objects.create(student=self.other, subject=self.maths, marks_obtained=50, attendance_percentage=90)
+        mark.delete()
+        self.assertEqual(self.totals(StudentSummary, student=self.student)['mark_count'], 0)
+        self.assertEqual(self.totals(SubjectSummary, subject=self.maths)['marks_sum'], 50)
+        self.assert_matches_rebuild()
+
+    def test_subject_move(self):
+        mark = Mark.objects.create(student=self.student, subject=self.maths, marks_obtained=30, attendance_percentage=80)
+        mark.subject = self.physics
+        mark.save()
+        self.assertEqual(self.totals(SubjectSummary, subject=self.maths)['mark_count'], 0)
+        self.assertEqual(self.totals(SubjectSummary, subject=self.physics)['marks_sum'], 30)
+        self.assertEqual(self.totals(StudentSummary, student=self.student)['mark_count'], 1)
+        self.assert_matches_rebuild()
+
+    def test_subject_move_with_same_values_moves_changed_at(self):
+        mark = Mark.objects.create(student=self.student, subject=self.maths, marks_obtained=30, attendance_percentage=80)
+        before = StudentSummary.objects.get(student=self.student).changed_at
+        mark.subject = self.physics
+        mark.save()
+        self.assertGreater(StudentSummary.objects.get(student=self.student).changed_at, before)
+
+    def test_student_move(self):
+        mark = Mark.objects.create(student=self.student, subject=self.maths, marks_obtained=30, attendance_percentage=80)
+        mark = Mark.objects.get(pk=mark.pk)
+        mark.student = self.other
+        mark.save()
+        self.assertEqual(self.totals(StudentSummary, student=self.student)['mark_count'], 0)
+        self.assertEqual(self.totals(StudentSummary, student=self.other)['marks_sum'], 30)
+        self.assert_matches_rebuild()
+
+
+class ImportGradebookTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.asha = Student.objects.create(name='Asha', roll_no='S001', department='CSE')
+        cls.ravi = Student.objects.create(name='Ravi', roll_no='S002', department='CSE')
+        # Roll numbers are not unique; neither student may receive S003's marks
+        Student.objects.create(name='Meera', roll_no='S003', department='CSE')
+        Student.objects.create(name='Meera K', roll_no='S003', department='ECE')
+        cls.maths = Subject.objects.create(subject_name='Maths')
+        Subject.objects.create(subject_name='Physics')
+        Subject.objects.create(subject_name='Physics')
+
+    def run_import(self, text, batch_size=1000):
+        lines = ['roll_no,subject_name,marks_obtained,attendance_percentage', *text]
+        return import_gradebook(io.BytesIO('\n'.join(lines).encode()), 'marks.csv', batch_size=batch_size)
+
+    def test_bad_rows_are_reported_by_line(self):
+        report = self.run_import([
+            'S001,Maths,72,90',
+            'S009,Maths,50,90',
+            'S002,Chemistry,50,90',
+            'S002,Maths,abc,90',
+            'S002,Maths,101,90',
+            'S002,Maths,50.5,90',
+            'S002,Maths,50,120',
+        ])
+        self.assertEqual(report['errors'], [
+            {'line': 3, 'error': 'Unknown roll number'},
+            {'line': 4, 'error': 'Unknown subject'},
+            {'line': 5, 'error': 'Marks must be a number'},
+            {'line': 6, 'error': 'Marks must be between 0 and 100'},
+            {'line': 7, 'error': 'Marks must be a whole number'},
+            {'line': 8, 'error': 'Attendance must be between 0 and 100'},
+        ])
+        self.assertEqual((report['total_rows'], report['created'], report['error_count']), (7, 1, 6))
+        self.assertEqual(list(Mark.objects.values_list('student_id', 'marks_obtained')), [(self.asha.id, 72)])
+
+    def test_duplicated_keys_are_rejected(self):
+        report = self.run_import(['S003,Maths,60,90', 'S001,Physics,60,90'])
+        self.assertEqual(report['errors'], [
+            {'line': 2, 'error': 'Roll number belongs to more than one student'},
+            {'line': 3, 'error': 'Subject name belongs to more than one subject'},
+        ])
+        self.assertFalse(Mark.objects.exists())
+
+    def test_lines_stay_numbered_across_chunks(self):
+        report = self.run_import([
+            'S001,Maths,60,90',
+            'S002,Maths,x,90',
+            'S009,Maths,60,90',
+            'S002,Maths,70,95',
+            'S001,Maths,65,80',
+        ], batch_size=2)
+        self.assertEqual([error['line'] for error in report['errors']], [3, 4])
+        self.assertEqual((report['created'], report['updated']), (2, 1))
+        self.assertEqual(
+            dict(Mark.objects.values_list('student_id', 'marks_obtained')), {self.asha.id: 65, self.ravi.id: 70},
+        )
+
+    def test_unreadable_files_are_format_errors(self):
+        with self.assertRaises(ImportFormatError):
+            import_gradebook(io.BytesIO(b''), 'marks.csv')
+        with self.assertRaises(ImportFormatError):
+            import_gradebook(io.BytesIO(b'roll_no,subject_name\n"S001,Maths'), 'marks.csv')
+        with self.assertRaises(ImportFormatError):
+            import_gradebook(io.BytesIO(b'not a workbook'), 'marks.xlsx')
+
+    def test_command_reports_unreadable_files(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'marks.csv')
+            open(path, 'wb').close()
+            with self.assertRaisesMessage(CommandError, 'Could not read the CSV file'):
+                call_command('import_marks', path)
+
+
+class UpsertMarksTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = Student.objects.create(name='Asha', roll_no='S001', department='CSE')
+        cls.maths = Subject.objects.create(subject_name='Maths')
+        cls.physics = Subject.objects.create(subject_name='Physics')
+
+    def stored(self):
+        return set(Mark.objects.values_list('student_id', 'subject_id', 'marks_obtained', 'attendance_percentage'))
+
+    def test_existing_pair_is_updated(self):
+        Mark.objects.create(student=self.student, subject=self.maths, marks_obtained=30, attendance_percentage=80)
+        created, updated = upsert_marks([
+            (self.student.id, self.maths.id, 75, 95),
+            (self.student.id, self.physics.id, 60, 70),
+        ])
+        self.assertEqual((created, updated), (1, 1))
+        self.assertEqual(self.stored(), {
+            (self.student.id, self.maths.id, 75, 95.0),
+            (self.student.id, self.physics.id, 60, 70.0),
+        })
+        self.assertEqual(StudentSummary.objects.get(student=self.student).marks_sum, 135)
+
+    def test_later_row_for_a_pair_wins(self):
+        created, updated = upsert_marks([
+            (self.student.id, self.maths.id, 10, 50),
+            (self.student.id, self.maths.id, 90, 100),
+        ])
+        self.assertEqual((created, updated), (1, 0))
+        self.assertEqual(self.stored(), {(self.student.id, self.maths.id, 90, 100.0)})
+        self.assertEqual(StudentSummary.objects.get(student=self.student).mark_count, 1)
+
+    def test_batch_endpoint_reports_bad_items_and_saves_nothing(self):
+        response = self.client.post('/analytics/api/marks/batch/', {'marks': [
+            {'student_id': self.student.id, 'subject_id': self.maths.id,
+             'marks_obtained': 50, 'attendance_percentage': 90},
+            {'student_id': self.student.id, 'subject_id': 999,
+             'marks_obtained': 50, 'attendance_percentage': 90},
+        ]}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['errors'], [{'index': 1, 'error': 'Subject 999 not found'}])
+        self.assertFalse(Mark.objects.exists())
+
+
+class SuggestionAccessTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('asha', password='pw')
+        cls.stranger = User.objects.create_user('ravi', password='pw')
+        cls.teacher = User.objects.create_user('meera', password='pw')
+        Profile.objects.create(user=cls.teacher, gender='Female', role='Teacher')
+        cls.student = Student.objects.create(name='Asha', roll_no='S001', department='CSE', user=cls.owner)
+        StudentSuggestion.objects.create(
+            student=cls.student, kind='praise', message='Keep it up', generated_at=timezone.now(),
+        )
+        cls.url = f'/analytics/suggestions/{cls.student.id}/'
+
+    def visible(self, user=None):
+        if user is not None:
+            self.client.force_login(user)
+        return [s.message for s in self.client.get(self.url).context['suggestions']]
+
+    def test_anonymous_sees_nothing(self):
+        self.assertEqual(self.visible(), [])
+
+    def test_other_student_sees_nothing(self):
+        self.assertEqual(self.visible(self.stranger), [])
+
+    def test_owner_and_teacher_see_suggestions(self):
+        self.assertEqual(self.visible(self.owner), ['Keep it up'])
+        self.assertEqual(self.visible(self.teacher), ['Keep it up'])
+
+
+class StudentAccountLinkTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.account = User.objects.create_user('asha')
+        cls.teacher = User.objects.create_user('meera')
+        Profile.objects.create(user=cls.teacher, gender='Female', role='Teacher')
+        cls.student = Student.objects.create(name='Asha', roll_no='S001', department='CSE')
+
+    def update(self, data):
+        return self.client.post(
+            f'/analytics/api/students/{self.student.id}/update/', data, content_type='application/json',
+        )
+
+    def test_teacher_links_and_unlinks_account(self):
+        self.client.force_login(self.teacher)
+        response = self.update({'user_id': self.account.id})
+        self.assertEqual(response.json()['student']['user_id'], self.account.id)
+        self.assertEqual(Student.objects.get(user=self.account), self.student)
+        self.update({'user_id': None})
+        self.assertFalse(Student.objects.filter(user=self.account).exists())
+
+    def test_only_teachers_link_accounts(self):
+        self.client.force_login(self.account)
+        self.assertEqual(self.update({'user_id': self.account.id}).status_code, 403)
+        self.assertEqual(self.update({'name': 'Asha R'}).status_code, 200)
+
+    def test_account_links_to_one_student(self):
+        Student.objects.create(name='Ravi', roll_no='S002', department='CSE', user=self.account)
+        self.client.force_login(self.teacher)
+        response = self.update({'user_id': self.account.id})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['error'], f'User {self.account.id} is already linked to another student')
+
+
+class DashboardListsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        maths = Subject.objects.create(subject_name='Maths')
+        for index, marks in enumerate((90, 70, 90, 20)):
+            student = Student.objects.create(name=f'Student {index}', roll_no=f'S{index}', department='CSE')
+            Mark.objects.create(student=student, subject=maths, marks_obtained=marks, attendance_percentage=50)
+
+    def test_top_students_before_the_leaderboard_is_refreshed(self):
+        top = [(student['name'], student['rank']) for student in top_students(3)]
+        self.assertEqual(top, [('Student 2', 1), ('Student 0', 1), ('Student 1', 3)])
+        refresh_stale()
+        self.assertEqual([student['rank'] for student in top_students(3)], [1, 1, 3])
+
+    def test_stale_at_risk_students_queue_one_rescore(self):
+        self.assertEqual(at_risk_students(1), ([], True))
+        at_risk_students(1)
+        # Reads never rescore themselves, and queue one job between them
+        self.assertFalse(StudentRisk.objects.exists())
+        job = Job.objects.get()
+        self.assertEqual((job.kind, job.status), ('score_risk', Job.QUEUED))
+        Job.objects.filter(pk=job.pk).update(run_after=timezone.now())
+        self.assertTrue(jobs.run_job(jobs.claim_job('test')))
+        students, stale = at_risk_students(1)
+        self.assertEqual(([student['name'] for student in students], stale), (['Student 3'], False))
+        self.assertEqual(Job.objects.count(), 1)
+
+
+class AtRiskEndpointTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        maths = Subject.objects.create(subject_name='Maths')
+        for name, marks in (('Asha', 80), ('Ravi', 65)):
+            student = Student.objects.create(name=name, roll_no=name, department='CSE')
+            Mark.objects.create(student=student, subject=maths, marks_obtained=marks, attendance_percentage=90)
+        risk.rescore_all()
+
+    def setUp(self):
+        cache.clear()
+
+    def at_risk(self):
+        payload = self.client.get('/analytics/api/at-risk/').json()
+        return {student['name']: student['score'] for student in payload['students']}, payload['stale']
+
+    def test_mark_write_between_reads_is_not_hidden_by_the_cache(self):
+        scores, stale = self.at_risk()
+        self.assertFalse(stale)
+        mark = Mark.objects.get(student__name='Ravi')
+        mark.marks_obtained = 20
+        mark.save()
+
+        # Stored scores are served as they are, flagged, until the queued rescore runs
+        self.assertEqual(self.at_risk(), (scores, True))
+        Job.objects.update(run_after=timezone.now())
+        self.assertTrue(jobs.run_job(jobs.claim_job('test')))
+        rescored, stale = self.at_risk()
+        self.assertFalse(stale)
+        self.assertGreater(rescored['Ravi'], scores['Ravi'])
+
+
+class MarkRangeTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = Student.objects.create(name='Asha', roll_no='S001', department='CSE')
+        cls.maths = Subject.objects.create(subject_name='Maths')
+
+    def post(self, url, data):
+        return self.client.post(url, data, content_type='application/json')
+
+    def test_create_reports_range_errors(self):
+        response = self.post('/analytics/api/marks/create/', {
+            'student_id': self.student.id, 'subject_id': self.maths.id,
+            'marks_obtained': 120, 'attendance_percentage': 90,
+        })
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['error'], 'Marks must be a whole number between 0 and 100')
+
+    def test_create_still_reports_duplicates(self):
+        data = {'student_id': self.student.id, 'subject_id': self.maths.id,
+                'marks_obtained': 50, 'attendance_percentage': 90}
+        self.assertEqual(self.post('/analytics/api/marks/create/', data).status_code, 200)
+        response = self.post('/analytics/api/marks/create/', data)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('already exists', response.json()['error'])
+
+    def test_update_reports_range_errors(self):
+        mark = Mark.objects.create(student=self.student, subject=self.maths, marks_obtained=50, attendance_percentage=90)
+        response = self.post(f'/analytics/api/marks/{mark.id}/update/', {'attendance_percentage': 101})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['error'], 'Attendance must be between 0 and 100')
+        mark.refresh_from_db()
+        self.assertEqual(mark.attendance_percentage, 90)
+
+
+class PerformanceTrendTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.maths = Subject.objects.create(subject_name='Maths')
+        today = timezone.localdate()
+        # One mark in this week and in each of the five closed weeks before it
+        for weeks in range(6):
+            student = Student.objects.create(name=f'Student {weeks}', roll_no=f'S{weeks:03}', department='CSE')
+            Mark.objects.create(
+                student=student, subject=cls.maths, marks_obtained=50 + weeks, attendance_percentage=90,
+                assessed_on=today - datetime.timedelta(weeks=weeks),
+            )
+
+    def setUp(self):
+        # Versions restart with every test, so cached answers of another test could match
+        cache.clear()
+
+    def dashboard_weeks(self):
+        performance = self.client.get('/analytics/api/dashboard/', {'sections': 'performance'}).json()['performance']
+        return performance['data'][-6:], performance['counts'][-6:]
+
+    def test_dashboard_shows_closed_weeks(self):
+        self.assertEqual(self.dashboard_weeks(), ([55, 54, 53, 52, 51, 50], [1] * 6))
+
+    def test_dashboard_after_another_endpoint_rolled_up(self):
+        self.client.get('/analytics/api/performance-data/')
+        self.assertEqual(self.dashboard_weeks(), ([55, 54, 53, 52, 51, 50], [1] * 6))
+
+    def test_period_start(self):
+        wednesday = datetime.date(2024, 5, 15)
+        self.assertEqual(period_start('week', wednesday), datetime.date(2024, 5, 13))
+        self.assertEqual(period_start('week', datetime.date(2024, 5, 13)), datetime.date(2024, 5, 13))
+        self.assertEqual(period_start('month', wednesday), datetime.date(2024, 5, 1))
+        self.assertEqual(period_start('term', wednesday), datetime.date(2024, 4, 1))
+        self.assertEqual(period_start('term', datetime.date(2024, 12, 31)), datetime.date(2024, 10, 1))
+        self.assertEqual(next_period_start('month', datetime.date(2024, 12, 1)), datetime.date(2025, 1, 1))
+        self.assertEqual(next_period_start('term', datetime.date(2024, 10, 1)), datetime.date(2025, 1, 1))
+
+    def averages(self, **filters):
+        return [row['average'] for row in performance_trend('week', 6, **filters)]
+
+    def test_stored_rollups_are_merged_with_the_open_week(self):
+        self.assertEqual(self.averages(), [55, 54, 53, 52, 51, 50])
+        closed_week = period_start('week', timezone.localdate() - datetime.timedelta(weeks=2))
+        # Closed weeks are read back from their rollups from now on...
+        PerformanceRollup.objects.filter(
+            period='week', period_start=closed_week, subject=None, department='',
+        ).update(marks_sum=80)
+        # ...while the open week is aggregated from the marks every time
+        student = Student.objects.create(name='Late', roll_no='S100', department='ECE')
+        Mark.objects.create(student=student, subject=self.maths, marks_obtained=70, attendance_percentage=90)
+        self.assertEqual(self.averages(), [55, 54, 53, 80, 51, 60])
+        self.assertEqual(self.averages(department='ECE'), [None] * 5 + [70])
+        # Filtered trends add up the per-group rows, which were left alone
+        self.assertEqual(self.averages(subject_id=self.maths.id, department='CSE'), [55, 54, 53, 52, 51, 50])
+
+    def test_back_dated_edit_drops_the_weeks_it_touches(self):
+        self.assertEqual(self.averages(), [55, 54, 53, 52, 51, 50])
+        today = timezone.localdate()
+        mark = Mark.objects.get(marks_obtained=53)
+        mark.marks_obtained = 90
+        mark.assessed_on = today - datetime.timedelta(weeks=4)
+        mark.save()
+        stored = set(
+            PerformanceRollup.objects.filter(period='week', subject=None).values_list('period_start', flat=True)
+        )
+        left, joined = (period_start('week', today - datetime.timedelta(weeks=weeks)) for weeks in (3, 4))
+        self.assertNotIn(left, stored)
+        self.assertNotIn(joined, stored)
+        self.assertIn(period_start('week', today - datetime.timedelta(weeks=1)), stored)
+        self.assertEqual(self.averages(), [55, 72, None, 52, 51, 50])
+
+
+class SnapshotTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.maths = Subject.objects.create(subject_name='Maths')
+        cls.asha = Student.objects.create(name='Asha', roll_no='S001', department='CSE')
+        cls.ravi = Student.objects.create(name='Ravi', roll_no='S002', department='ECE')
+        cls.mark = Mark.objects.create(student=cls.asha, subject=cls.maths, marks_obtained=70, attendance_percentage=90)
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        snapshot_settings = override_settings(ANALYTICS_SNAPSHOT_DIR=directory.name)
+        snapshot_settings.enable()
+        self.addCleanup(snapshot_settings.disable)
+
+    def rows(self):
+        columns, departments = marks_columns()
+        return sorted(
+            (int(mark_id), departments[code], int(marks))
+            for mark_id, code, marks in zip(columns['mark_id'], columns['department'], columns['marks'])
+        )
+
+    def test_writes_are_overlaid_until_compaction(self):
+        build_snapshot()
+        self.assertEqual(self.rows(), [(self.mark.id, 'CSE', 70)])
+
+        self.mark.marks_obtained = 75
+        self.mark.save()
+        added = Mark.objects.create(student=self.ravi, subject=self.maths, marks_obtained=40, attendance_percentage=80)
+        self.ravi.department = 'EEE'
+        self.ravi.save()
+        expected = [(self.mark.id, 'CSE', 75), (added.id, 'EEE', 40)]
+        self.assertEqual(self.rows(), expected)
+
+        compact_snapshot()
+        self.assertFalse(MarkDelta.objects.exists())
+        self.assertEqual(self.rows(), expected)
+
+        added.delete()
+        self.assertEqual(self.rows(), [(self.mark.id, 'CSE', 75)])
+        build_snapshot()
+        self.assertFalse(MarkDelta.objects.exists())
+        self.assertEqual(self.rows(), [(self.mark.id, 'CSE', 75)])
+
+    def test_compaction_keeps_deltas_that_commit_late(self):
+        build_snapshot()
+        self.mark.marks_obtained = 75
+        self.mark.save()
+        Mark.objects.create(student=self.ravi, subject=self.maths, marks_obtained=40, attendance_percentage=80)
+        # The first write's log row commits only while compaction runs, after the newer one was read
+        late = MarkDelta.objects.order_by('id').first()
+        late_id = late.id
+        late.delete()
+
+        def apply_and_commit_late(*args):
+            MarkDelta.objects.create(
+                id=late_id, mark_id=late.mark_id, student_id=late.student_id, subject_id=late.subject_id,
+                marks_obtained=late.marks_obtained, attendance_percentage=late.attendance_percentage,
+            )
+            return apply_deltas(*args)
+
+        with mock.patch('analytics_app.snapshot.apply_deltas', apply_and_commit_late):
+            compact_snapshot()
+        self.assertEqual(list(MarkDelta.objects.values_list('id', flat=True)), [late_id])
+        self.assertIn((self.mark.id, 'CSE', 75), self.rows())
+
+
+class ChangeLogTests(TestCase):
+    """Jobs that consume a change log delete the rows they read, never a range of ids"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.maths = Subject.objects.create(subject_name='Maths')
+        for index, department in enumerate(['CSE', 'ECE']):
+            student = Student.objects.create(name=f'Student {index}', roll_no=f'S{index}', department=department)
+            Mark.objects.create(student=student, subject=cls.maths, marks_obtained=60, attendance_percentage=90)
+
+    def commit_late(self, model, module, name):
+        """Delete the oldest log row and insert it again, same id, while ``module.name`` runs"""
+        late = model.objects.order_by('id').first()
+        fields = {field.attname: getattr(late, field.attname) for field in model._meta.concrete_fields}
+        late.delete()
+        original = getattr(module, name)
+
+        def run_and_commit_late(*args, **kwargs):
+            if not model.objects.filter(id=fields['id']).exists():
+                model.objects.create(**fields)
+            return original(*args, **kwargs)
+        return fields['id'], mock.patch.object(module, name, run_and_commit_late)
+
+    def test_rescore_keeps_rows_that_commit_late(self):
+        late_id, patch = self.commit_late(StaleRiskScore, risk, 'score_marks')
+        with patch:
+            self.assertEqual(risk.rescore_stale(), 1)
+        self.assertEqual(list(StaleRiskScore.objects.values_list('id', flat=True)), [late_id])
+        self.assertEqual(risk.rescore_stale(), 1)
+        self.assertFalse(StaleRiskScore.objects.exists())
+
+    def test_rerank_keeps_rows_that_commit_late(self):
+        late_id, patch = self.commit_late(StaleRanking, rankings, '_store')
+        with patch:
+            refresh_stale()
+        self.assertEqual(list(StaleRanking.objects.values_list('id', flat=True)), [late_id])
+        refresh_stale()
+        self.assertFalse(StaleRanking.objects.exists())
+
+
+def _fail(progress):
+    raise RuntimeError('boom')
+
+
+class JobTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch.dict(jobs.TASKS, {'echo': lambda progress, value=None: {'value': value}, 'fail': _fail})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_claim_takes_the_oldest_due_job_once(self):
+        first = jobs.enqueue('echo', {'value': 1})
+        jobs.enqueue('echo', {'value': 2}, delay=60)
+        claimed = jobs.claim_job('worker-a')
+        self.assertEqual((claimed.pk, claimed.status, claimed.attempts), (first.pk, Job.RUNNING, 1))
+        # The other job is not due yet, and a running job cannot be claimed again
+        self.assertIsNone(jobs.claim_job('worker-b'))
+
+    def test_success_records_the_result(self):
+        job = jobs.enqueue('echo', {'value': 7})
+        self.assertTrue(jobs.run_job(jobs.claim_job('worker')))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.result, job.progress), (Job.SUCCEEDED, {'value': 7}, 100))
+
+    def test_failure_is_retried_then_fails(self):
+        job = jobs.enqueue('fail', max_attempts=2)
+        self.assertFalse(jobs.run_job(jobs.claim_job('worker')))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.QUEUED, 1))
+        self.assertGreater(job.run_after, timezone.now())
+
+        Job.objects.filter(pk=job.pk).update(run_after=timezone.now())
+        self.assertFalse(jobs.run_job(jobs.claim_job('worker')))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+        self.assertIn('RuntimeError: boom', job.error)
+
+    def test_stale_running_jobs_are_requeued_or_failed(self):
+        retried = jobs.enqueue('echo', max_attempts=2)
+        exhausted = jobs.enqueue('echo', max_attempts=1)
+        jobs.claim_job('worker')
+        jobs.claim_job('worker')
+        self.assertEqual(jobs.requeue_stale(stale_after=60), 0)
+        Job.objects.update(heartbeat_at=timezone.now() - datetime.timedelta(minutes=5))
+        self.assertEqual(jobs.requeue_stale(stale_after=60), 2)
+        self.assertEqual(Job.objects.get(pk=retried.pk).status, Job.QUEUED)
+        self.assertEqual(Job.objects.get(pk=exhausted.pk).status, Job.FAILED)
+
+    def test_unknown_kinds_and_payloads_are_rejected(self):
+        with self.assertRaises(ValueError):
+            jobs.enqueue('missing')
+        with self.assertRaises(ValueError):
+            jobs.enqueue('echo', {'unexpected': 1})
+
+
+class JobAccessTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('admin', is_staff=True)
+        cls.owner = User.objects.create_user('asha')
+        cls.stranger = User.objects.create_user('ravi')
+        cls.job = Job.objects.create(kind='score_risk', payload={}, created_by=cls.owner)
+
+    def test_only_staff_queue_jobs(self):
+        self.client.force_login(self.owner)
+        response = self.client.post('/analytics/api/jobs/', {'kind': 'score_risk'}, content_type='application/json')
+        self.assertEqual(response.status_code, 403)
+        self.client.force_login(self.staff)
+        response = self.client.post('/analytics/api/jobs/', {'kind': 'score_risk'}, content_type='application/json')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response['Location'], f'/analytics/api/jobs/{response.json()["job"]["id"]}/')
+
+    def test_job_status_is_for_staff_or_its_creator(self):
+        url = f'/analytics/api/jobs/{self.job.pk}/'
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.client.force_login(self.stranger)
+        self.assertEqual(self.client.get(url).status_code, 403)
+        for user in (self.owner, self.staff):
+            self.client.force_login(user)
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+
+@override_settings(ANALYTICS_REPORT_CARD_DIR=None)
+class ReportCardAccessTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('asha')
+        cls.stranger = User.objects.create_user('ravi')
+        cls.teacher = User.objects.create_user('meera')
+        Profile.objects.create(user=cls.teacher, gender='Female', role='Teacher')
+        cls.student = Student.objects.create(name='Asha', roll_no='S001', department='CSE', user=cls.owner)
+        subject = Subject.objects.create(subject_name='Maths')
+        Mark.objects.create(student=cls.student, subject=subject, marks_obtained=72, attendance_percentage=90)
+        cls.url = f'/analytics/report-cards/{cls.student.id}/'
+
+    def test_one_card_is_for_teachers_or_its_student(self):
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        self.client.force_login(self.stranger)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        for user in (self.owner, self.teacher):
+            self.client.force_login(user)
+            response = self.client.get(self.url)
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.content.startswith(b'%PDF'))
+
+    def test_zip_is_for_teachers(self):
+        self.assertEqual(self.client.get('/analytics/report-cards/').status_code, 403)
+        self.client.force_login(self.owner)
+        self.assertEqual(self.client.get('/analytics/report-cards/').status_code, 403)
+        self.client.force_login(self.teacher)
+        response = self.client.get('/analytics/report-cards/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'PK'))
+
+    def test_background_download_queues_a_job(self):
+        self.client.force_login(self.teacher)
+        response = self.client.get('/analytics/report-cards/', {'department': 'CSE', 'background': '1'})
+        self.assertEqual(response.status_code, 202)
+        job = Job.objects.get(pk=response.json()['job']['id'])
+        self.assertEqual((job.kind, job.payload), ('generate_report_cards', {'department': 'CSE'}))
+        self.assertTrue(jobs.run_job(jobs.claim_job('test')))
+        job.refresh_from_db()
+        self.assertEqual(job.result, {'cards': 1})
+
+
+class ReportCardStoreTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = Student.objects.create(name='Asha', roll_no='S001', department='CSE')
+        cls.subject = Subject.objects.create(subject_name='Maths')
+        Mark.objects.create(student=cls.student, subject=cls.subject, marks_obtained=72, attendance_percentage=90)
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        store_settings = override_settings(ANALYTICS_REPORT_CARD_DIR=self.directory)
+        store_settings.enable()
+        self.addCleanup(store_settings.disable)
+
+    def stored_files(self):
+        return [os.path.join(root, name) for root, _, names in os.walk(self.directory) for name in names]
+
+    def test_stored_card_is_reused(self):
+        students = Student.objects.filter(pk=self.student.pk)
+        render_report_cards(students, workers=1)
+        with mock.patch('analytics_app.report_cards.render_report_card') as render:
+            render_report_cards(students, workers=1)
+        render.assert_not_called()
+
+    def test_new_card_replaces_the_old_file(self):
+        students = Student.objects.filter(pk=self.student.pk)
+        render_report_cards(students, workers=1)
+        [path] = self.stored_files()
+        with open(path, 'rb') as file:
+            old = file.read()
+        Mark.objects.filter(student=self.student).update(marks_obtained=40)
+        with mock.patch('analytics_app.report_cards.render_report_card', return_value=b'%PDF new') as render:
+            render_report_cards(students, workers=1)
+        render.assert_called_once()
+        self.assertEqual(self.stored_files(), [path])
+        with open(path, 'rb') as file:
+            new = file.read()
+        self.assertNotEqual(new, old)
+        self.assertTrue(new.endswith(b'\n%PDF new'))
@@ -0,0 +1,243 @@
+import datetime
+
+from django.db import IntegrityError, transaction
+from django.db.models import CharField, Count, DateField, F, IntegerField, Q, Sum, Value
+from django.db.models.functions import TruncMonth, TruncQuarter, TruncWeek
+from django.utils import timezone
+
+from .models import Mark, PerformanceRollup
+
+
+# Trend period -> SQL truncation of the assessment date; a term is a calendar quarter
+PERIODS = {'week': TruncWeek, 'month': TruncMonth, 'term': TruncQuarter}
+DEFAULT_PERIODS = 12
+MAX_PERIODS = 520
+# Both halves of the trend query select these annotations, in this order
+TREND_COLUMNS = (
+    'start', 'group_subject', 'group_department', 'total_count', 'total_marks', 'total_attendance',
+)
+
+
+def period_start(period, day):
+    """First day of the ``period`` that contains ``day``"""
+    if period == 'week':
+        return day - datetime.timedelta(days=day.weekday())
+    if period == 'month':
+        return day.replace(day=1)
+    return day.replace(month=(day.month - 1) // 3 * 3 + 1, day=1)
+
+
+def next_period_start(period, start):
+    if period == 'week':
+        return start + datetime.timedelta(days=7)
+    month = start.month - 1 + (1 if period == 'month' else 3)
+    return start.replace(year=start.year + month // 12, month=month % 12 + 1)
+
+
+def period_label(period, start):
+    if period == 'week':
+        return start.isoformat()
+    if period == 'month':
+        return start.strftime('%b %Y')
+    return f'Q{(start.month - 1) // 3 + 1} {start.year}'
+
+
+def performance_trend(period='week', count=DEFAULT_PERIODS, subject_id=None, department=None):
+    """Mark count, average marks and attendance of the last ``count`` periods, oldest first
+
+    Closed periods are read from PerformanceRollup and only the open
+    period is aggregated from marks, both in one query, so the cost does
+    not grow with history. Closed periods that are not stored yet (a new
+    week, or one whose marks were edited) are rolled up here first;
+    roll_up_trends jobs can do that ahead of requests.
+    """
+    starts = _period_starts(period, count)
+    rows = _stored_and_open(period, starts, subject_id, department)
+    open_row = next(row for row in rows if row[0] == starts[-1] and row[1] is None)
+    groups = [row for row in rows if row is not open_row]
+
+    rolled_up = {group[0] for group in groups if group[1] is None}
+    missing = [start for start in starts[:-1] if start not in rolled_up]
+    if missing:
+        groups += roll_up(period, missing)
+
+    totals = _closed_totals(groups, subject_id, department)
+    totals[starts[-1]] = (open_row[3], open_row[4] or 0, open_row[5] or 0)
+
+    trend = []
+    for start in starts:
+        mark_count, marks_sum, attendance_sum = totals.get(start, (0, 0, 0))
+        trend.append({
+            'start': start,
+            'mark_count': mark_count,
+            'average': round(marks_sum / mark_count, 2) if mark_count else None,
+            'attendance': round(attendance_sum / mark_count, 2) if mark_count else None,
+        })
+    return trend
+
+
+def _period_starts(period, count):
+    """First days of the last ``count`` periods, oldest first; the last one is open"""
+    starts = [period_start(period, timezone.localdate())]
+    while len(starts) < count:
+        starts.append(period_start(period, starts[-1] - datetime.timedelta(days=1)))
+    starts.reverse()
+    return starts
+
+
+def _stored_and_open(period, starts, subject_id, department):
+    """Stored rollup rows of the closed ``starts`` and one total row of the open period
+
+    Rows are (period_start, subject_id, department, mark_count, marks_sum,
+    attendance_sum); the open period's row has no subject.
+    """
+    marks = Mark.objects.filter(assessed_on__gte=starts[-1], assessed_on__lt=next_period_start(period, starts[-1]))
+    if subject_id is not None:
+        marks = marks.filter(subject_id=subject_id)
+    if department is not None:
+        marks = marks.filter(student__department=department)
+    # Constant columns are not grouped on, so this aggregates to one row
+    open_totals = (
+        marks
+        .annotate(
+            start=Value(starts[-1], DateField()),
+            group_subject=Value(None, IntegerField()),
+            group_department=Value('', CharField()),
+        )
+        .values('start', 'group_subject', 'group_department')
+        .annotate(
+            total_count=Count('id'),
+            total_marks=Sum('marks_obtained'),
+            total_attendance=Sum('attendance_percentage'),
+        )
+        .values_list(*TREND_COLUMNS)
+    )
+    if len(starts) == 1:
+        return list(open_totals)
+
+    filtered = subject_id is not None or department is not None
+    wanted = Q(subject__isnull=True, department='')
+    if filtered:
+        group = Q(subject__isnull=False)
+        if subject_id is not None:
+            group &= Q(subject_id=subject_id)
+        if department is not None:
+            group &= Q(department=department)
+        wanted |= group
+    stored = (
+        PerformanceRollup.objects
+        .filter(wanted, period=period, period_start__gte=starts[0], period_start__lte=starts[-2])
+        .annotate(
+            start=F('period_start'), group_subject=F('subject_id'), group_department=F('department'),
+            total_count=F('mark_count'), total_marks=F('marks_sum'), total_attendance=F('attendance_sum'),
+        )
+        .values_list(*TREND_COLUMNS)
+    )
+    return list(stored.union(open_totals, all=True))
+
+
+def _closed_totals(groups, subject_id, department):
+    filtered = subject_id is not None or department is not None
+    totals = {}
+    for start, group_subject, group_department, mark_count, marks_sum, attendance_sum in groups:
+        if filtered:
+            if group_subject is None:
+                continue
+            if subject_id is not None and group_subject != subject_id:
+                continue
+            if department is not None and group_department != department:
+                continue
+        elif group_subject is not None:
+            continue
+        previous = totals.get(start, (0, 0, 0))
+        totals[start] = (previous[0] + mark_count, previous[1] + marks_sum, previous[2] + attendance_sum)
+    return totals
+
+
+def roll_up(period, starts):
+    """Aggregate and store the closed periods beginning at ``starts``
+
+    Returns (period_start, subject_id, department, mark_count, marks_sum,
+    attendance_sum) for every stored row, including one total row per
+    period with no subject and no department.
+    """
+    wanted = set(starts)
+    marks = (
+        Mark.objects
+        .filter(assessed_on__gte=min(starts), assessed_on__lt=next_period_start(period, max(starts)))
+        .annotate(period_start=PERIODS[period]('assessed_on'))
+        .values('period_start', 'subject_id', 'student__department')
+        .annotate(
+            mark_count=Count('id'),
+            marks_sum=Sum('marks_obtained'),
+            attendance_sum=Sum('attendance_percentage'),
+        )
+        .order_by()
+    )
+
+    groups = []
+    totals = {start: [0, 0, 0] for start in starts}
+    for row in marks:
+        if row['period_start'] not in wanted:
+            continue
+        groups.append((
+            row['period_start'], row['subject_id'], row['student__department'],
+            row['mark_count'], row['marks_sum'], row['attendance_sum'],
+        ))
+        total = totals[row['period_start']]
+        total[0] += row['mark_count']
+        total[1] += row['marks_sum']
+        total[2] += row['attendance_sum']
+    groups += [(start, None, '', *total) for start, total in totals.items()]
+
+    try:
+        with transaction.atomic():
+            PerformanceRollup.objects.bulk_create([
+                PerformanceRollup(
+                    period=period, period_start=start, subject_id=subject_id, department=department,
+                    mark_count=mark_count, marks_sum=marks_sum, attendance_sum=attendance_sum,
+                )
+                for start, subject_id, department, mark_count, marks_sum, attendance_sum in groups
+            ])
+    except IntegrityError:
+        # Another request stored some of these periods first; its rows are equivalent
+        pass
+    return groups
+
+
+def roll_up_recent(period='week', count=DEFAULT_PERIODS):
+    """Roll up the closed periods among the last ``count`` that are not stored; returns how many"""
+    closed = _period_starts(period, count)[:-1]
+    stored = set(
+        PerformanceRollup.objects
+        .filter(period=period, subject__isnull=True, department='', period_start__in=closed)
+        .values_list('period_start', flat=True)
+    )
+    missing = [start for start in closed if start not in stored]
+    if missing:
+        roll_up(period, missing)
+    return len(missing)
+
+
+def invalidate_rollups(days):
+    """Drop the stored rollups of every closed period that contains one of ``days``
+
+    Called for the old and new assessment dates of every mark write, so
+    the next trend request rolls those periods up again. Marks dated in
+    an open period cost nothing.
+    """
+    days = {day for day in days if day is not None}
+    today = timezone.localdate()
+    stale = Q()
+    for period in PERIODS:
+        current = period_start(period, today)
+        starts = {period_start(period, day) for day in days if day < current}
+        if starts:
+            stale |= Q(period=period, period_start__in=starts)
+    if stale:
+        PerformanceRollup.objects.filter(stale).delete()
+
+
+def clear_rollups():
+    """Drop every stored rollup, e.g. after writes that bypass the model signals"""
+    PerformanceRollup.objects.all().delete()
@@ -5,6 +5,9 @@ urlpatterns = [
     path('performance/', views.performance_view, name='performance'),
     path('reports/', views.reports_view, name='reports'),
     path('suggestions/', views.suggestions_view, name='suggestions'),
+    path('suggestions/<int:student_id>/', views.suggestions_view, name='student_suggestions'),
+    path('report-cards/', views.report_cards, name='report_cards'),
+    path('report-cards/<int:student_id>/', views.student_report_card_pdf, name='student_report_card'),
     
     # Student CRUD
     path('api/students/', views.get_students, name='api_students'),
@@ -14,7 +17,10 @@ urlpatterns = [
     
     # Marks CRUD
     path('api/marks/', views.get_marks, name='api_marks'),
+    path('api/marks/export/', views.export_marks, name='api_export_marks'),
     path('api/marks/create/', views.create_mark, name='api_create_mark'),
+    path('api/marks/import/', views.import_marks, name='api_import_marks'),
+    path('api/marks/batch/', views.batch_upsert_marks, name='api_batch_marks'),
     path('api/marks/<int:pk>/update/', views.update_mark, name='api_update_mark'),
     path('api/marks/<int:pk>/delete/', views.delete_mark, name='api_delete_mark'),
     
@@ -23,7 +29,17 @@ urlpatterns = [
     path('api/subjects/create/', views.create_subject, name='api_create_subject'),
     
     # Dashboard data
+    path('api/dashboard/', views.dashboard, name='api_dashboard'),
+    path('api/cube/', views.get_cube, name='api_cube'),
     path('api/dashboard-stats/', views.dashboard_stats, name='api_dashboard_stats'),
     path('api/performance-data/', views.performance_data, name='api_performance_data'),
     path('api/subject-data/', views.subject_data, name='api_subject_data'),
+    path('api/at-risk/', views.get_at_risk, name='api_at_risk'),
+    path('api/suggestions/generate/', views.regenerate_suggestions, name='api_generate_suggestions'),
+    path('api/cache-stats/', views.get_cache_stats, name='api_cache_stats'),
+    path('api/_metrics', views.get_metrics, name='api_metrics'),
+
+    # Background jobs
+    path('api/jobs/', views.create_job, name='api_create_job'),
+    path('api/jobs/<int:pk>/', views.get_job, name='api_job'),
 ]
\ No newline at end of file
@@ -1,37 +1,111 @@
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils.text import slugify
 from django.views.decorators.http import require_http_methods
-from django.db.models import Avg, Count
-from .models import Student, Mark, Subject
-from .services import calculate_average, get_suggestions
+from django.db import IntegrityError
+from django.contrib.auth.models import User
+from accounts.models import Profile
+from .models import Job, Student, Mark, StudentSuggestion, Subject
+from .search import student_search
+from .services import AT_RISK_LIMIT, DASHBOARD_SECTIONS, at_risk_students, dashboard_payload
+from .stats import distribution_report
+from .suggestions import generate_suggestions
+from .trends import DEFAULT_PERIODS, MAX_PERIODS, PERIODS, performance_trend, period_label
+from .bulk import upsert_marks
+from .caching import cache_stats, cached_json, versioned_etag
+from .cube import CubeError, cube, parse_cube_request
+from .metrics import PROMETHEUS_CONTENT_TYPE, render_metrics
+from .report_cards import iter_report_card_zip, student_report_card
 from .forms import StudentForm, MarkForm
+from .importer import DEFAULT_BATCH_SIZE, ImportFormatError, import_gradebook
+from .jobs import enqueue, job_payload
+from .listing import (
+    DEFAULT_MARK_FIELDS, DEFAULT_STUDENT_FIELDS, MARK_FIELDS, MARK_FILTERS,
+    STUDENT_FIELDS, STUDENT_FILTERS, ListingError, apply_filters, iter_json_array, iter_ndjson,
+    iter_rows, paginate, parse_fields,
+)
+import datetime
 import json
 
 
+MAX_BATCH_MARKS = 5000
+MAX_AT_RISK = 500
+# Profile roles that may see every student's records
+TEACHER_ROLES = ('Teacher', 'Admin')
+
+
 def performance_view(request):
     students = Student.objects.all()
     return render(request, 'analytics_app/performance.html', {'students': students})
 
 
 def reports_view(request):
-    marks = Mark.objects.all()
-    average = calculate_average(marks)
-    return render(request, 'analytics_app/reports.html', {'average': average})
-
-
-def suggestions_view(request):
-    marks = Mark.objects.all()
-    average = calculate_average(marks)
-    attendance = 80  # dummy value for review-1
-    suggestion = get_suggestions(average, attendance)
-    return render(request, 'analytics_app/suggestions.html', {'suggestion': suggestion})
+    report = distribution_report()
+    return render(request, 'analytics_app/reports.html', {'report': report})
+
+
+def _is_teacher(user):
+    """Staff, or an account registered as a teacher or admin, who may see every student"""
+    if user.is_staff:
+        return True
+    return user.is_authenticated and Profile.objects.filter(user=user, role__in=TEACHER_ROLES).exists()
+
+
+def suggestions_view(request, student_id=None):
+    """Stored suggestions of one student, for teachers or the student themselves"""
+    suggestions = StudentSuggestion.objects.all()
+    if student_id is not None:
+        suggestions = suggestions.filter(student_id=student_id)
+    if student_id is None or not _is_teacher(request.user):
+        # Anyone else only gets the student linked to their own account
+        if request.user.is_authenticated:
+            suggestions = suggestions.filter(student__user=request.user)
+        else:
+            suggestions = suggestions.none()
+    suggestions = list(
+        suggestions
+        .select_related('student')
+        .order_by('id')
+    )
+    return render(request, 'analytics_app/suggestions.html', {
+        'student': suggestions[0].student if suggestions else None,
+        'suggestions': suggestions,
+    })
 
 
 @require_http_methods(["GET"])
+@cached_json('students', ['student'])
 def get_students(request):
-    """Get all students as JSON"""
-    students = Student.objects.all().values('id', 'name', 'roll_no', 'department')
-    return JsonResponse(list(students), safe=False)
+    """Get one page of students as JSON"""
+    try:
+        fields = parse_fields(request.GET, STUDENT_FIELDS, DEFAULT_STUDENT_FIELDS)
+        students = apply_filters(Student.objects.all(), request.GET, STUDENT_FILTERS)
+        search = request.GET.get('q', '').strip()
+        if search:
+            students = students.filter(student_search(search))
+        page = paginate(students, request.GET, fields, STUDENT_FIELDS)
+    except ListingError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    return JsonResponse(page)
+
+
+def _account_id(value, student=None):
+    """Id of the login to link a student to, or None to unlink; raises ValueError"""
+    if value is None:
+        return None
+    try:
+        user_id = int(value)
+    except (TypeError, ValueError):
+        raise ValueError('user_id must be a user id or null')
+    if not User.objects.filter(pk=user_id).exists():
+        raise ValueError(f'User {user_id} not found')
+    linked = Student.objects.filter(user_id=user_id)
+    if student is not None:
+        linked = linked.exclude(pk=student.pk)
+    if linked.exists():
+        raise ValueError(f'User {user_id} is already linked to another student')
+    return user_id
 
 
 @require_http_methods(["POST"])
@@ -40,10 +114,13 @@ def create_student(request):
     if request.method == 'POST':
         try:
             data = json.loads(request.body)
+            if 'user_id' in data and not _is_teacher(request.user):
+                return JsonResponse({'success': False, 'error': 'Only teachers can link student accounts'}, status=403)
             student = Student.objects.create(
                 name=data.get('name'),
                 roll_no=data.get('roll_no'),
-                department=data.get('department')
+                department=data.get('department'),
+                user_id=_account_id(data.get('user_id')),
             )
             return JsonResponse({
                 'success': True,
@@ -52,7 +129,8 @@ def create_student(request):
                     'id': student.id,
                     'name': student.name,
                     'roll_no': student.roll_no,
-                    'department': student.department
+                    'department': student.department,
+                    'user_id': student.user_id,
                 }
             })
         except Exception as e:
@@ -65,10 +143,14 @@ def update_student(request, pk):
     try:
         student = get_object_or_404(Student, id=pk)
         data = json.loads(request.body)
+        if 'user_id' in data and not _is_teacher(request.user):
+            return JsonResponse({'success': False, 'error': 'Only teachers can link student accounts'}, status=403)
         
         student.name = data.get('name', student.name)
         student.roll_no = data.get('roll_no', student.roll_no)
         student.department = data.get('department', student.department)
+        if 'user_id' in data:
+            student.user_id = _account_id(data['user_id'], student)
         student.save()
         
         return JsonResponse({
@@ -78,7 +160,8 @@ def update_student(request, pk):
                 'id': student.id,
                 'name': student.name,
                 'roll_no': student.roll_no,
-                'department': student.department
+                'department': student.department,
+                'user_id': student.user_id,
             }
         })
     except Exception as e:
@@ -99,104 +182,160 @@ def delete_student(request, pk):
         return JsonResponse({'success': False, 'error': str(e)}, status=400)
 
 
+# Shown on an empty install so the charts are not blank
+SAMPLE_SUBJECTS = [
+    {'name': 'Mathematics', 'average': 82},
+    {'name': 'Science', 'average': 75},
+    {'name': 'English', 'average': 88},
+    {'name': 'History', 'average': 70},
+    {'name': 'Geography', 'average': 79},
+]
+
+
+def _dashboard_sections(sections=DASHBOARD_SECTIONS):
+    """The requested dashboard sections shaped as the chart endpoints return them"""
+    payload = dashboard_payload(sections)
+    if 'performance' in payload:
+        payload['performance'] = _trend_chart('week', payload['performance'])
+    if 'subjects' in payload:
+        subject_stats = payload['subjects'] or SAMPLE_SUBJECTS
+        payload['subjects'] = {
+            'labels': [s['name'] for s in subject_stats],
+            'data': [s['average'] for s in subject_stats],
+        }
+    return payload
+
+
+def _trend_chart(period, trend):
+    """Chart labels, averages (null for periods without marks) and mark counts"""
+    return {
+        'period': period,
+        'labels': [period_label(period, row['start']) for row in trend],
+        'data': [row['average'] for row in trend],
+        'counts': [row['mark_count'] for row in trend],
+    }
+
+
+@require_http_methods(["GET"])
+@cached_json('dashboard', ['student', 'subject', 'mark'], daily=True)
+def dashboard(request):
+    """Stats, performance trend and subject averages in one response"""
+    sections = request.GET.get('sections')
+    if sections:
+        sections = [section.strip() for section in sections.split(',') if section.strip()]
+        unknown = [section for section in sections if section not in DASHBOARD_SECTIONS]
+        if unknown:
+            return JsonResponse({
+                'success': False,
+                'error': f'Unknown section: {unknown[0]}. Choose from {", ".join(DASHBOARD_SECTIONS)}',
+            }, status=400)
+    else:
+        sections = DASHBOARD_SECTIONS
+    return JsonResponse(_dashboard_sections(sections))
+
+
+@require_http_methods(["GET"])
+@cached_json('cube', ['student', 'subject', 'mark', 'profile'])
+def get_cube(request):
+    """Measures grouped by any combination of department, subject, gender and term"""
+    try:
+        dimensions, measures = parse_cube_request(request.GET)
+        rows = cube(dimensions, measures, request.GET)
+    except (CubeError, ListingError) as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    return JsonResponse({'dimensions': dimensions, 'measures': measures, 'rows': rows})
+
+
+@cached_json('dashboard_stats', ['student', 'mark'])
 def dashboard_stats(request):
     """Get dashboard statistics"""
-    total_students = Student.objects.count()
-    total_marks = Mark.objects.count()
-    
-    avg_score = Mark.objects.aggregate(Avg('marks_obtained'))['marks_obtained__avg'] or 0
-    avg_attendance = Mark.objects.aggregate(Avg('attendance_percentage'))['attendance_percentage__avg'] or 0
-    
-    # Calculate pass rate (assuming >= 40 is passing)
-    passing_marks = Mark.objects.filter(marks_obtained__gte=40).count()
-    pass_rate = (passing_marks / total_marks * 100) if total_marks > 0 else 0
-    
-    return JsonResponse({
-        'total_students': total_students,
-        'average_score': round(avg_score, 2),
-        'attendance': round(avg_attendance, 2),
-        'pass_rate': round(pass_rate, 2),
-        'total_marks': total_marks
-    })
+    return JsonResponse(_dashboard_sections(['stats'])['stats'])
 
 
+@cached_json('performance_data', ['student', 'mark'], daily=True)
 def performance_data(request):
-    """Get performance trend data for chart"""
-    # Get average marks by week (for demo, we'll use marks grouped by creation)
-    marks_data = Mark.objects.all().order_by('id').values_list('marks_obtained', flat=True)
-    
-    # Create 6 week buckets
-    weeks = [[], [], [], [], [], []]
-    for i, mark in enumerate(marks_data):
-        week_index = i % 6
-        weeks[week_index].append(mark)
-    
-    # Calculate average for each week
-    week_averages = []
-    for week in weeks:
-        if week:
-            avg = sum(week) / len(week)
-            week_averages.append(round(avg, 2))
-        else:
-            week_averages.append(0)
-    
-    # If no data, provide sample data
-    if not week_averages or all(x == 0 for x in week_averages):
-        week_averages = [65, 69, 72, 75, 77, 78]
-    
-    return JsonResponse({
-        'labels': ['Week 1', 'Week 2', 'Week 3', 'Week 4', 'Week 5', 'Week 6'],
-        'data': week_averages
-    })
+    """Get performance trend data for chart, bucketed by assessment date"""
+    period = request.GET.get('period') or 'week'
+    if period not in PERIODS:
+        return JsonResponse({
+            'success': False,
+            'error': f'Period must be one of {", ".join(PERIODS)}'
+        }, status=400)
+    try:
+        count = int(request.GET.get('periods') or DEFAULT_PERIODS)
+        subject_id = int(request.GET['subject']) if request.GET.get('subject') else None
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'periods and subject must be whole numbers'}, status=400)
+    if not 1 <= count <= MAX_PERIODS:
+        return JsonResponse({
+            'success': False,
+            'error': f'periods must be between 1 and {MAX_PERIODS}'
+        }, status=400)
 
+    trend = performance_trend(
+        period, count, subject_id=subject_id, department=request.GET.get('department') or None,
+    )
+    return JsonResponse(_trend_chart(period, trend))
 
+
+@cached_json('subject_data', ['subject', 'mark'])
 def subject_data(request):
     """Get subject comparison data for chart"""
-    subjects = Subject.objects.all()
-    subject_stats = []
-    
-    for subject in subjects:
-        avg_marks = Mark.objects.filter(subject=subject).aggregate(Avg('marks_obtained'))['marks_obtained__avg'] or 0
-        subject_stats.append({
-            'name': subject.subject_name,
-            'average': round(avg_marks, 2)
-        })
-    
-    # If no data, provide sample data
-    if not subject_stats:
-        subject_stats = [
-            {'name': 'Mathematics', 'average': 82},
-            {'name': 'Science', 'average': 75},
-            {'name': 'English', 'average': 88},
-            {'name': 'History', 'average': 70},
-            {'name': 'Geography', 'average': 79},
-        ]
-    
-    return JsonResponse({
-        'labels': [s['name'] for s in subject_stats],
-        'data': [s['average'] for s in subject_stats]
-    })
+    return JsonResponse(_dashboard_sections(['subjects'])['subjects'])
+
+
+@require_http_methods(["GET"])
+@cached_json('at_risk', ['student', 'mark', 'risk'])
+def get_at_risk(request):
+    """Get the students with the highest risk scores"""
+    try:
+        limit = int(request.GET.get('limit') or AT_RISK_LIMIT)
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'limit must be a whole number'}, status=400)
+    if not 1 <= limit <= MAX_AT_RISK:
+        return JsonResponse({
+            'success': False,
+            'error': f'limit must be between 1 and {MAX_AT_RISK}'
+        }, status=400)
+    students, stale = at_risk_students(limit, request.GET.get('department') or None)
+    return JsonResponse({'students': students, 'stale': stale})
 
 
 # ============ MARKS MANAGEMENT ENDPOINTS ============
 
 @require_http_methods(["GET"])
+@versioned_etag('marks', ['student', 'subject', 'mark'])
 def get_marks(request):
-    """Get all marks as JSON"""
-    marks = Mark.objects.all().select_related('student', 'subject')
-    marks_data = []
-    for mark in marks:
-        marks_data.append({
-            'id': mark.id,
-            'student_id': mark.student.id,
-            'student_name': mark.student.name,
-            'student_roll_no': mark.student.roll_no,
-            'subject_id': mark.subject.id,
-            'subject_name': mark.subject.subject_name,
-            'marks_obtained': mark.marks_obtained,
-            'attendance_percentage': mark.attendance_percentage
-        })
-    return JsonResponse(marks_data, safe=False)
+    """Get one page of marks as JSON"""
+    try:
+        fields = parse_fields(request.GET, MARK_FIELDS, DEFAULT_MARK_FIELDS)
+        marks = apply_filters(Mark.objects.all(), request.GET, MARK_FILTERS)
+        page = paginate(marks, request.GET, fields, MARK_FIELDS)
+    except ListingError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    return JsonResponse(page)
+
+
+@require_http_methods(["GET"])
+@versioned_etag('export_marks', ['student', 'subject', 'mark'])
+def export_marks(request):
+    """Stream every matching mark as NDJSON (default) or a JSON array"""
+    export_format = request.GET.get('format', 'ndjson')
+    if export_format not in ('ndjson', 'json'):
+        return JsonResponse({'success': False, 'error': f'Unsupported format: {export_format}'}, status=400)
+    try:
+        fields = parse_fields(request.GET, MARK_FIELDS, DEFAULT_MARK_FIELDS)
+        marks = apply_filters(Mark.objects.all(), request.GET, MARK_FILTERS)
+    except ListingError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+
+    rows = iter_rows(marks, fields, MARK_FIELDS)
+    if export_format == 'ndjson':
+        response = StreamingHttpResponse(iter_ndjson(rows), content_type='application/x-ndjson')
+    else:
+        response = StreamingHttpResponse(iter_json_array(rows), content_type='application/json')
+    response['Content-Disposition'] = f'attachment; filename="marks.{export_format}"'
+    return response
 
 
 @require_http_methods(["POST"])
@@ -207,12 +346,16 @@ def create_mark(request):
         student = get_object_or_404(Student, id=data.get('student_id'))
         subject = get_object_or_404(Subject, id=data.get('subject_id'))
         
-        mark = Mark.objects.create(
+        marks, attendance = _mark_values(data.get('marks_obtained'), data.get('attendance_percentage'))
+        mark = Mark(
             student=student,
             subject=subject,
-            marks_obtained=data.get('marks_obtained'),
-            attendance_percentage=data.get('attendance_percentage')
+            marks_obtained=marks,
+            attendance_percentage=attendance
         )
+        if data.get('assessed_on'):
+            mark.assessed_on = _parse_assessed_on(data['assessed_on'])
+        mark.save()
         
         return JsonResponse({
             'success': True,
@@ -222,13 +365,118 @@ def create_mark(request):
                 'student_id': mark.student.id,
                 'subject_id': mark.subject.id,
                 'marks_obtained': mark.marks_obtained,
-                'attendance_percentage': mark.attendance_percentage
+                'attendance_percentage': mark.attendance_percentage,
+                'assessed_on': mark.assessed_on
             }
         })
+    except IntegrityError:
+        return JsonResponse({
+            'success': False,
+            'error': 'Mark entry already exists for this student and subject'
+        }, status=400)
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)}, status=400)
 
 
+def _parse_assessed_on(value):
+    try:
+        return datetime.date.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise ValueError('assessed_on must be a date in YYYY-MM-DD format')
+
+
+def _mark_values(marks, attendance):
+    """(marks, attendance) checked against the ranges the Mark constraints enforce"""
+    try:
+        marks, attendance = float(marks), float(attendance)
+    except (TypeError, ValueError):
+        raise ValueError('Marks and attendance must be numbers')
+    if not (0 <= marks <= 100) or marks != int(marks):
+        raise ValueError('Marks must be a whole number between 0 and 100')
+    if not (0 <= attendance <= 100):
+        raise ValueError('Attendance must be between 0 and 100')
+    return int(marks), attendance
+
+
+def _parse_mark_change(item):
+    """(student_id, subject_id, marks, attendance) from one batch item, range-checked"""
+    if not isinstance(item, dict):
+        raise ValueError('Each mark must be an object')
+    try:
+        student_id = int(item['student_id'])
+        subject_id = int(item['subject_id'])
+        marks, attendance = item['marks_obtained'], item['attendance_percentage']
+    except KeyError as e:
+        raise ValueError(f'Missing field: {e.args[0]}')
+    except (TypeError, ValueError):
+        raise ValueError('Student and subject ids must be numbers')
+    return (student_id, subject_id, *_mark_values(marks, attendance))
+
+
+@require_http_methods(["POST"])
+def batch_upsert_marks(request):
+    """Create or update a list of marks in a single transaction"""
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Invalid JSON'}, status=400)
+    items = data.get('marks') if isinstance(data, dict) else data
+    if not isinstance(items, list) or not items:
+        return JsonResponse({'success': False, 'error': 'Expected a non-empty list of marks'}, status=400)
+    if len(items) > MAX_BATCH_MARKS:
+        return JsonResponse({
+            'success': False,
+            'error': f'At most {MAX_BATCH_MARKS} marks can be saved at once'
+        }, status=400)
+
+    rows, errors = [], []
+    for index, item in enumerate(items):
+        try:
+            rows.append((index, *_parse_mark_change(item)))
+        except ValueError as e:
+            errors.append({'index': index, 'error': str(e)})
+
+    # Unknown ids are reported per item instead of failing the whole insert
+    known_students = set(Student.objects.filter(id__in={row[1] for row in rows}).values_list('id', flat=True))
+    known_subjects = set(Subject.objects.filter(id__in={row[2] for row in rows}).values_list('id', flat=True))
+    for index, student_id, subject_id, _, _ in rows:
+        if student_id not in known_students:
+            errors.append({'index': index, 'error': f'Student {student_id} not found'})
+        elif subject_id not in known_subjects:
+            errors.append({'index': index, 'error': f'Subject {subject_id} not found'})
+
+    if errors:
+        errors.sort(key=lambda error: error['index'])
+        return JsonResponse({'success': False, 'error': 'Some marks are invalid', 'errors': errors}, status=400)
+
+    created, updated = upsert_marks(row[1:] for row in rows)
+    return JsonResponse({
+        'success': True,
+        'message': 'Marks saved successfully',
+        'created': created,
+        'updated': updated
+    })
+
+
+@require_http_methods(["POST"])
+def import_marks(request):
+    """Import a CSV/XLSX gradebook uploaded as the ``file`` form field"""
+    upload = request.FILES.get('file')
+    if upload is None:
+        return JsonResponse({'success': False, 'error': 'No file uploaded'}, status=400)
+    try:
+        batch_size = int(request.POST.get('batch_size') or DEFAULT_BATCH_SIZE)
+        report = import_gradebook(
+            upload,
+            filename=upload.name,
+            file_format=request.POST.get('format'),
+            batch_size=max(batch_size, 1),
+        )
+    except (ImportFormatError, ValueError) as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    return JsonResponse({'success': True, **report})
+
+
 @require_http_methods(["POST"])
 def update_mark(request, pk):
     """Update a mark"""
@@ -236,10 +484,12 @@ def update_mark(request, pk):
         mark = get_object_or_404(Mark, id=pk)
         data = json.loads(request.body)
         
-        if 'marks_obtained' in data:
-            mark.marks_obtained = data.get('marks_obtained')
-        if 'attendance_percentage' in data:
-            mark.attendance_percentage = data.get('attendance_percentage')
+        mark.marks_obtained, mark.attendance_percentage = _mark_values(
+            data.get('marks_obtained', mark.marks_obtained),
+            data.get('attendance_percentage', mark.attendance_percentage),
+        )
+        if data.get('assessed_on'):
+            mark.assessed_on = _parse_assessed_on(data['assessed_on'])
         
         mark.save()
         
@@ -249,7 +499,8 @@ def update_mark(request, pk):
             'mark': {
                 'id': mark.id,
                 'marks_obtained': mark.marks_obtained,
-                'attendance_percentage': mark.attendance_percentage
+                'attendance_percentage': mark.attendance_percentage,
+                'assessed_on': mark.assessed_on
             }
         })
     except Exception as e:
@@ -273,6 +524,7 @@ def delete_mark(request, pk):
 # ============ SUBJECT MANAGEMENT ENDPOINTS ============
 
 @require_http_methods(["GET"])
+@cached_json('subjects', ['subject'])
 def get_subjects(request):
     """Get all subjects as JSON"""
     subjects = Subject.objects.all().values('id', 'subject_name')
@@ -296,4 +548,112 @@ def create_subject(request):
             }
         })
     except Exception as e:
-        return JsonResponse({'success': False, 'error': str(e)}, status=400)
\ No newline at end of file
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+
+
+@require_http_methods(["POST"])
+def regenerate_suggestions(request):
+    """Regenerate stored suggestions for every student, or one department"""
+    if not request.user.is_staff:
+        return JsonResponse({'success': False, 'error': 'Staff access required'}, status=403)
+    try:
+        data = json.loads(request.body or '{}')
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Invalid JSON'}, status=400)
+    if not isinstance(data, dict):
+        data = {}
+    departments = [data['department']] if data.get('department') else None
+    if data.get('background'):
+        job = enqueue('generate_suggestions', {'departments': departments}, user=request.user)
+        return _job_accepted(job)
+    students, suggestions = generate_suggestions(departments=departments)
+    return JsonResponse({'success': True, 'students': students, 'suggestions': suggestions})
+
+
+@require_http_methods(["GET"])
+def get_cache_stats(request):
+    """Hit/miss counters of the analytics cache in this worker process"""
+    if not request.user.is_staff:
+        return JsonResponse({'success': False, 'error': 'Staff access required'}, status=403)
+    return JsonResponse({'views': cache_stats()})
+
+
+@require_http_methods(["GET"])
+def get_metrics(request):
+    """Request metrics of this worker process in Prometheus text format"""
+    if not request.user.is_staff:
+        return JsonResponse({'success': False, 'error': 'Staff access required'}, status=403)
+    return HttpResponse(render_metrics(), content_type=PROMETHEUS_CONTENT_TYPE)
+
+
+def _job_accepted(job):
+    """202 response for a queued job, pointing at its status endpoint"""
+    url = reverse('api_job', args=[job.pk])
+    response = JsonResponse({'success': True, 'job': job_payload(job), 'status_url': url}, status=202)
+    response['Location'] = url
+    return response
+
+
+@require_http_methods(["POST"])
+def create_job(request):
+    """Queue a background job of a registered kind"""
+    if not request.user.is_staff:
+        return JsonResponse({'success': False, 'error': 'Staff access required'}, status=403)
+    try:
+        data = json.loads(request.body or '{}')
+        if not isinstance(data, dict):
+            raise ValueError('Expected a JSON object')
+        job = enqueue(data.get('kind'), data.get('payload'), user=request.user)
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    return _job_accepted(job)
+
+
+@require_http_methods(["GET"])
+def get_job(request, pk):
+    """Status, progress and result of a background job, for staff or whoever queued it"""
+    job = Job.objects.filter(pk=pk).first()
+    if job is None:
+        return JsonResponse({'success': False, 'error': 'Job not found'}, status=404)
+    if not request.user.is_staff and (job.created_by_id is None or job.created_by_id != request.user.pk):
+        return JsonResponse({'success': False, 'error': 'Staff access required'}, status=403)
+    return JsonResponse({'success': True, 'job': job_payload(job)})
+
+
+@require_http_methods(["GET"])
+def report_cards(request):
+    """ZIP of PDF report cards for every student, or one department, streamed as it is rendered
+
+    With ``background=1`` the cards are rendered into the cache by a job
+    instead, so a later download only reads them back.
+    """
+    if not _is_teacher(request.user):
+        return JsonResponse({'success': False, 'error': 'Teacher access required'}, status=403)
+    department = request.GET.get('department')
+    if request.GET.get('background'):
+        job = enqueue('generate_report_cards', {'department': department or None}, user=request.user)
+        return _job_accepted(job)
+    students = Student.objects.all()
+    if department:
+        students = students.filter(department=department)
+    # Rendered in this thread: forking a pool from a request thread can deadlock
+    response = StreamingHttpResponse(iter_report_card_zip(students, workers=1), content_type='application/zip')
+    filename = f'report-cards-{slugify(department or "") or "all"}.zip'
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+@require_http_methods(["GET"])
+def student_report_card_pdf(request, student_id):
+    """PDF report card of one student, for teachers or the student themselves"""
+    students = Student.objects.filter(pk=student_id)
+    if not _is_teacher(request.user):
+        # Anyone else only gets the student linked to their own account
+        students = students.filter(user_id=request.user.pk) if request.user.is_authenticated else students.none()
+    card = student_report_card(students)
+    if card is None:
+        return JsonResponse({'success': False, 'error': 'Student not found'}, status=404)
+    filename, pdf = card
+    response = HttpResponse(pdf, content_type='application/pdf')
+    response['Content-Disposition'] = f'inline; filename="{filename}"'
+    return response
@@ -24,6 +24,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so it also times the middleware below and the queries they run
+    'analytics_app.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -31,6 +33,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    # Last, so profiled views still pass the checks above
+    'analytics_app.middleware.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'student_performance_system.urls'
@@ -57,9 +61,59 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # Seconds a write waits for another connection's lock (job
+            # workers, imports) before failing with "database is locked"
+            'timeout': 30,
+        },
     }
 }
 
+# Cache
+# Analytics read APIs cache their responses here, keyed by per-table write
+# versions stored in the database, so each process can keep its own copy.
+# Point this at FileBasedCache or Redis to share entries between workers.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'analytics',
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
+}
+
+# Columnar marks snapshot
+# Directory of the memory-mapped marks snapshot that distribution reports
+# scan instead of the database, e.g. BASE_DIR / 'var' / 'marks_snapshot'.
+# Create it with `manage.py build_marks_snapshot` and fold logged writes in
+# periodically with `manage.py build_marks_snapshot --compact`.
+ANALYTICS_SNAPSHOT_DIR = None
+
+# Request metrics
+# Every request's query count, SQL time, duration and response size are
+# kept per URL name in each worker process; staff read them, in Prometheus
+# text format, at /analytics/api/_metrics. Statements slower than
+# ANALYTICS_SLOW_QUERY_MS are appended to ANALYTICS_SLOW_QUERY_LOG with the
+# URL name that ran them; set either to None to turn the log off.
+ANALYTICS_SLOW_QUERY_MS = 200
+ANALYTICS_SLOW_QUERY_LOG = BASE_DIR / 'slow_queries.log'
+
+# Request profiling
+# Directory for cProfile captures of single requests, e.g. BASE_DIR / 'var'
+# / 'profiles'. When set, staff can add ?_profile=1 (or an X-Profile: 1
+# header) to any page or API call; list and read the captures with
+# `manage.py show_profiles`.
+ANALYTICS_PROFILE_DIR = None
+
+# Report cards
+# Processes rendering PDF report cards in `manage.py generate_report_cards`
+# and the generate_report_cards job; None uses one per CPU. Requests render
+# in their own thread and never start a pool. Rendered PDFs, about 3 KB
+# each, are kept in ANALYTICS_REPORT_CARD_DIR, one file per student, so job
+# workers and web processes share them; a student's new card replaces the
+# old file. Set it to None to render every card on request.
+ANALYTICS_REPORT_CARD_WORKERS = None
+ANALYTICS_REPORT_CARD_DIR = BASE_DIR / 'report_card_cache'
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},